@@ -6,7 +6,23 @@ from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.types import CallbackQuery
 from dotenv import load_dotenv
-from bot.utils.db import create_connection
+from bot.utils.db import acquire, pool_stats
+from bot.utils.question_bank import question_bank
+from bot.utils.game_engine import flush_stats, games, round_stats
+from bot.utils.fanout import fanout_stats
+from bot.utils.outbound import outbound
+from bot.utils.render import cache_stats
+from bot.utils.lobby import lobbies
+from bot.utils.matchmaking import matchmaking
+from bot.utils.sweeper import sweeper
+from bot.utils.history import archive_stats
+from bot.utils.leaderboard import leaderboard
+from bot.utils.sessions import sessions
+from bot.utils.room_actor import room_actors
+from bot.utils.deadlines import deadlines
+from bot.utils.supervisor import supervisor
+from bot.utils.fsm_storage import storage_stats
+from bot.utils.sharding import cluster
 from bot.keyboards import admin_kb
 from bot.keyboards.game_kb import start_buttons
 from bot.utils.logging_config import setup_logging
@@ -45,10 +61,125 @@ def is_admin(user_id: int) -> bool:
 ADMIN_CALLBACKS = [
     "re_question", "add_question", "delete_question", "edit_question",
     "back_to_admin_panel", "back_to_questions", "question", "correct_answer",
-    "wrong_answer_1", "wrong_answer_2", "wrong_answer_3", "exit_admin"  # Добавлено
+    "wrong_answer_1", "wrong_answer_2", "wrong_answer_3", "exit_admin",  # Добавлено
+    "stats"
 ]
 
 
+def format_runtime_stats() -> str:
+    """Собирает текущие показатели работы бота для админ-панели"""
+    db = pool_stats()
+    qb = question_bank.stats()
+    fl = flush_stats.stats()
+    rs = round_stats.stats()
+    fo = fanout_stats.stats()
+    ob = outbound.stats()
+    lb = lobbies.stats()
+    mm = matchmaking.stats()
+    sw = sweeper.stats()
+    ar = archive_stats.stats()
+    ch = leaderboard.stats()
+    ss = sessions.stats()
+    ra = room_actors.stats()
+    dl = deadlines.stats()
+    gm = games.stats()
+    sv = supervisor.stats()
+    fs = storage_stats()
+    cl = cluster.stats()
+    actor_lines = "\n".join(
+        f"{room_id}: в ящике {a['depth']} (макс. {a['max_depth']}), ожидание ср. {a['wait_avg_ms']} мс, "
+        f"макс. {a['wait_max_ms']} мс, обработка ср. {a['busy_avg_ms']} мс"
+        for room_id, a in room_actors.busiest()
+    ) or "нет активных комнат"
+    queue_lines = "\n".join(
+        f"{name}: в очереди {p['depth']}, ожидание ср. {p['wait_avg_ms']} мс, макс. {p['wait_max_ms']} мс"
+        for name, p in ob["priorities"].items()
+    )
+    render_lines = "\n".join(
+        f"{name}: {info.currsize}/{info.maxsize}, попадания {info.hits}, промахи {info.misses}"
+        for name, info in cache_stats().items()
+    )
+    return (
+        "<b>📊 Состояние бота</b>\n\n"
+        "<b>Пул БД</b>\n"
+        f"Соединений: {db['size']}/{db['max_size']} (занято {db['in_use']}, свободно {db['idle']})\n"
+        f"Ожидают соединения: {db['waiting']}\n"
+        f"Выдано: {db['acquired']}, таймаутов: {db['timeouts']}\n"
+        f"Ожидание соединения: ср. {db['acquire_avg_ms']} мс, макс. {db['acquire_max_ms']} мс\n\n"
+        "<b>Банк вопросов</b>\n"
+        f"Вопросов: {qb['questions']}, в кэше: {qb['cached']}/{qb['capacity']}\n"
+        f"Попадания: {qb['hits']}, промахи: {qb['misses']} ({qb['hit_rate']}%)\n"
+        f"Загрузок: {qb['reloads']} (последняя {qb['last_reload_ms']} мс), точечных обновлений: {qb['refreshes']}\n\n"
+        "<b>Запись состояния игр</b>\n"
+        f"Записей: {fl['flushes']}, строк: {fl['rows']} (ср. {fl['avg_rows']}, макс. {fl['max_rows']}), ошибок: {fl['errors']}\n"
+        f"Время записи: ср. {fl['avg_ms']} мс, макс. {fl['max_ms']} мс\n\n"
+        "<b>Игры</b>\n"
+        f"Идёт: {gm['live']}/{gm['capacity'] or '∞'} (пик {gm['peak']}), начато: {gm['created']}, "
+        f"закончено: {gm['finished']}, не допущено: {gm['rejected']}\n"
+        f"Память на игру: ~{gm['bytes_per_game']} байт\n\n"
+        "<b>Раунды</b>\n"
+        f"Всего: {rs['rounds']}, досрочно: {rs['ended_early']}, по таймеру: {rs['timed_out']}\n"
+        f"Задержка после последнего ответа: ср. {rs['end_latency_avg_ms']} мс, макс. {rs['end_latency_max_ms']} мс\n\n"
+        "<b>Рассылка раундов</b>\n"
+        f"Рассылок: {fo['batches']}, доставлено: {fo['sent']}, ошибок: {fo['failed']}\n"
+        f"Разброс доставки: ср. {fo['spread_avg_ms']} мс, макс. {fo['spread_max_ms']} мс\n"
+        f"Правок вместо новых сообщений: {fo['edited']} (неудачных: {fo['edit_fallbacks']}), "
+        f"сэкономлено запросов: {fo['calls_saved']}\n\n"
+        "<b>Очередь исходящих</b>\n"
+        f"В очереди: {ob['depth']} (отложено {ob['delayed']}), в полёте: {ob['inflight']}\n"
+        f"Склеено правок: {ob['coalesced']}, повторов после 429: {ob['retried']} "
+        f"(общих пауз {ob['global_pauses']}), ошибок: {ob['failed']}\n"
+        f"{queue_lines}\n\n"
+        "<b>Лобби</b>\n"
+        f"Комнат: {lb['lobbies']}, ожидающих игроков: {lb['members']}, стартовало игр: {lb['games_started']}, "
+        f"восстановлено после перезапуска: {lb['restored']}\n"
+        f"Событий состава: {lb['events']}, правок статуса: {lb['edits']}, пропущено без изменений: {lb['unchanged']}\n\n"
+        "<b>Подбор соперников</b>\n"
+        f"В очереди: {mm['queued']} (корзин рейтинга {mm['buckets']}), отменили: {mm['cancelled']}\n"
+        f"Комнат: {mm['matches']}, игроков: {mm['matched']}, по размеру: {mm['sizes']}\n"
+        f"Время до матча: p50 {mm['wait_p50_s']} с, p90 {mm['wait_p90_s']} с, p99 {mm['wait_p99_s']} с\n\n"
+        "<b>Сборщик мусора</b>\n"
+        f"Проходов: {sw['sweeps']}, ошибок: {sw['errors']}, убрано в последнем: {sw['last_reclaimed']}\n"
+        f"Всего: комнат {sw['reclaimed']['rooms']}, game_players {sw['reclaimed']['game_players']}, "
+        f"game_sessions {sw['reclaimed']['game_sessions']}, сброшено current_room_id {sw['reclaimed']['current_room_id']}\n"
+        f"Длительность: последний {sw['last_ms']} мс, макс. {sw['max_ms']} мс\n\n"
+        "<b>Архив игр</b>\n"
+        f"Игр: {ar['games']}, строк: {ar['rows']}, ошибок: {ar['errors']}\n"
+        f"Время архивирования: ср. {ar['avg_ms']} мс, макс. {ar['max_ms']} мс\n"
+        f"Секций добавлено: {ar['partitions_created']}, удалено: {ar['partitions_dropped']}\n\n"
+        "<b>Таблица чемпионов</b>\n"
+        f"Игроков: {ch['players']}, в топе: {ch['top']}, обновлений по итогам игр: {ch['updates']}\n"
+        f"Пересборок: {ch['rebuilds']} (последняя {ch['last_rebuild_ms']} мс), дописано после снимка: {ch['replayed']}, запросов места: {ch['rank_lookups']}\n\n"
+        "<b>Кэш сессий игроков</b>\n"
+        f"Игроков: {ss['sessions']}/{ss['capacity']}\n"
+        f"Попадания: {ss['hits']}, промахи: {ss['misses']} ({ss['hit_rate']}%)\n"
+        f"Истекло: {ss['expired']}, вытеснено: {ss['evictions']}, сброшено: {ss['invalidations']}\n\n"
+        "<b>Акторы комнат</b>\n"
+        f"Активных: {ra['actors']}, завершилось: {ra['retired']}, событий в ящиках: {ra['depth']}\n"
+        f"Обработано: {ra['processed']}/{ra['events']}, ожидание в ящике: ср. {ra['wait_avg_ms']} мс, макс. {ra['wait_max_ms']} мс\n"
+        f"{actor_lines}\n\n"
+        "<b>Фоновые задачи</b>\n"
+        f"Живых: {sv['live']} ({', '.join(f'{kind}: {n}' for kind, n in sv['by_kind'].items()) or 'нет'}), групп: {sv['groups']}\n"
+        f"Запущено: {sv['spawned']}, отменено: {sv['cancelled']}, упало: {sv['failed'] or 0}\n\n"
+        "<b>Сроки (колесо таймеров)</b>\n"
+        f"Ожидают: {dl['pending']}, поставлено: {dl['scheduled']}, сработало: {dl['fired']}, отменено: {dl['cancelled']}\n"
+        f"Пробуждений: {dl['wakeups']}, ошибок: {dl['errors']}\n"
+        f"Опоздание: p50 {dl['jitter_p50_ms']} мс, p99 {dl['jitter_p99_ms']} мс, макс. {dl['jitter_max_ms']} мс\n\n"
+        "<b>Хранилище FSM</b>\n"
+        f"Бэкенд: {fs['backend']}, чтений: {fs['reads']}, записей: {fs['writes']}, ср. {fs['avg_ms']} мс\n"
+        f"Пользователей с объектами процесса: {fs['runtime_keys']}\n\n"
+        "<b>Процессы (шарды)</b>\n"
+        f"Этот процесс: {cl['role']}, рабочих процессов: {cl['workers'] or 1}\n"
+        f"Апдейтов: {cl['updates']}, по процессам: {cl['routed'] or '—'}, кадров: {cl['frames_in']}/{cl['frames_out']}\n"
+        f"Вызовов комнат: на месте {cl['calls_local']}, в других процессах {cl['calls_remote']} "
+        f"(ср. {cl['call_avg_ms']} мс, макс. {cl['call_max_ms']} мс, ошибок {cl['call_errors']}), "
+        f"выполнено для других: {cl['calls_served']}, сбросов сессий: {cl['invalidations']}, "
+        f"изменений вопросов: {cl['question_changes']}\n\n"
+        "<b>Кэш отрисовки</b>\n"
+        f"{render_lines}"
+    )
+
+
 # Вход в админ-панель
 @router.message(Command("admin", prefix="?"))
 async def admin_handler(msg: types.Message):
@@ -98,6 +229,12 @@ async def admin_callback_handler(callback: CallbackQuery, state: FSMContext):
             await callback.message.edit_text("Введите ID вопроса для изменения:")
             await state.set_state(EditQuestion.question_id)
 
+        elif data == "stats":
+            await callback.message.edit_text(
+                text=format_runtime_stats(),
+                reply_markup=admin_kb.main_admin_keyboard
+            )
+
         elif data == "back_to_admin_panel":
             await callback.message.edit_text(
                 text="Добро пожаловать в админ-панель!",
@@ -134,36 +271,33 @@ async def process_delete_question(msg: types.Message, state: FSMContext):
             logging.warning(f"Пользователь {msg.from_user.id} ввёл некорректный ID вопроса: {question_id}")
             return
 
-        # Подключаемся к базе данных
-        connection = create_connection()
-        if connection:
+        # Берём соединение из пула
+        async with acquire() as connection:
             cursor = connection.cursor()
 
             # Проверяем, существует ли вопрос с таким ID
             check_query = "SELECT id FROM questions WHERE id = %s"
-            cursor.execute(check_query, (question_id,))
+            await cursor.execute(check_query, (question_id,))
             result = cursor.fetchone()
 
             if result:
                 # Если вопрос существует, удаляем его
                 delete_query = "DELETE FROM questions WHERE id = %s"
-                cursor.execute(delete_query, (question_id,))
-                connection.commit()
-                cursor.close()
-                connection.close()
+                await cursor.execute(delete_query, (question_id,))
+                await connection.commit()
+            cursor.close()
 
-                await msg.answer(f"✅ Вопрос с ID {question_id} успешно удалён!")
-                logging.info(f"Пользователь {msg.from_user.id} успешно удалил вопрос с ID {question_id}.")
+        if result:
+            question_bank.remove(int(question_id))
+            await msg.answer(f"✅ Вопрос с ID {question_id} успешно удалён!")
+            logging.info(f"Пользователь {msg.from_user.id} успешно удалил вопрос с ID {question_id}.")
 
-                # Возвращаем администратора в меню управления вопросами
-                await msg.answer("Что сделать с вопросами?", reply_markup=admin_kb.re_question)
-            else:
-                await msg.answer(f"❌ Вопрос с ID {question_id} не найден.")
-                logging.warning(
-                    f"Пользователь {msg.from_user.id} попытался удалить несуществующий вопрос с ID {question_id}.")
+            # Возвращаем администратора в меню управления вопросами
+            await msg.answer("Что сделать с вопросами?", reply_markup=admin_kb.re_question)
         else:
-            await msg.answer("❌ Ошибка подключения к базе данных.")
-            logging.error(f"Ошибка подключения к базе данных при удалении вопроса пользователем {msg.from_user.id}.")
+            await msg.answer(f"❌ Вопрос с ID {question_id} не найден.")
+            logging.warning(
+                f"Пользователь {msg.from_user.id} попытался удалить несуществующий вопрос с ID {question_id}.")
 
         await state.clear()  # Очищаем состояние
 
@@ -232,27 +366,25 @@ async def process_edit_question_value(msg: types.Message, state: FSMContext):
         question_id = data["question_id"]
         field_to_edit = data["field_to_edit"]
 
-        # Подключаемся к базе данных
-        connection = create_connection()
-        if connection:
+        # Берём соединение из пула
+        async with acquire() as connection:
             cursor = connection.cursor()
 
             # Обновляем выбранное поле в базе данных
             update_query = f"UPDATE questions SET {field_to_edit} = %s WHERE id = %s"
-            cursor.execute(update_query, (new_value, question_id))
-            connection.commit()
+            await cursor.execute(update_query, (new_value, question_id))
+            await connection.commit()
             cursor.close()
-            connection.close()
 
-            await msg.answer(f"✅ Поле '{field_to_edit}' вопроса с ID {question_id} успешно изменено!")
-            logging.info(
-                f"Пользователь {msg.from_user.id} успешно изменил поле '{field_to_edit}' вопроса с ID {question_id}.")
+        # Перечитываем изменённый вопрос в банк
+        await question_bank.refresh(int(question_id))
 
-            # Возвращаем администратора в меню управления вопросами
-            await msg.answer("Что сделать с вопросами?", reply_markup=admin_kb.re_question)
-        else:
-            await msg.answer("❌ Ошибка подключения к базе данных.")
-            logging.error(f"Ошибка подключения к базе данных при изменении вопроса пользователем {msg.from_user.id}.")
+        await msg.answer(f"✅ Поле '{field_to_edit}' вопроса с ID {question_id} успешно изменено!")
+        logging.info(
+            f"Пользователь {msg.from_user.id} успешно изменил поле '{field_to_edit}' вопроса с ID {question_id}.")
+
+        # Возвращаем администратора в меню управления вопросами
+        await msg.answer("Что сделать с вопросами?", reply_markup=admin_kb.re_question)
 
         await state.clear()  # Очищаем состояние
 
@@ -292,12 +424,10 @@ async def process_wrong_answers(msg: types.Message, state: FSMContext):
         wrong_answers = wrong_answers[:9] + [None] * (9 - len(wrong_answers))
 
         data = await state.get_data()
-        connection = create_connection()
-        if connection:
-            cursor = None
-            try:
+        try:
+            async with acquire() as connection:
                 cursor = connection.cursor()
-                cursor.execute(
+                await cursor.execute(
                     "INSERT INTO questions (question, correct_answer, "
                     "wrong_answer_1, wrong_answer_2, wrong_answer_3, "
                     "wrong_answer_4, wrong_answer_5, wrong_answer_6, "
@@ -309,29 +439,24 @@ async def process_wrong_answers(msg: types.Message, state: FSMContext):
                         *wrong_answers
                     )
                 )
-                connection.commit()
+                await connection.commit()
+                question_id = cursor.lastrowid
+                cursor.close()
 
-                # После успешного добавления показываем меню управления вопросами
-                await msg.answer(
-                    "✅ Вопрос добавлен!",
-                    reply_markup=admin_kb.re_question  # <-- Клавиатура управления вопросами
-                )
+            # Новый вопрос сразу попадает в банк
+            await question_bank.refresh(question_id)
 
-            except Exception as e:
-                logging.error(f"Ошибка выполнения SQL-запроса: {e}")
-                await msg.answer(
-                    "❌ Ошибка при работе с базой данных.",
-                    reply_markup=admin_kb.re_question  # <-- Возврат даже при ошибке
-                )
-                connection.rollback()
-            finally:
-                if cursor:
-                    cursor.close()
-                connection.close()
-        else:
+            # После успешного добавления показываем меню управления вопросами
+            await msg.answer(
+                "✅ Вопрос добавлен!",
+                reply_markup=admin_kb.re_question  # <-- Клавиатура управления вопросами
+            )
+
+        except Exception as e:
+            logging.error(f"Ошибка выполнения SQL-запроса: {e}")
             await msg.answer(
-                "❌ Ошибка подключения к БД.",
-                reply_markup=admin_kb.re_question  # <-- Возврат при ошибке подключения
+                "❌ Ошибка при работе с базой данных.",
+                reply_markup=admin_kb.re_question  # <-- Возврат даже при ошибке
             )
 
         await state.clear()
@@ -1,12 +1,15 @@
 import logging
 from aiogram import types, F, Router, html
-from aiogram.types import Message
+from aiogram.types import CallbackQuery, Message
 from aiogram.filters import Command
 from dotenv import load_dotenv
 
 from bot.keyboards import start_buttons
-from bot.keyboards.game_kb import game_type_keyboard
-from bot.utils.db import create_connection, insert_players
+from bot.keyboards.game_kb import LeaderboardCallback, game_type_keyboard, get_leaderboard_keyboard
+from bot.utils import config
+from bot.utils.db import acquire, insert_players
+from bot.utils.leaderboard import leaderboard
+from bot.utils.sessions import sessions
 from bot.utils.logging_config import setup_logging
 
 setup_logging()
@@ -35,22 +38,19 @@ async def get_welcome_message(msg: Message) -> str:
 @router.message(Command("start"))
 async def start_handler(msg: Message):
     try:
-        connection = create_connection()
-        if connection:
-            try:
-                user_id = msg.from_user.id
-                cursor = connection.cursor()
-                cursor.execute("SELECT * FROM players WHERE id = %s", (user_id,))
-                result = cursor.fetchone()
-
-                if not result:
-                    insert_players(connection, user_id)
-            except Exception as e:
-                logging.error(f"Ошибка при работе с БД: {e}")
-                await msg.answer("❌ Ошибка инициализации профиля")
-            finally:
-                cursor.close()
-                connection.close()
+        try:
+            # Известного игрока с тем же именем узнаём по кэшу сессий, без записи в БД
+            user_id = msg.from_user.id
+            name = msg.from_user.full_name[:64]
+            session = await sessions.get(user_id)
+            if not session.known or session.name != name:
+                async with acquire() as connection:
+                    inserted = await insert_players(connection, user_id, name)
+                if inserted:
+                    sessions.mark_known(user_id, name)
+        except Exception as e:
+            logging.error(f"Ошибка при работе с БД: {e}")
+            await msg.answer("❌ Ошибка инициализации профиля")
 
         await msg.answer(
             await get_welcome_message(msg),
@@ -64,59 +64,108 @@ async def start_handler(msg: Message):
 @router.message(F.text == "Моя статистика")
 async def my_stats_handler(msg: types.Message):
     user_id = msg.from_user.id  # Получаем ID пользователя
-    connection = create_connection()  # Устанавливаем соединение с базой данных
 
-    if connection is not None:
-        try:
-            cursor = connection.cursor()
-
-            # Запрос на получение статистики
-            query = """
-                SELECT score, correct_answers, wrong_answers, wins
-                FROM players
-                WHERE id = %s;
-            """
-            cursor.execute(query, (user_id,))
-            result = cursor.fetchone()
-
-            if result:
-                # Извлекаем данные
-                score, correct_answers, wrong_answers, wins = result
-                total_answers = correct_answers + wrong_answers
-
-                # Вычисляем долю правильных ответов
-                if total_answers > 0:
-                    accuracy = correct_answers / total_answers
-                    accuracy_percentage = round(accuracy * 100, 2)  # Процент с округлением
-                else:
-                    accuracy_percentage = 0.0
-
-                # Формируем и отправляем сообщение
-                await msg.answer(
-                    f"📊 Ваша статистика:\n\n"
-                    f"🏆 Очки: {score}\n"
-                    f"✅ Правильных ответов: {correct_answers}\n"
-                    f"❌ Неправильных ответов: {wrong_answers}\n"
-                    f"📈 Доля правильных ответов: {accuracy_percentage}%\n"
-                    f"🥇 Побед: {wins}"
-                )
-
-                # Логируем успешное выполнение команды
-                logging.info(f"Статистика пользователя {user_id} успешно отправлена.")
-            else:
-                # Если пользователя нет в базе
-                await msg.answer("У вас пока нет статистики. Начните игру, чтобы её создать!")
-                logging.info(f"Пользователь с id {user_id} запрашивал статистику, но не найден в базе.")
-        except Exception as e:
-            # Логируем ошибку
-            logging.error(f"Ошибка при обработке статистики для пользователя {user_id}: {e}")
-            await msg.answer("Произошла ошибка при получении вашей статистики. Попробуйте позже.")
-        finally:
-            connection.close()
-    else:
+    try:
+        # Статистика из кэша сессий; после каждой игры запись сбрасывается и перечитывается
+        session = await sessions.get(user_id)
+        result = (session.score, session.correct_answers, session.wrong_answers, session.wins) if session.known else None
+    except Exception as e:
         # Логируем ошибку подключения к базе данных
-        logging.error("Ошибка подключения к базе данных.")
+        logging.error(f"Ошибка подключения к базе данных: {e}")
         await msg.answer("Ошибка подключения к базе данных. Попробуйте позже.")
+        return
+
+    try:
+        if result:
+            # Извлекаем данные
+            score, correct_answers, wrong_answers, wins = result
+            total_answers = correct_answers + wrong_answers
+
+            # Вычисляем долю правильных ответов
+            if total_answers > 0:
+                accuracy = correct_answers / total_answers
+                accuracy_percentage = round(accuracy * 100, 2)  # Процент с округлением
+            else:
+                accuracy_percentage = 0.0
+
+            # Формируем и отправляем сообщение
+            await msg.answer(
+                f"📊 Ваша статистика:\n\n"
+                f"🏆 Очки: {score}\n"
+                f"✅ Правильных ответов: {correct_answers}\n"
+                f"❌ Неправильных ответов: {wrong_answers}\n"
+                f"📈 Доля правильных ответов: {accuracy_percentage}%\n"
+                f"🥇 Побед: {wins}"
+            )
+
+            # Логируем успешное выполнение команды
+            logging.info(f"Статистика пользователя {user_id} успешно отправлена.")
+        else:
+            # Если пользователя нет в базе
+            await msg.answer("У вас пока нет статистики. Начните игру, чтобы её создать!")
+            logging.info(f"Пользователь с id {user_id} запрашивал статистику, но не найден в базе.")
+    except Exception as e:
+        # Логируем ошибку
+        logging.error(f"Ошибка при обработке статистики для пользователя {user_id}: {e}")
+        await msg.answer("Произошла ошибка при получении вашей статистики. Попробуйте позже.")
+
+
+async def get_my_rank(user_id: int):
+    """Место игрока: очки — из кэша сессий, место — по гистограмме в памяти"""
+    session = await sessions.get(user_id)
+    if not session.known:
+        return None
+    return leaderboard.rank_of(session.score), session.score
+
+
+def format_leaderboard(page: int, my_rank) -> str:
+    lines = ["🏆 Чемпионы\n"]
+    for place, user_id, name, score in leaderboard.page(page, config.LEADERBOARD_PAGE_SIZE):
+        lines.append(f"{place}. {html.quote(name or f'Игрок {user_id}')} — {score}")
+    if len(lines) == 1:
+        lines.append("Пока никто не набрал очков. Сыграйте первым!")
+    if my_rank:
+        rank, score = my_rank
+        lines.append(f"\nВаше место: {rank} из {leaderboard.players} ({score} очков)")
+    return "\n".join(lines)
+
+
+@router.message(F.text == "Чемпионы")
+async def leaderboard_handler(msg: Message):
+    try:
+        my_rank = await get_my_rank(msg.from_user.id)
+    except Exception as e:
+        logging.error(f"Ошибка при получении места игрока {msg.from_user.id}: {e}")
+        my_rank = None
+
+    if not leaderboard.loaded:
+        await msg.answer("Таблица чемпионов ещё загружается. Попробуйте через минуту.")
+        return
+    await msg.answer(
+        format_leaderboard(0, my_rank),
+        reply_markup=get_leaderboard_keyboard(0, leaderboard.pages(config.LEADERBOARD_PAGE_SIZE))
+    )
+
+
+@router.callback_query(LeaderboardCallback.filter())
+async def leaderboard_page_handler(callback: CallbackQuery, callback_data: LeaderboardCallback):
+    pages = leaderboard.pages(config.LEADERBOARD_PAGE_SIZE)
+    page = min(max(callback_data.page, 0), pages - 1)
+    try:
+        my_rank = await get_my_rank(callback.from_user.id)
+    except Exception as e:
+        logging.error(f"Ошибка при получении места игрока {callback.from_user.id}: {e}")
+        my_rank = None
+
+    try:
+        await callback.message.edit_text(
+            format_leaderboard(page, my_rank),
+            reply_markup=get_leaderboard_keyboard(page, pages)
+        )
+    except Exception as e:
+        # Та же страница без изменений — Telegram отвечает «message is not modified»
+        logging.debug(f"Страница чемпионов не обновлена: {e}")
+    await callback.answer()
 
 
 @router.message(F.text == "Начать игру")
@@ -1,8 +1,18 @@
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import CallbackQuery, Message
-from bot.utils.db import create_connection
+from aiogram.types import CallbackQuery, Message, Update
+from bot.utils.db import acquire
+from bot.utils.question_bank import question_bank
+from bot.utils.outbound import Priority, outbound
+from bot.utils.game_engine import games
+from bot.utils.lobby import lobbies
+from bot.utils.matchmaking import matchmaking, skill_rating
+from bot.utils.sessions import sessions
+from bot.utils.room_actor import room_actors
+from bot.utils.supervisor import supervisor
+from bot.utils.sharding import MAINTENANCE_KEY, MATCHMAKING_KEY, cluster, room_key, user_key
+from bot.keyboards.game_kb import BANK_OPTION, AnswerCallback, LeaderboardCallback
 from bot.keyboards import game_kb
 from bot.handlers.commands import get_welcome_message, start_buttons
 import logging
@@ -13,6 +23,11 @@ from typing import Optional
 setup_logging()
 router = Router()
 
+ROOM_CAPACITY = 4  # Мест в комнате
+GAMES_FULL_TEXT = "⏳ Сейчас идёт слишком много игр. Попробуйте начать чуть позже."
+GAME_START_FAILED_TEXT = "⚠️ Не удалось начать игру. Комната распущена — попробуйте ещё раз."
+SEARCHING_TEXT = "🔎 Вы в поиске соперников. Сначала отмените поиск."
+
 
 class GameStates(StatesGroup):
     waiting_for_room_id = State()
@@ -46,374 +61,389 @@ async def back_to_main_handler(callback: CallbackQuery, state: FSMContext):
 
 async def is_user_in_room(user_id: int) -> bool:
     """Проверяет, находится ли пользователь в какой-либо комнате"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            # Явная проверка на NULL и числовые значения
-            cursor.execute(
-                "SELECT current_room_id FROM players WHERE id = %s AND current_room_id IS NOT NULL",
-                (user_id,)
-            )
-            result = cursor.fetchone()
-            return result is not None
-        except Exception as e:
-            logging.error(f"Ошибка проверки нахождения в комнате: {e}")
-            return False
-        finally:
-            connection.close()
-    return False
+    try:
+        return await sessions.room_of(user_id) is not None
+    except Exception as e:
+        logging.error(f"Ошибка проверки нахождения в комнате: {e}")
+        return False
 
 
 async def add_player_to_room(user_id: int, room_id: int) -> bool:
     """Добавляет игрока в комнату"""
     if await is_user_in_room(user_id):
         return False
+    # Комната может жить в другом процессе (режим шардов) — вход выполняет её владелец
+    return await cluster.call(room_id, "join", user_id, room_id)
 
-    connection = create_connection()
-    if not connection:
-        return False
+
+async def _enqueue_join(user_id: int, room_id: int) -> bool:
+    # Всё, что меняет комнату, выполняется её актором по очереди
+    return await room_actors.call(room_id, "join", _join_room, user_id, room_id)
+
+
+async def _join_room(user_id: int, room_id: int) -> bool:
+    if room_id in games or not lobbies.accepts(room_id):
+        return False  # игра в комнате уже идёт или стартует
 
     try:
-        cursor = connection.cursor()
+        async with acquire() as connection:
+            cursor = connection.cursor()
 
-        # Обновляем запись игрока
-        cursor.execute(
-            "UPDATE players SET current_room_id = %s WHERE id = %s",
-            (room_id, user_id)
-        )
+            # Без FOR UPDATE: изменения комнаты и так идут через её актор строго по одному
+            await cursor.execute(
+                "SELECT is_private, free_slots FROM rooms WHERE id = %s",
+                (room_id,)
+            )
+            room = cursor.fetchone()
+            if room is None or room[1] <= 0:
+                logging.error(f"Нет свободных слотов в комнате {room_id}")
+                await connection.rollback()
+                return False
+            is_private, free_slots = room
+
+            # Игрок занимает комнату, только если ещё ни в какой не состоит — кэш сессий мог устареть
+            await cursor.execute(
+                "UPDATE players SET current_room_id = %s WHERE id = %s AND current_room_id IS NULL",
+                (room_id, user_id)
+            )
+            if cursor.rowcount == 0:
+                await connection.rollback()
+                sessions.invalidate(user_id)
+                return False
+
+            # Занятые слоты — не больше ROOM_CAPACITY строк по первичному ключу (room_id, slot)
+            await cursor.execute("SELECT slot FROM room_members WHERE room_id = %s", (room_id,))
+            taken = {row[0] for row in cursor.fetchall()}
+            slot = next(i for i in range(1, ROOM_CAPACITY + 1) if i not in taken)
+
+            await cursor.execute(
+                "INSERT INTO room_members (room_id, user_id, slot) VALUES (%s, %s, %s)",
+                (room_id, user_id, slot)
+            )
+            await cursor.execute("UPDATE rooms SET free_slots = free_slots - 1 WHERE id = %s", (room_id,))
+            await connection.commit()
+        sessions.set_room(user_id, room_id)
 
-        # Находим первый пустой слот в комнате
-        cursor.execute("""
-            SELECT 
-                player1_id, 
-                player2_id, 
-                player3_id, 
-                player4_id 
-            FROM rooms 
-            WHERE id = %s
-            FOR UPDATE
-        """, (room_id,))
-        players = cursor.fetchone()
-
-        update_query = None
-        params = ()
-
-        # Проверяем слоты и обновляем первый пустой
-        for i in range(4):
-            if players[i] is None:
-                column_name = f"player{i + 1}_id"
-                update_query = f"UPDATE rooms SET {column_name} = %s WHERE id = %s"
-                params = (user_id, room_id)
-                break
-
-        if not update_query:
-            logging.error(f"Нет свободных слотов в комнате {room_id}")
-            return False
-
-        cursor.execute(update_query, params)
-        connection.commit()
+        # Координатор лобби узнаёт о новом участнике без опроса БД
+        lobbies.joined(room_id, user_id, ROOM_CAPACITY - free_slots + 1, bool(is_private))
         return True
 
     except Exception as e:
         logging.error(f"Ошибка добавления игрока {user_id} в комнату {room_id}: {str(e)}")
-        connection.rollback()
         return False
-    finally:
-        connection.close()
 
 
 async def remove_player_from_room(user_id: int) -> bool:
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+    try:
+        room_id = await sessions.room_of(user_id)
+    except Exception as e:
+        logging.error(f"Ошибка удаления игрока из комнаты: {e}")
+        return False
+    if room_id is None:
+        return await _leave_room(user_id, None)
+    return await room_actors.call(room_id, "leave", _leave_room, user_id, room_id)
 
-            # 1. Получаем room_id перед удалением
-            cursor.execute("SELECT current_room_id FROM players WHERE id = %s", (user_id,))
-            result = cursor.fetchone()
-            room_id = result[0] if result else None
 
-            # 2. Обнуляем current_room_id у игрока
-            cursor.execute("UPDATE players SET current_room_id = NULL WHERE id = %s", (user_id,))
+async def _leave_room(user_id: int, room_id: Optional[int]) -> bool:
+    try:
+        async with acquire() as connection:
+            cursor = connection.cursor()
+
+            # 1. Обнуляем current_room_id у игрока
+            await cursor.execute("UPDATE players SET current_room_id = NULL WHERE id = %s", (user_id,))
 
-            # 3. Удаляем игрока из таблицы rooms
+            # 2. Освобождаем слот игрока
+            players_count = 0
             if room_id:
-                cursor.execute("""
-                    UPDATE rooms SET
-                        player1_id = CASE WHEN player1_id = %s THEN NULL ELSE player1_id END,
-                        player2_id = CASE WHEN player2_id = %s THEN NULL ELSE player2_id END,
-                        player3_id = CASE WHEN player3_id = %s THEN NULL ELSE player3_id END,
-                        player4_id = CASE WHEN player4_id = %s THEN NULL ELSE player4_id END
-                    WHERE id = %s
-                """, (user_id, user_id, user_id, user_id, room_id))
-
-                # 🔥 Новый код — проверяем, пустая ли теперь комната
-                cursor.execute("""
-                    SELECT 
-                        (player1_id IS NOT NULL) + 
-                        (player2_id IS NOT NULL) + 
-                        (player3_id IS NOT NULL) + 
-                        (player4_id IS NOT NULL)
-                    FROM rooms WHERE id = %s
-                """, (room_id,))
-                count_result = cursor.fetchone()
-                if count_result and count_result[0] == 0:
-                    cursor.execute("DELETE FROM rooms WHERE id = %s", (room_id,))
+                await cursor.execute(
+                    "DELETE FROM room_members WHERE room_id = %s AND user_id = %s",
+                    (room_id, user_id)
+                )
+                if cursor.rowcount:
+                    await cursor.execute("UPDATE rooms SET free_slots = free_slots + 1 WHERE id = %s", (room_id,))
+
+                await cursor.execute("SELECT free_slots FROM rooms WHERE id = %s", (room_id,))
+                room = cursor.fetchone()
+                players_count = ROOM_CAPACITY - room[0] if room else 0
+                if room and players_count == 0:
+                    await cursor.execute("DELETE FROM rooms WHERE id = %s", (room_id,))
                     logging.info(f"[room {room_id}] Комната была пуста и удалена")
 
-            connection.commit()
-            return True
+            await connection.commit()
 
-        except Exception as e:
-            logging.error(f"Ошибка удаления игрока из комнаты: {e}")
-            connection.rollback()
-            return False
-        finally:
-            connection.close()
-    return False
+        sessions.set_room(user_id, None)
+        if room_id:
+            lobbies.left(room_id, user_id, players_count)
+            if players_count == 0:
+                supervisor.cancel_group(("room", room_id))  # комнаты больше нет — её задачи не нужны
+        return True
+
+    except Exception as e:
+        logging.error(f"Ошибка удаления игрока из комнаты: {e}")
+        return False
 
 
 
 async def get_room_players_count(room_id: int) -> int:
-    connection = create_connection()
-    if connection:
-        try:
+    try:
+        async with acquire() as connection:
             cursor = connection.cursor()
-            cursor.execute("""
-                SELECT 
-                    (player1_id IS NOT NULL) + 
-                    (player2_id IS NOT NULL) + 
-                    (player3_id IS NOT NULL) + 
-                    (player4_id IS NOT NULL)
-                FROM rooms
-                WHERE id = %s
-            """, (room_id,))
+            await cursor.execute("SELECT free_slots FROM rooms WHERE id = %s", (room_id,))
             result = cursor.fetchone()
             if result is None:
                 logging.warning(f"[room {room_id}] Комната не найдена.")
                 return 0
-            count = result[0]
+            count = ROOM_CAPACITY - result[0]
             logging.info(f"[room {room_id}] В комнате {count} игроков")
             return count
-        except Exception as e:
-            logging.error(f"[room {room_id}] Ошибка при подсчёте игроков: {e}")
-        finally:
-            connection.close()
+    except Exception as e:
+        logging.error(f"[room {room_id}] Ошибка при подсчёте игроков: {e}")
     return 0
 
 
-# Новая функция для автоматического старта игры
-async def start_game_automatically(room_id: int):
-    """Запускает игру автоматически и уведомляет игроков"""
+async def start_game_automatically(room_id: int, members: dict):
+    """Запускает игру по истечении отсчёта лобби.
+
+    members — {user_id: (chat_id, message_id) или None} из лобби: состав уже известен,
+    а сообщение статуса становится сообщением игры.
+    """
+    engine = games.create(room_id, outbound.bot)
+    if engine is None:
+        # Процесс и так ведёт предельное число игр — комнату распускаем, игроков предупреждаем
+        await abort_start(room_id, members, GAMES_FULL_TEXT)
+        return
+
     try:
-        connection = create_connection()
-        if connection:
-            players = await get_room_players(room_id)
-            for player_id in players:
-                # Отправляем сообщение каждому игроку
-                # Здесь должна быть логика начала игры (ваш код)
-                pass
-            logging.info(f"Игра в комнате {room_id} начата автоматически")
+        async with acquire() as connection:
+            cursor = connection.cursor()
+            await cursor.executemany(
+                "INSERT INTO game_players (room_id, user_id) VALUES (%s, %s)",
+                [(room_id, user_id) for user_id in members]
+            )
+            await connection.commit()
+
+        engine.message_ids = {
+            user_id: target[1] for user_id, target in members.items() if target is not None
+        }
+        await engine.start_game()
+        logging.info(f"Игра в комнате {room_id} начата автоматически")
     except Exception as e:
+        games.remove(room_id)
         logging.error(f"Ошибка при автоматическом старте игры: {e}")
+        # Иначе игроки остались бы привязаны к комнате без игры
+        await abort_start(room_id, members, GAME_START_FAILED_TEXT)
+
+
+async def abort_start(room_id: int, members: dict, text: str):
+    """Распускает комнату, игра в которой не началась, и сообщает об этом участникам"""
+    await release_room(room_id, list(members))
+    await asyncio.gather(*(
+        outbound.send(user_id, text, Priority.LOBBY_STATUS, reply_markup=game_kb.back_to_main_keyboard)
+        for user_id in members
+    ), return_exceptions=True)
+
+
+async def release_room(room_id: int, user_ids: list[int]):
+    """Удаляет комнату, игра в которой так и не началась; участники удаляются каскадом"""
+    try:
+        async with acquire() as connection:
+            cursor = connection.cursor()
+            await cursor.execute("UPDATE players SET current_room_id = NULL WHERE current_room_id = %s", (room_id,))
+            await cursor.execute("DELETE FROM rooms WHERE id = %s", (room_id,))
+            await connection.commit()
+    except Exception as e:
+        logging.error(f"[room {room_id}] Ошибка при удалении комнаты: {e}")
+        return
+    for user_id in user_ids:
+        sessions.set_room(user_id, None)
+    supervisor.cancel_group(("room", room_id))
+
+
+async def start_game_in_room(room_id: int, members: dict):
+    """Старт игры — тоже событие комнаты: встаёт в очередь после уже пришедших входов и выходов"""
+    await room_actors.call(room_id, "start", start_game_automatically, room_id, members)
+
+
+lobbies.on_countdown_end = start_game_in_room
+
+
+async def attach_status_message(room_id: int, user_id: int, chat_id: int, message_id: int):
+    """Передаёт сообщение статуса координатору лобби — в процессе, где живёт комната"""
+    await cluster.call(room_id, "attach", room_id, user_id, chat_id, message_id)
+
+
+async def _start_matched_room(room_id: int, members: list):
+    # Через процессы состав идёт JSON-списком [user_id, chat_id, message_id]
+    await start_game_in_room(room_id, {user_id: (chat_id, message_id) for user_id, chat_id, message_id in members})
+
+
+cluster.register("join", _enqueue_join)
+cluster.register("attach", lobbies.attach)
+cluster.register("start", _start_matched_room)
 
 
 async def get_user_room_id(user_id: int) -> Optional[int]:
     """Возвращает ID комнаты пользователя"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            cursor.execute("SELECT current_room_id FROM players WHERE id = %s", (user_id,))
-            result = cursor.fetchone()
-            return int(result[0]) if result and result[0] is not None else None
-        except (ValueError, TypeError) as e:
-            logging.error(f"Ошибка преобразования room_id: {e}")
-            return None
-        except Exception as e:
-            logging.error(f"Ошибка получения комнаты игрока: {e}")
-            return None
-        finally:
-            connection.close()
-    return None
+    try:
+        room_id = await sessions.room_of(user_id)
+        return int(room_id) if room_id is not None else None
+    except (ValueError, TypeError) as e:
+        logging.error(f"Ошибка преобразования room_id: {e}")
+        return None
+    except Exception as e:
+        logging.error(f"Ошибка получения комнаты игрока: {e}")
+        return None
 
 
 async def get_room_players(room_id: int) -> list[int]:
     """Возвращает список ID игроков в комнате"""
-    connection = create_connection()
-    if connection:
-        try:
+    try:
+        async with acquire() as connection:
             cursor = connection.cursor()
-            cursor.execute("SELECT id FROM players WHERE current_room_id = %s", (room_id,))
+            await cursor.execute("SELECT user_id FROM room_members WHERE room_id = %s ORDER BY slot", (room_id,))
             result = cursor.fetchall()
             return [row[0] for row in result] if result else []
-        except Exception as e:
-            logging.error(f"Ошибка получения списка игроков: {e}")
-            return []
-        finally:
-            connection.close()
-    return []
+    except Exception as e:
+        logging.error(f"Ошибка получения списка игроков: {e}")
+        return []
 
 
 async def create_room(user_id: int, is_private: bool) -> int:
     """Создает новую комнату (без установки current_room_id у игрока)"""
-    connection = create_connection()
-    if connection:
-        try:
+    try:
+        # Случайный вопрос берём из банка в памяти, без ORDER BY RAND()
+        if not question_bank.loaded:
+            await question_bank.reload()
+        question_id = question_bank.draw()
+        if question_id is None:
+            raise Exception("В базе нет вопросов")
+
+        async with acquire() as connection:
             cursor = connection.cursor()
 
-            # Получаем случайный вопрос
-            cursor.execute("SELECT id FROM questions ORDER BY RAND() LIMIT 1")
-            question_id = cursor.fetchone()[0]
-
-            # Создаем комнату (без назначения игрока в player1_id!)
-            cursor.execute(
+            # Создаем комнату (без занятия слота игроком!)
+            await cursor.execute(
                 "INSERT INTO rooms (question_id, is_private) VALUES (%s, %s)",
                 (question_id, is_private)
             )
             room_id = cursor.lastrowid
 
-            connection.commit()
+            await connection.commit()
             return int(room_id)
 
-        except Exception as e:
-            logging.error(f"Ошибка создания комнаты: {e}")
-            connection.rollback()
-            raise Exception("Не удалось создать комнату")
+    except Exception as e:
+        logging.error(f"Ошибка создания комнаты: {e}")
+        raise Exception("Не удалось создать комнату")
 
-        finally:
-            cursor.close()
-            connection.close()
 
-    raise Exception("Не удалось подключиться к базе данных")
+async def get_player_skill(user_id: int) -> int:
+    """Рейтинг игрока для подбора соперников"""
+    try:
+        session = await sessions.get(user_id)
+        return skill_rating(session.score, session.wins)
+    except Exception as e:
+        logging.error(f"Ошибка получения рейтинга игрока {user_id}: {e}")
+        return 0
 
 
-async def find_or_create_public_room(user_id: int) -> int:
-    """Находит или создает публичную комнату"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
+async def create_matched_room(user_ids: list[int]) -> int:
+    """Сохраняет уже собранную очередью комнату: комната и игроки — одной транзакцией"""
+    if not question_bank.loaded:
+        await question_bank.reload()
+    question_id = question_bank.draw()
+    if question_id is None:
+        raise Exception("В базе нет вопросов")
+
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    async with acquire() as connection:
+        cursor = connection.cursor()
+        await cursor.execute(
+            "INSERT INTO rooms (question_id, is_private, free_slots) VALUES (%s, FALSE, %s)",
+            (question_id, ROOM_CAPACITY - len(user_ids))
+        )
+        room_id = cursor.lastrowid
+        await cursor.executemany(
+            "INSERT INTO room_members (room_id, user_id, slot) VALUES (%s, %s, %s)",
+            [(room_id, user_id, slot) for slot, user_id in enumerate(user_ids, start=1)]
+        )
+        await cursor.execute(
+            f"UPDATE players SET current_room_id = %s WHERE id IN ({placeholders})",
+            (room_id, *user_ids)
+        )
+        await connection.commit()
+    for user_id in user_ids:
+        sessions.set_room(user_id, room_id)
+    return int(room_id)
 
-            # Исправленный SQL-запрос (добавлена закрывающая скобка)
-            cursor.execute("""
-                SELECT r.id 
-                FROM rooms r
-                WHERE r.is_private = FALSE 
-                AND (
-                    r.player1_id IS NULL OR
-                    r.player2_id IS NULL OR
-                    r.player3_id IS NULL OR
-                    r.player4_id IS NULL
-                )  # <-- Закрывающая скобка добавлена
-                LIMIT 1
-            """)
-            room = cursor.fetchone()
 
-            if room:
-                return int(room[0])
-            else:
-                return await create_room(user_id, is_private=False)
-        except Exception as e:
-            logging.error(f"Ошибка поиска публичной комнаты: {e}")
-            raise Exception("Не удалось найти или создать комнату")
-        finally:
-            connection.close()
-    raise Exception("Не удалось подключиться к базе данных")
+async def get_users_in_rooms(user_ids: list[int]) -> set[int]:
+    """Кто из игроков уже в комнате — прямо из БД: кэш сессий мог не застать вход"""
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    async with acquire() as connection:
+        cursor = connection.cursor()
+        await cursor.execute(
+            f"SELECT id FROM players WHERE id IN ({placeholders}) AND current_room_id IS NOT NULL",
+            user_ids
+        )
+        return {row[0] for row in cursor.fetchall()}
 
 
-# Модифицированная фоновая задача с таймерами
-async def update_room_status_periodically(message: Message, room_id: int, stop_event: asyncio.Event):
+async def start_matched_game(entries: list):
+    """Очередь подобрала соперников: сохраняем комнату и сразу запускаем игру"""
+    user_ids = [entry.user_id for entry in entries]
     try:
-        countdown_total = 90  # Общее время таймера (сек)
-        countdown_remaining = countdown_total
-        min_players_timer_started = False
-        min_players_start_time = None
-
-        while not stop_event.is_set():
-            # await asyncio.sleep(1)
-
-            players_count = await get_room_players_count(room_id)
-
-            connection = create_connection()
-            if connection:
-                try:
-                    cursor = connection.cursor()
-                    cursor.execute("SELECT is_private FROM rooms WHERE id = %s", (room_id,))
-                    result = cursor.fetchone()
-                    if result and result[0]:
-                        logging.info(f"[room {room_id}] Приватная комната — таймер не запускается")
-                        stop_event.set()
-                        return
-                except Exception as e:
-                    logging.error(f"[room {room_id}] Ошибка получения is_private: {e}")
-                finally:
-                    connection.close()
+        busy = await get_users_in_rooms(user_ids)
+    except Exception as e:
+        logging.error(f"Ошибка проверки комнат игроков {user_ids}: {e}")
+        busy = set()
+    if busy:
+        # Пока шёл поиск, кто-то зашёл в другую комнату: его снимаем, остальные ищут дальше
+        await asyncio.gather(*(
+            outbound.edit(entry.chat_id, entry.message_id, "⚠️ Вы уже в другой комнате — поиск отменён",
+                          Priority.LOBBY_STATUS, reply_markup=game_kb.back_to_main_keyboard)
+            for entry in entries if entry.user_id in busy
+        ), return_exceptions=True)
+        requeued = matchmaking.requeue([entry for entry in entries if entry.user_id not in busy])
+        logging.info(f"Матч {user_ids} сорвался: уже в комнатах {sorted(busy)}, в очередь возвращено {requeued}")
+        return
+    if not cluster.is_worker and not games.admits():
+        # Комнату даже не создаём: игра всё равно не будет допущена (у шардов решает процесс-владелец)
+        await asyncio.gather(*(
+            outbound.edit(entry.chat_id, entry.message_id, GAMES_FULL_TEXT,
+                          Priority.LOBBY_STATUS, reply_markup=game_kb.back_to_main_keyboard)
+            for entry in entries
+        ), return_exceptions=True)
+        return
+    try:
+        room_id = await create_matched_room(user_ids)
+    except Exception as e:
+        logging.error(f"Ошибка создания комнаты для игроков {user_ids}: {e}")
+        await asyncio.gather(*(
+            outbound.edit(entry.chat_id, entry.message_id, "❌ Не удалось создать игру. Попробуйте ещё раз.",
+                          Priority.LOBBY_STATUS, reply_markup=game_kb.back_to_main_keyboard)
+            for entry in entries
+        ), return_exceptions=True)
+        return
 
-            if players_count == 0:
-                logging.info(f"[room {room_id}] Нет игроков, удаляю комнату...")
-                connection = create_connection()
-                if connection:
-                    try:
-                        cursor = connection.cursor()
-                        cursor.execute("DELETE FROM rooms WHERE id = %s", (room_id,))
-                        connection.commit()
-                        logging.info(f"[room {room_id}] Комната удалена")
-                    except Exception as e:
-                        logging.error(f"[room {room_id}] Ошибка при удалении: {e}")
-                    finally:
-                        connection.close()
-                stop_event.set()
-                break
-
-            # Если игроков >= 2, запускаем или продолжаем таймер
-            if players_count >= 2:
-                if not min_players_timer_started:
-                    min_players_timer_started = True
-                    min_players_start_time = asyncio.get_event_loop().time()
-                    countdown_remaining = countdown_total  # Обновляем отсчёт
-
-                else:
-                    elapsed = asyncio.get_event_loop().time() - min_players_start_time
-                    countdown_remaining = max(0, countdown_total - int(elapsed))
-
-                # Если таймер истёк — запускаем игру
-                if countdown_remaining == 0:
-                    await message.edit_text("⌛ Время ожидания истекло. Игра начинается!")
-                    await start_game_automatically(room_id)
-                    stop_event.set()
-                    break
-
-                try:
-                    await message.edit_text(
-                        f"⏳ Игроков: {players_count}/4\n"
-                        f"⌛ Игра начнётся через: {countdown_remaining} сек",
-                        reply_markup=game_kb.get_room_status_keyboard(room_id, players_count)
-                    )
-                except:
-                    pass
-
-            # Если игроков стало меньше 2 — сбрасываем таймер
-            else:
-                if min_players_timer_started:
-                    logging.info(f"В комнате {room_id} осталось <2 игроков — таймер сброшен")
-                    min_players_timer_started = False
-                    min_players_start_time = None
-                    countdown_remaining = countdown_total
-
-                try:
-                    await message.edit_text(
-                        f"🕐 Ожидаем игроков... ({players_count}/4)",
-                        reply_markup=game_kb.get_room_status_keyboard(room_id, players_count)
-                    )
-                except:
-                    pass
-
-            await asyncio.sleep(1)
+    await asyncio.gather(*(
+        outbound.edit(entry.chat_id, entry.message_id,
+                      f"✅ Соперники найдены! Игроков: {len(entries)}/4. Игра начинается!",
+                      Priority.LOBBY_STATUS)
+        for entry in entries
+    ), return_exceptions=True)
+    # Комната получила id только что и может принадлежать другому процессу — игру ведёт он
+    await cluster.call(room_id, "start", room_id, [
+        [entry.user_id, entry.chat_id, entry.message_id] for entry in entries
+    ])
+
+
+matchmaking.on_match = start_matched_game
+cluster.register("is_queued", matchmaking.is_queued)
 
-    except Exception as e:
-        logging.error(f"Фоновая задача комнаты {room_id} завершилась с ошибкой: {e}", exc_info=True)
+
+async def is_searching(user_id: int) -> bool:
+    """Стоит ли игрок в очереди подбора — спрашиваем процесс, где живёт очередь"""
+    return await cluster.call_key(MATCHMAKING_KEY, "is_queued", user_id)
 
 
 @router.message(F.text == "Начать игру")
@@ -439,6 +469,9 @@ async def play_with_friends_handler(callback: CallbackQuery, state: FSMContext):
         if await is_user_in_room(user_id):
             await callback.answer("⚠️ Вы уже в другой комнате!", show_alert=True)
             return
+        if await is_searching(user_id):
+            await callback.answer(SEARCHING_TEXT, show_alert=True)
+            return
         await callback.message.answer(
             "Выберите действие:",
             reply_markup=game_kb.friends_action_keyboard
@@ -461,6 +494,9 @@ async def handle_friends_action(callback: CallbackQuery, state: FSMContext):
         if await is_user_in_room(user_id):
             await callback.answer("⚠️ Вы уже в другой комнате!", show_alert=True)
             return
+        if await is_searching(user_id):
+            await callback.answer(SEARCHING_TEXT, show_alert=True)
+            return
 
         if callback.data == "create_room":
             # Создаем комнату
@@ -474,15 +510,11 @@ async def handle_friends_action(callback: CallbackQuery, state: FSMContext):
                 reply_markup=game_kb.get_room_status_keyboard(room_id, 1)
             )
 
-            # Запускаем фоновую задачу с таймерами
-            stop_event = asyncio.Event()
-            task = asyncio.create_task(update_room_status_periodically(msg, room_id, stop_event))
-
+            # Дальше сообщение статуса обновляет координатор лобби
+            await attach_status_message(room_id, user_id, msg.chat.id, msg.message_id)
             await state.update_data({
                 'room_id': room_id,
-                'stop_event': stop_event,
-                'status_message_id': msg.message_id,
-                'background_task': task
+                'status_message_id': msg.message_id
             })
 
         else:
@@ -501,12 +533,6 @@ async def leave_room_handler(callback: CallbackQuery, state: FSMContext):
     """Обработчик выхода из комнаты"""
     try:
         user_id = callback.from_user.id
-        data = await state.get_data()
-
-        if 'background_task' in data:
-            data['stop_event'].set()
-            data['background_task'].cancel()
-
         success = await remove_player_from_room(user_id)
         if success:
             await callback.message.edit_text(
@@ -532,10 +558,12 @@ async def refresh_room_status_handler(callback: CallbackQuery):
     """Обновление статуса комнаты без логирования"""
     try:
         user_id = callback.from_user.id
-        room_id = await get_user_room_id(user_id)
+        room_id = lobbies.room_of(user_id) or await get_user_room_id(user_id)
 
         if room_id:
-            players_count = await get_room_players_count(room_id)
+            players_count = lobbies.players_count(room_id)
+            if players_count is None:
+                players_count = await get_room_players_count(room_id)
             await callback.message.edit_reply_markup(
                 reply_markup=game_kb.get_room_status_keyboard(room_id, players_count)
             )
@@ -568,6 +596,29 @@ async def back_to_main_handler(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
 
 
+@router.callback_query(AnswerCallback.filter())
+async def answer_handler(callback: CallbackQuery, callback_data: AnswerCallback):
+    """Ответ на вопрос раунда: всё решается в памяти движка, без обращения к БД"""
+    engine = games.get(callback_data.game)
+    if engine is None or callback_data.round != engine.round_number:
+        await callback.answer("⌛ Этот вопрос уже закрыт")
+        return
+
+    try:
+        # Имя игрока попадёт в players и таблицу чемпионов вместе с итогами игры
+        engine.names[callback.from_user.id] = callback.from_user.full_name[:64]
+        # Ответ обрабатывает актор комнаты — по очереди с концом раунда и другими ответами
+        kind = "bank" if callback_data.option == BANK_OPTION else "answer"
+        accepted = await room_actors.call(
+            callback_data.game, kind, engine.handle_answer,
+            callback.from_user.id, callback_data.round, callback_data.option
+        )
+        await callback.answer("✅ Ответ принят" if accepted else "⌛ Ответ уже не принимается")
+    except Exception as e:
+        logging.error(f"Ошибка обработки ответа в игре {callback_data.game}: {e}")
+        await callback.answer("❌ Ошибка")
+
+
 @router.callback_query(F.data == "join_room_by_id")
 async def join_room_by_id_handler(callback: CallbackQuery, state: FSMContext):
     """Обработчик ввода ID комнаты"""
@@ -587,38 +638,19 @@ async def play_random_handler(callback: CallbackQuery, state: FSMContext):
             await callback.answer("⚠️ Вы уже в другой комнате!", show_alert=True)
             return
 
-        # Находим или создаем публичную комнату
-        logging.info(f"Поиск публичной комнаты для {user_id}")
-        room_id = await find_or_create_public_room(user_id)
-        logging.info(f"Найдена/создана комната {room_id}")
-
-        # Добавляем игрока в комнату
-        logging.info(f"Попытка добавить {user_id} в комнату {room_id}")
-        success = await add_player_to_room(user_id, room_id)
-        if not success:
-            await callback.answer("❌ Не удалось присоединиться")
+        # Этот апдейт фронт уже отдал процессу очереди (MATCHMAKING_KEY) — спрашиваем на месте
+        if matchmaking.is_queued(user_id):
+            await callback.answer("🔎 Поиск соперников уже идёт")
             return
 
-        # Отправляем сообщение
-        logging.info(f"Отправка сообщения для {user_id}")
+        # Комната сохраняется в БД только после того, как очередь соберёт игроков
+        skill = await get_player_skill(user_id)
         msg = await callback.message.answer(
-            f"✅ Вы присоединились к игре! Ожидаем других игроков...",
-            reply_markup=game_kb.get_room_status_keyboard(
-                room_id,
-                await get_room_players_count(room_id)
-            )
+            "🔎 Ищем соперников...",
+            reply_markup=game_kb.search_keyboard
         )
-        logging.info(f"Сообщение отправлено: ID {msg.message_id}")
-
-        # Запуск фоновой задачи
-        stop_event = asyncio.Event()
-        task = asyncio.create_task(update_room_status_periodically(msg, room_id, stop_event))
-        await state.update_data({
-            'room_id': room_id,
-            'stop_event': stop_event,
-            'status_message_id': msg.message_id,
-            'background_task': task
-        })
+        matchmaking.enqueue(user_id, skill, msg.chat.id, msg.message_id)
+        logging.info(f"Игрок {user_id} (рейтинг {skill}) встал в очередь подбора")
 
         await callback.answer()
 
@@ -627,6 +659,16 @@ async def play_random_handler(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Не удалось присоединиться к комнате")
 
 
+@router.callback_query(F.data == "cancel_search")
+async def cancel_search_handler(callback: CallbackQuery):
+    """Выход из очереди подбора соперников"""
+    if matchmaking.cancel(callback.from_user.id):
+        await callback.message.edit_text("Поиск отменён", reply_markup=game_kb.back_to_main_keyboard)
+        await callback.answer()
+    else:
+        await callback.answer("⌛ Соперники уже найдены")
+
+
 @router.message(GameStates.waiting_for_room_id)
 async def process_room_id(msg: Message, state: FSMContext):
     try:
@@ -638,37 +680,27 @@ async def process_room_id(msg: Message, state: FSMContext):
             await msg.answer("❌ Вы уже в другой комнате!")
             await state.clear()
             return
+        if await is_searching(user_id):
+            await msg.answer(SEARCHING_TEXT)
+            return
 
-        connection = create_connection()
-        if connection:
+        async with acquire() as connection:
             cursor = connection.cursor()
-            cursor.execute("SELECT id FROM rooms WHERE id = %s", (room_id,))
-            if cursor.fetchone():
-                await add_player_to_room(user_id, room_id)
-
-                stop_event = asyncio.Event()
-                msg = await msg.answer(
-                    f"✅ Вы в комнате {room_id}",
-                    reply_markup=game_kb.get_room_status_keyboard(
-                        room_id,
-                        await get_room_players_count(room_id)
-                    )
-                )
+            await cursor.execute("SELECT id FROM rooms WHERE id = %s", (room_id,))
+            room_exists = cursor.fetchone() is not None
+
+        if room_exists:
+            if not await add_player_to_room(user_id, room_id):
+                await msg.answer("❌ Не удалось присоединиться к комнате")
+                return
 
-                try:
-                    task = asyncio.create_task(update_room_status_periodically(msg, room_id, stop_event))
-                    await state.update_data({
-                        'room_id': room_id,
-                        'stop_event': stop_event,
-                        'status_message_id': msg.message_id,
-                        'background_task': task
-                    })
-                except Exception as e:
-                    logging.error(f"Ошибка запуска автообновления: {e}")
-                    stop_event.set()
-            else:
-                await msg.answer("❌ Комната не найдена")
-            connection.close()
+            msg = await msg.answer(
+                f"✅ Вы в комнате {room_id}",
+                reply_markup=game_kb.get_room_status_keyboard(room_id, lobbies.players_count(room_id) or 1)
+            )
+            await attach_status_message(room_id, user_id, msg.chat.id, msg.message_id)
+        else:
+            await msg.answer("❌ Комната не найдена")
     except ValueError:
         await msg.answer("❌ Введите числовой ID комнаты")
     except Exception as e:
@@ -676,3 +708,38 @@ async def process_room_id(msg: Message, state: FSMContext):
         await msg.answer("❌ Ошибка присоединения")
     finally:
         await state.clear()
+
+
+async def shard_key(update: Update, state: Optional[str]) -> str:
+    """Ключ апдейта на кольце шардов: всё о комнате уходит процессу, где она живёт.
+
+    Новый обработчик, который трогает комнату не по текущей комнате игрока,
+    должен попасть сюда же. state — состояние FSM автора сообщения.
+    """
+    callback = update.callback_query
+    if callback is not None and callback.data:
+        if callback.data.startswith(f"{AnswerCallback.__prefix__}{AnswerCallback.__separator__}"):
+            return room_key(AnswerCallback.unpack(callback.data).game)
+        if callback.data.startswith("leave_room:"):
+            return room_key(int(callback.data.split(":", 1)[1]))
+        if callback.data in ("play_random", "cancel_search"):
+            # Очередь подбора одна на все процессы, иначе соперников искали бы в N раз меньших очередях
+            return MATCHMAKING_KEY
+        if callback.data.startswith(f"{LeaderboardCallback.__prefix__}{LeaderboardCallback.__separator__}"):
+            return MAINTENANCE_KEY  # таблица чемпионов есть только в процессе общих задач
+
+    message = update.message
+    if message is not None and message.text == "Чемпионы":
+        return MAINTENANCE_KEY
+    if (message is not None and state == GameStates.waiting_for_room_id.state
+            and message.text and message.text.strip().isdigit()):
+        return room_key(int(message.text.strip()))
+
+    user = getattr(update.event, "from_user", None)
+    if user is None:
+        return f"update:{update.update_id}"
+    room_id = await get_user_room_id(user.id)
+    return room_key(room_id) if room_id is not None else user_key(user.id)
+
+
+cluster.route = shard_key
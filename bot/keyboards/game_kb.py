@@ -1,6 +1,23 @@
 import logging
+from functools import lru_cache
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from bot.utils import config
+
+BANK_OPTION = -1  # Номер «варианта» для кнопки банка
+
+
+class AnswerCallback(CallbackData, prefix="a"):
+    """Ответ в раунде: a:<game>:<round>:<option> — всегда в пределах 64 байт"""
+    game: int    # ID игры (совпадает с ID комнаты)
+    round: int   # Номер раунда — клики по старым вопросам отсекаются без БД
+    option: int  # Индекс варианта в перемешанном списке или BANK_OPTION
+
+
+class LeaderboardCallback(CallbackData, prefix="lb"):
+    """Страница таблицы чемпионов: lb:<page>"""
+    page: int
 
 # Создание клавиатуры
 start_buttons = ReplyKeyboardMarkup(
@@ -37,7 +54,15 @@ back_to_main_keyboard = InlineKeyboardMarkup(
     ]
 )
 
+search_keyboard = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="❌ Отменить поиск", callback_data="cancel_search")]
+    ]
+)
+
 
+# Клавиатуры неизменяемы (frozen), поэтому одну и ту же можно отдавать всем игрокам
+@lru_cache(maxsize=config.KEYBOARD_CACHE_SIZE)
 def get_room_status_keyboard(room_id: int, players_count: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -82,6 +107,7 @@ friends_action_keyboard = InlineKeyboardMarkup(
 
 
 # Обновленная клавиатура статуса комнаты с таймером
+@lru_cache(maxsize=config.KEYBOARD_CACHE_SIZE)
 def get_private_room_keyboard(room_id: int, players_count: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -105,3 +131,34 @@ def get_private_room_keyboard(room_id: int, players_count: int) -> InlineKeyboar
             ]
         ]
     )
+
+
+def get_answer_keyboard(game: int, round_number: int, options: tuple[str, ...]) -> InlineKeyboardMarkup:
+    """Клавиатура раунда: строится один раз на раунд и общая для всех игроков комнаты.
+
+    В колбэках зашиты игра и номер раунда, поэтому между раундами она не повторяется и не кэшируется.
+    """
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(
+                text=ans,
+                callback_data=AnswerCallback(game=game, round=round_number, option=i).pack()
+            )]
+            for i, ans in enumerate(options)
+        ] + [[InlineKeyboardButton(
+            text="💰 Банк",
+            callback_data=AnswerCallback(game=game, round=round_number, option=BANK_OPTION).pack()
+        )]]
+    )
+
+
+@lru_cache(maxsize=config.KEYBOARD_CACHE_SIZE)
+def get_leaderboard_keyboard(page: int, pages: int) -> InlineKeyboardMarkup:
+    """Листание таблицы чемпионов; на первой и последней странице лишних стрелок нет"""
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text="◀️", callback_data=LeaderboardCallback(page=page - 1).pack()))
+    buttons.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=LeaderboardCallback(page=page).pack()))
+    if page + 1 < pages:
+        buttons.append(InlineKeyboardButton(text="▶️", callback_data=LeaderboardCallback(page=page + 1).pack()))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
@@ -1,15 +1,25 @@
 import asyncio
 import logging
 import os
+import sys
 from aiogram import Bot, Dispatcher, types
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 from handlers import *
 from utils.logging_config import setup_logging
-from utils.db import create_connection
-from database.init_db import create_table
+from bot.utils import config
+from bot.utils.db import create_connection, pool
+from bot.utils.question_bank import question_bank
+from bot.utils.fsm_storage import create_storage
+from bot.utils.outbound import outbound
+from bot.utils.sweeper import sweeper
+from bot.utils.leaderboard import leaderboard
+from bot.utils.lobby import lobbies
+from bot.utils.deadlines import deadlines
+from bot.utils.supervisor import supervisor
+from bot.utils.sharding import cluster
+from database.migrate import run_migrations
 
 setup_logging()
 load_dotenv()
@@ -19,33 +29,99 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
 
-async def main():
-    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher(storage=MemoryStorage())
-
-    # Добавляем роутеры
-    dp.include_router(commands_router)
-    dp.include_router(admin_router)
-    dp.include_router(game_router)
-    dp.include_router(help_router)
-
-    # Принудительная инициализация БД
+def migrate():
+    # Схема БД: если версия актуальна, это одно чтение schema_version
     connection = create_connection()
     if connection:
         try:
-            from database.init_db import create_table
-            create_table(connection)  # Явный вызов создания таблиц
-            logging.info("Таблицы БД успешно созданы")
+            run_migrations(connection)
         except Exception as e:
-            logging.error(f"FATAL: Не удалось создать таблицы: {e}")
+            logging.error(f"FATAL: Не удалось обновить схему БД: {e}")
             raise
         finally:
             connection.close()
     else:
         logging.error("Невозможно подключиться к БД. Проверьте .env и доступы")
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+
+async def run_front(bot: Bot):
+    """Фронт режима шардов: получает апдейты и раздаёт их рабочим процессам (SHARD_WORKERS)"""
+    if config.FSM_STORAGE == "memory":
+        raise ValueError("Для нескольких процессов нужно общее хранилище FSM: FSM_STORAGE=sqlite или redis")
+    # Фронту нужны состояния FSM и комнаты игроков, чтобы выбрать процесс
+    storage = create_storage()
+    await pool.open()
+    # Лимит Telegram общий на бота — делим его между процессами
+    env = {"TELEGRAM_GLOBAL_RATE": str(config.TELEGRAM_GLOBAL_RATE / config.SHARD_WORKERS)}
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await cluster.run_front(bot, storage, lambda index: [sys.executable, os.path.abspath(__file__)], env)
+    finally:
+        await supervisor.shutdown()
+        await storage.close()
+        await pool.close()
+
+
+async def main():
+    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    if cluster.role == "front":
+        migrate()
+        await run_front(bot)
+        return
+
+    # Состояния FSM в общем хранилище (FSM_STORAGE) — их видят все процессы бота
+    dp = Dispatcher(storage=create_storage())
+
+    # Добавляем роутеры
+    dp.include_router(commands_router)
+    dp.include_router(admin_router)
+    dp.include_router(game_router)
+    dp.include_router(help_router)
+
+    # Рабочим процессам схему уже обновил фронт
+    if not cluster.is_worker:
+        migrate()
+
+    # Заранее открываем соединения пула, чтобы первые запросы не ждали рукопожатия
+    await pool.open()
+
+    # Загружаем банк вопросов в память один раз при старте
+    await question_bank.reload()
+
+    # Все игровые сообщения уходят через общую очередь с лимитами Telegram
+    outbound.start(bot)
+
+    # Периодическая уборка брошенных комнат и хвостов игр (хвосты — только в процессе общих задач)
+    sweeper.start()
+
+    # Отсчёты лобби, шедшие до перезапуска, продолжаются с сохранённого времени старта
+    try:
+        await lobbies.restore()
+    except Exception as e:
+        logging.error(f"Не удалось восстановить лобби: {e}")
+
+    # Таблица чемпионов в памяти: первая сборка сразу, дальше периодически.
+    # С шардами она одна — в процессе общих задач, туда же уходят запросы «Чемпионы»
+    if cluster.is_maintainer:
+        leaderboard.start()
+
+    try:
+        if cluster.is_worker:
+            # Апдейты приходят от фронта: этому процессу — только его комнаты и игроки
+            await cluster.serve(
+                lambda update: dp.feed_update(bot, types.Update.model_validate(update, context={"bot": bot}))
+            )
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
+    finally:
+        await leaderboard.stop()
+        await deadlines.stop()
+        await supervisor.shutdown()
+        await sweeper.stop()
+        await dp.storage.close()
+        await outbound.stop()
+        await pool.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+import os
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Параметры подключения к БД
+DB_HOST = os.getenv("DB_host")
+DB_USER = os.getenv("DB_user")
+DB_PASSWORD = os.getenv("DB_password")
+DB_DATABASE = os.getenv("DB_database")
+
+# Пул соединений с БД
+DB_POOL_MIN_SIZE = int(os.getenv("DB_pool_min_size", 2))      # Соединений, открываемых при старте
+DB_POOL_MAX_SIZE = int(os.getenv("DB_pool_max_size", 10))     # Максимум одновременно открытых соединений
+DB_POOL_RECYCLE = float(os.getenv("DB_pool_recycle", 3600))   # Возраст соединения (сек), после которого оно пересоздаётся
+DB_POOL_TIMEOUT = float(os.getenv("DB_pool_timeout", 5))      # Сколько ждать свободное соединение (сек)
+DB_POOL_PRE_PING = os.getenv("DB_pool_pre_ping", "1") == "1"  # Проверять соединение перед выдачей
+DB_POOL_PING_AFTER = float(os.getenv("DB_pool_ping_after", 5))  # Пинговать, только если соединение простаивало дольше (сек)
+
+# Банк вопросов
+QUESTION_CACHE_SIZE = int(os.getenv("QUESTION_CACHE_SIZE", 20000))  # Сколько текстов вопросов держать в памяти
+SEEN_QUESTIONS_PER_USER = int(os.getenv("SEEN_QUESTIONS_PER_USER", 200))    # Сколько последних вопросов игрока не повторять
+SEEN_QUESTIONS_MAX_USERS = int(os.getenv("SEEN_QUESTIONS_MAX_USERS", 100000))
+
+# Игра
+GAME_DECK_SIZE = int(os.getenv("GAME_DECK_SIZE", 30))          # Вопросов в колоде одной игры
+QUESTION_PREFETCH = int(os.getenv("QUESTION_PREFETCH", 3))     # На сколько раундов вперёд подгружать вопросы
+# sync — каждый ответ сразу пишется в БД; batched — состояние раунда пишется одним запросом в конце раунда
+GAME_STATE_DURABILITY = os.getenv("GAME_STATE_DURABILITY", "batched")
+ROUND_SECONDS = float(os.getenv("ROUND_SECONDS", 20))          # Время на ответ в раунде
+
+# Лимиты Telegram Bot API
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))  # Сообщений в секунду на бота
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))       # Сообщений в секунду в один чат
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", 3))     # Допустимая пачка сообщений в один чат
+# edit — у игрока одно сообщение игры, которое правится каждый раунд; send — каждый раунд новые сообщения
+GAME_MESSAGE_MODE = os.getenv("GAME_MESSAGE_MODE", "edit")
+
+# Кэши отрисовки
+KEYBOARD_CACHE_SIZE = int(os.getenv("KEYBOARD_CACHE_SIZE", 4096))   # Готовых клавиатур статуса лобби
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", 20000))      # Готовых текстов вопросов
+
+# Лобби
+LOBBY_MIN_PLAYERS = int(os.getenv("LOBBY_MIN_PLAYERS", 2))               # С какого числа игроков идёт отсчёт
+LOBBY_COUNTDOWN_SECONDS = float(os.getenv("LOBBY_COUNTDOWN_SECONDS", 90))  # Отсчёт до автостарта игры
+
+# Подбор соперников
+MATCH_MIN_PLAYERS = int(os.getenv("MATCH_MIN_PLAYERS", 2))      # Минимум игроков в комнате
+MATCH_MAX_PLAYERS = int(os.getenv("MATCH_MAX_PLAYERS", 4))      # Полная комната собирается сразу
+MATCH_MAX_WAIT = float(os.getenv("MATCH_MAX_WAIT", 15))         # Через сколько сек собирать неполную комнату
+MATCH_SKILL_BUCKET = int(os.getenv("MATCH_SKILL_BUCKET", 3000))  # Ширина корзины рейтинга; 0 — без учёта рейтинга
+
+# Сборщик брошенных комнат
+SWEEP_INTERVAL = float(os.getenv("SWEEP_INTERVAL", 300))        # Как часто запускать (сек)
+SWEEP_ROOM_GRACE = float(os.getenv("SWEEP_ROOM_GRACE", 600))    # Комната без лобби и игры старше этого — брошена (сек)
+SWEEP_SESSION_TTL = float(os.getenv("SWEEP_SESSION_TTL", 86400))  # Сколько хранить game_sessions (сек)
+SWEEP_BATCH = int(os.getenv("SWEEP_BATCH", 500))                # Строк за один DELETE/UPDATE
+SWEEP_MAX_BATCHES = int(os.getenv("SWEEP_MAX_BATCHES", 20))     # Пачек одного вида за проход
+
+# Архив игр
+HISTORY_MONTHS_AHEAD = int(os.getenv("HISTORY_MONTHS_AHEAD", 2))  # На сколько месяцев вперёд держать секции
+HISTORY_KEEP_MONTHS = int(os.getenv("HISTORY_KEEP_MONTHS", 12))   # Сколько месяцев хранить; 0 — хранить всё
+
+# Таблица чемпионов
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", 100))                 # Сколько лучших держать в памяти
+LEADERBOARD_PAGE_SIZE = int(os.getenv("LEADERBOARD_PAGE_SIZE", 10))        # Строк на странице
+LEADERBOARD_BUCKET = int(os.getenv("LEADERBOARD_BUCKET", 100))             # Ширина корзины очков для поиска места
+LEADERBOARD_REBUILD_INTERVAL = float(os.getenv("LEADERBOARD_REBUILD_INTERVAL", 600))  # Полная пересборка из БД (сек)
+
+# Кэш сессий игроков
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", 50000))  # Сколько игроков держать в памяти
+SESSION_TTL = float(os.getenv("SESSION_TTL", 300))                # Через сколько секунд перечитать игрока из БД
+
+# Акторы комнат
+ROOM_ACTOR_IDLE = float(os.getenv("ROOM_ACTOR_IDLE", 60))  # Через сколько секунд без событий актор комнаты завершается
+
+# Планировщик сроков (отсчёты лобби и раунды)
+TIMER_TICK = float(os.getenv("TIMER_TICK", 0.05))             # Шаг колеса таймеров (сек) — предел опоздания срабатывания
+TIMER_WHEEL_SLOTS = int(os.getenv("TIMER_WHEEL_SLOTS", 1024))  # Ячеек в колесе
+
+# Реестр игр
+MAX_CONCURRENT_GAMES = int(os.getenv("MAX_CONCURRENT_GAMES", 2000))  # Одновременных игр на процесс; 0 — без ограничения
+
+# Хранилище состояний FSM
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")                    # memory, sqlite или redis
+FSM_SQLITE_PATH = os.getenv("FSM_SQLITE_PATH", "fsm.sqlite3")       # Общий файл для всех процессов бота
+FSM_REDIS_URL = os.getenv("FSM_REDIS_URL", "redis://localhost:6379/0")
+
+# Несколько процессов: фронт раздаёт апдейты рабочим процессам по комнате/игроку
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", 0))  # Рабочих процессов; 0 — всё в одном процессе
+SHARD_INDEX = int(os.environ["SHARD_INDEX"]) if os.getenv("SHARD_INDEX") else None  # Задаёт фронт при запуске процесса
+SHARD_SOCKET_DIR = os.getenv("SHARD_SOCKET_DIR", os.path.join(tempfile.gettempdir(), "quiz-bot-shards"))
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", 160))  # Точек на кольце у каждого процесса
@@ -1,8 +1,12 @@
-import os
+import asyncio
 import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 import pymysql
 from pymysql import Error
 from dotenv import load_dotenv
+from bot.utils import config
 from bot.utils.logging_config import setup_logging
 
 setup_logging()
@@ -10,15 +14,11 @@ load_dotenv()
 
 def create_connection():
     try:
-        host = os.getenv("DB_host")
-        user = os.getenv("DB_user")
-        password = os.getenv("DB_password")
-        database_name = os.getenv("DB_database")
         connection = pymysql.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=database_name
+            host=config.DB_HOST,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            database=config.DB_DATABASE
         )
         #logging.info("Подключение к базе данных 1 (информация о пользователях) успешно установлено.")
         return connection
@@ -27,24 +27,274 @@ def create_connection():
         return None
 
 
+class PoolTimeoutError(Error):
+    """Не удалось получить соединение из пула за отведённое время"""
 
-def insert_players(connection, user_id):
+
+class AsyncCursor:
+    """Курсор pymysql, запросы которого выполняются в потоке.
+
+    Обычный курсор pymysql читает весь ответ ещё в execute(), поэтому fetch*,
+    rowcount и lastrowid — уже данные в памяти и ждать их не нужно.
+    """
+    __slots__ = ("_connection", "_cursor")
+
+    def __init__(self, connection: "AsyncConnection", cursor):
+        self._connection = connection
+        self._cursor = cursor
+
+    async def execute(self, query: str, args=None) -> int:
+        return await self._connection.run(self._cursor.execute, query, args)
+
+    async def executemany(self, query: str, args) -> int:
+        return await self._connection.run(self._cursor.executemany, query, args)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class AsyncConnection:
+    """Соединение из пула: весь сетевой обмен с MySQL идёт в потоке, а не в event loop.
+
+    Долгий запрос или ожидание блокировки задерживает только свою задачу, а не
+    таймеры и апдейты всех комнат. Операции одного соединения идут строго по одной.
+    """
+    __slots__ = ("raw", "_busy")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._busy = None  # незавершённая операция в потоке
+
+    async def run(self, fn, *args):
+        """fn(*args) в потоке; отмена задачи не прерывает операцию, она доработает сама"""
+        self._busy = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        return await asyncio.shield(self._busy)
+
+    @property
+    def busy(self) -> bool:
+        return self._busy is not None and not self._busy.done()
+
+    def cursor(self) -> AsyncCursor:
+        return AsyncCursor(self, self.raw.cursor())
+
+    async def commit(self):
+        await self.run(self.raw.commit)
+
+    async def rollback(self):
+        await self.run(self.raw.rollback)
+
+
+class ConnectionPool:
+    """Асинхронный ограниченный пул соединений pymysql.
+
+    Соединения открываются и проверяются в отдельном потоке, чтобы рукопожатие
+    с MySQL не блокировало event loop, и выдаются обёрнутыми в AsyncConnection —
+    запросы тоже идут в потоке. Выдача — через ``async with pool.acquire()``.
+    """
+
+    def __init__(self, min_size: int, max_size: int, recycle: float, timeout: float,
+                 pre_ping: bool = True, ping_after: float = 0.0):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.recycle = recycle
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.ping_after = ping_after
+
+        self._idle = deque()  # (connection, released_at)
+        self._created_at = {}  # id(connection): время открытия
+        self._slots = asyncio.Semaphore(max_size)
+        self._in_use = 0
+        self._waiting = 0
+
+        # Счётчики для статистики
+        self.acquired_total = 0
+        self.timeouts_total = 0
+        self.opened_total = 0
+        self.recycled_total = 0
+        self.ping_failures_total = 0
+        self._acquire_time_total = 0.0
+        self._acquire_time_max = 0.0
+
+    async def open(self):
+        """Заранее открывает min_size соединений"""
+        while len(self._idle) < self.min_size:
+            connection = await self._connect()
+            self._idle.append((connection, time.monotonic()))
+        logging.info(f"Пул БД открыт: {len(self._idle)} соединений (максимум {self.max_size})")
+
+    async def close(self):
+        """Закрывает все свободные соединения"""
+        while self._idle:
+            connection, _ = self._idle.popleft()
+            self._discard(connection)
+
+    async def _connect(self):
+        connection = await asyncio.to_thread(
+            pymysql.connect,
+            host=config.DB_HOST,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            database=config.DB_DATABASE
+        )
+        self._created_at[id(connection)] = time.monotonic()
+        self.opened_total += 1
+        return connection
+
+    def _discard(self, connection):
+        self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    async def _checkout(self):
+        """Берёт свободное соединение (проверив возраст и живость) или открывает новое"""
+        now = time.monotonic()
+        while self._idle:
+            connection, released_at = self._idle.pop()
+
+            if now - self._created_at.get(id(connection), now) > self.recycle:
+                self.recycled_total += 1
+                self._discard(connection)
+                continue
+
+            if self.pre_ping and now - released_at > self.ping_after:
+                try:
+                    await asyncio.to_thread(connection.ping, False)
+                except Exception as e:
+                    logging.warning(f"Соединение из пула не прошло проверку: {e}")
+                    self.ping_failures_total += 1
+                    self._discard(connection)
+                    continue
+
+            return connection
+
+        return await self._connect()
+
+    async def _checkin(self, wrapper: AsyncConnection):
+        connection = wrapper.raw
+        if wrapper.busy:
+            # Владельца отменили посреди запроса: соединение в неизвестном состоянии
+            wrapper._busy.add_done_callback(lambda _: self._discard(connection))
+            return
+        # Закрываем незавершённую транзакцию: иначе следующий владелец соединения
+        # продолжит читать старый снимок данных (REPEATABLE READ)
+        try:
+            await asyncio.to_thread(connection.rollback)
+        except Exception:
+            self._discard(connection)
+            return
+        if connection.open:
+            self._idle.append((connection, time.monotonic()))
+        else:
+            self._discard(connection)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Выдаёт соединение из пула на время блока ``async with``"""
+        started = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts_total += 1
+            raise PoolTimeoutError(f"Нет свободного соединения за {self.timeout} сек")
+        finally:
+            self._waiting -= 1
+
+        try:
+            connection = await self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        elapsed = time.monotonic() - started
+        self.acquired_total += 1
+        self._acquire_time_total += elapsed
+        self._acquire_time_max = max(self._acquire_time_max, elapsed)
+
+        self._in_use += 1
+        wrapper = AsyncConnection(connection)
+        try:
+            yield wrapper
+        finally:
+            self._in_use -= 1
+            try:
+                await asyncio.shield(self._checkin(wrapper))
+            finally:
+                self._slots.release()
+
+    def stats(self) -> dict:
+        """Текущее состояние пула"""
+        acquired = self.acquired_total
+        return {
+            "size": self._in_use + len(self._idle),
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "max_size": self.max_size,
+            "acquired": acquired,
+            "timeouts": self.timeouts_total,
+            "opened": self.opened_total,
+            "recycled": self.recycled_total,
+            "ping_failures": self.ping_failures_total,
+            "acquire_avg_ms": round(self._acquire_time_total / acquired * 1000, 3) if acquired else 0.0,
+            "acquire_max_ms": round(self._acquire_time_max * 1000, 3),
+        }
+
+
+pool = ConnectionPool(
+    min_size=config.DB_POOL_MIN_SIZE,
+    max_size=config.DB_POOL_MAX_SIZE,
+    recycle=config.DB_POOL_RECYCLE,
+    timeout=config.DB_POOL_TIMEOUT,
+    pre_ping=config.DB_POOL_PRE_PING,
+    ping_after=config.DB_POOL_PING_AFTER
+)
+
+
+def acquire():
+    """Соединение из общего пула: ``async with acquire() as connection``"""
+    return pool.acquire()
+
+
+def pool_stats() -> dict:
+    return pool.stats()
+
+
+async def insert_players(connection: AsyncConnection, user_id, name=None) -> bool:
+    """Добавляет игрока одним запросом; у существующего обновляется только имя"""
+    cursor = None
     try:
         cursor = connection.cursor()
-        check_query = "SELECT * FROM players WHERE id = %s"
-        cursor.execute(check_query, (user_id,))
-        result = cursor.fetchone()
-
-        if not result:
-            insert_query = """
-                INSERT INTO players (id, score, correct_answers, wrong_answers, wins)
-                VALUES (%s, 0, 0, 0, 0);
-            """
-            cursor.execute(insert_query, (user_id,))
-            connection.commit()
+        insert_query = """
+            INSERT INTO players (id, name, score, correct_answers, wrong_answers, wins)
+            VALUES (%s, %s, 0, 0, 0, 0)
+            ON DUPLICATE KEY UPDATE name = VALUES(name);
+        """
+        await cursor.execute(insert_query, (user_id, name[:64] if name else None))
+        await connection.commit()
+        if cursor.rowcount == 1:
             logging.info(f"Игрок {user_id} добавлен в таблицу players")
+        return True
     except Error as e:
         logging.error(f"Ошибка при добавлении игрока {user_id}: {e}")
+        return False
     finally:
         if cursor:
             cursor.close()
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from bot.utils import config
+from bot.utils.logging_config import setup_logging
+
+setup_logging()
+
+
+class Timer:
+    __slots__ = ("deadline", "tick", "callback", "args", "cancelled")
+
+    def __init__(self, deadline: float, tick: int, callback, args: tuple):
+        self.deadline = deadline
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimingWheel:
+    """Общий для процесса планировщик сроков — хешированное колесо таймеров.
+
+    Срок попадает в ячейку (номер тика % slots); одна задача просыпается раз в тик
+    и срабатывают таймеры из текущей ячейки, чей тик уже наступил (таймеры
+    следующих оборотов остаются на месте). Постановка и отмена — O(1), сколько бы
+    сроков ни ждало; пока таймеров нет, задача спит без пробуждений.
+    Колбэк вызывается синхронно и должен быть быстрым — обычно он кладёт событие
+    в ящик комнаты-владельца.
+    """
+
+    def __init__(self, tick: float, slots: int):
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._origin = time.monotonic()
+        self._current = 0  # последний обработанный тик
+        self._pending = 0
+        self._wakeup = asyncio.Event()
+        self._runner = None
+
+        self.scheduled = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.wakeups = 0
+        self.errors = 0
+        self.jitter_max = 0.0
+        self._jitter = deque(maxlen=4096)  # последние опоздания срабатывания, сек
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    def schedule(self, delay: float, callback, *args) -> Timer:
+        return self.schedule_at(time.monotonic() + delay, callback, *args)
+
+    def schedule_at(self, deadline: float, callback, *args) -> Timer:
+        """Срок по time.monotonic(); таймер сработает не раньше него и не позже чем через тик"""
+        if self._pending == 0:
+            # Колесо простаивало и тики не обходило — все прошедшие ячейки пусты, догонять их незачем
+            self._current = max(self._current, int((time.monotonic() - self._origin) / self.tick))
+        tick = max(math.ceil((deadline - self._origin) / self.tick), self._current + 1)
+        timer = Timer(deadline, tick, callback, args)
+        self._slots[tick % len(self._slots)].append(timer)
+        self._pending += 1
+        self.scheduled += 1
+        self._wakeup.set()
+        self.start()
+        return timer
+
+    def cancel(self, timer: Timer):
+        """Отмена ленивая: таймер остаётся в ячейке и выбрасывается при её обходе"""
+        if timer is not None and not timer.cancelled:
+            timer.cancel()
+            self.cancelled += 1
+
+    async def _run(self):
+        while True:
+            if self._pending == 0:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            next_tick_at = self._origin + (self._current + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_tick_at - time.monotonic()))
+            self.wakeups += 1
+            target = int((time.monotonic() - self._origin) / self.tick)
+            while self._current < target:
+                self._current += 1
+                self._expire(self._current)
+
+    def _expire(self, tick: int):
+        index = tick % len(self._slots)
+        slot = self._slots[index]
+        if not slot:
+            return
+        due = []
+        waiting = []
+        for timer in slot:
+            if timer.cancelled:
+                self._pending -= 1
+            elif timer.tick <= tick:
+                due.append(timer)
+            else:
+                waiting.append(timer)
+        self._slots[index] = waiting
+
+        now = time.monotonic()
+        for timer in due:
+            self._pending -= 1
+            if timer.cancelled:  # отменён колбэком из этой же пачки
+                continue
+            jitter = now - timer.deadline
+            self._jitter.append(jitter)
+            self.jitter_max = max(self.jitter_max, jitter)
+            self.fired += 1
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Ошибка в обработчике срока: {e}", exc_info=True)
+
+    def _jitter_percentile(self, share: float) -> float:
+        if not self._jitter:
+            return 0.0
+        ordered = sorted(self._jitter)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "scheduled": self.scheduled,
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+            "wakeups": self.wakeups,
+            "errors": self.errors,
+            "jitter_p50_ms": round(self._jitter_percentile(0.5) * 1000, 2),
+            "jitter_p99_ms": round(self._jitter_percentile(0.99) * 1000, 2),
+            "jitter_max_ms": round(self.jitter_max * 1000, 2),
+        }
+
+
+deadlines = TimingWheel(tick=config.TIMER_TICK, slots=config.TIMER_WHEEL_SLOTS)
+
+
+if __name__ == "__main__":
+    # 100 тыс. сроков в пределах 10 секунд: колесо против задачи с asyncio.sleep на каждый срок.
+    # Запуск: python -m bot.utils.deadlines
+    import random
+
+    TIMERS = 100_000
+    SPAN = 10.0
+
+    async def bench_wheel():
+        wheel = TimingWheel(tick=config.TIMER_TICK, slots=config.TIMER_WHEEL_SLOTS)
+        done = asyncio.Event()
+        fired = [0]
+
+        def on_fire():
+            fired[0] += 1
+            if fired[0] == TIMERS:
+                done.set()
+
+        started = time.perf_counter()
+        for _ in range(TIMERS):
+            wheel.schedule(random.uniform(0, SPAN), on_fire)
+        schedule_us = (time.perf_counter() - started) / TIMERS * 1e6
+        await done.wait()
+        await wheel.stop()
+        return schedule_us, wheel.stats()
+
+    async def bench_tasks():
+        jitter = []
+        loop = asyncio.get_running_loop()
+
+        async def sleeper(delay):
+            deadline = loop.time() + delay
+            await asyncio.sleep(delay)
+            jitter.append(loop.time() - deadline)
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(sleeper(random.uniform(0, SPAN))) for _ in range(TIMERS)]
+        schedule_us = (time.perf_counter() - started) / TIMERS * 1e6
+        await asyncio.gather(*tasks)
+        jitter.sort()
+        return schedule_us, jitter[len(jitter) // 2] * 1000, jitter[int(len(jitter) * 0.99)] * 1000, jitter[-1] * 1000
+
+    schedule_us, stats = asyncio.run(bench_wheel())
+    print(f"Колесо: постановка {schedule_us:.2f} мкс, пробуждений {stats['wakeups']}, "
+          f"опоздание p50 {stats['jitter_p50_ms']} мс, p99 {stats['jitter_p99_ms']} мс, макс. {stats['jitter_max_ms']} мс")
+    schedule_us, p50, p99, worst = asyncio.run(bench_tasks())
+    print(f"Задача на срок: постановка {schedule_us:.2f} мкс, "
+          f"опоздание p50 {p50:.2f} мс, p99 {p99:.2f} мс, макс. {worst:.2f} мс")
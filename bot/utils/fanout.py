@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+from bot.utils.logging_config import setup_logging
+from bot.utils.outbound import Priority, outbound
+
+setup_logging()
+
+
+class Delivery:
+    """Результат отправки одному получателю"""
+    __slots__ = ("message", "delivered_at")
+
+    def __init__(self, message, delivered_at: float):
+        self.message = message
+        self.delivered_at = delivered_at  # time.monotonic() момента доставки
+
+
+class FanOutStats:
+    def __init__(self):
+        self.batches = 0
+        self.sent = 0
+        self.failed = 0
+        self.spread_total = 0.0
+        self.spread_max = 0.0
+        self.edited = 0          # сообщений обновлено правкой вместо новой отправки
+        self.edit_fallbacks = 0  # правка не удалась — отправили новое сообщение
+        self.calls_saved = 0     # запросов к API сэкономлено склейкой итогов раунда со следующим вопросом
+
+    def record(self, deliveries: dict):
+        times = [d.delivered_at for d in deliveries.values() if d is not None]
+        self.batches += 1
+        self.sent += len(times)
+        self.failed += len(deliveries) - len(times)
+        if times:
+            spread = max(times) - min(times)
+            self.spread_total += spread
+            self.spread_max = max(self.spread_max, spread)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "sent": self.sent,
+            "failed": self.failed,
+            "spread_avg_ms": round(self.spread_total / self.batches * 1000, 3) if self.batches else 0.0,
+            "spread_max_ms": round(self.spread_max * 1000, 3),
+            "edited": self.edited,
+            "edit_fallbacks": self.edit_fallbacks,
+            "calls_saved": self.calls_saved,
+        }
+
+
+fanout_stats = FanOutStats()
+
+
+async def _deliver(chat_id: int, text: str, reply_markup, priority: Priority) -> Optional[Delivery]:
+    try:
+        message = await outbound.send(chat_id, text, priority, reply_markup=reply_markup)
+        return Delivery(message, time.monotonic())
+    except Exception as e:
+        logging.error(f"Не удалось отправить сообщение пользователю {chat_id}: {e}")
+        return None
+
+
+async def fan_out(texts: dict[int, str], reply_markup=None,
+                  priority: Priority = Priority.ROUND_QUESTION) -> dict[int, Optional[Delivery]]:
+    """Отправляет всем получателям одновременно через общую очередь (с учётом лимитов Telegram).
+
+    texts — {chat_id: текст}. Возвращает {chat_id: Delivery или None при ошибке}.
+    """
+    chat_ids = list(texts)
+    results = await asyncio.gather(*(
+        _deliver(chat_id, texts[chat_id], reply_markup, priority) for chat_id in chat_ids
+    ))
+    deliveries = dict(zip(chat_ids, results))
+    fanout_stats.record(deliveries)
+    return deliveries
+
+
+async def _deliver_edit(chat_id: int, message_id: Optional[int], text: str, reply_markup,
+                        priority: Priority) -> Optional[Delivery]:
+    if message_id is not None:
+        try:
+            message = await outbound.edit(chat_id, message_id, text, priority, reply_markup=reply_markup)
+            fanout_stats.edited += 1
+            return Delivery(message, time.monotonic())
+        except Exception as e:
+            logging.warning(f"Не удалось изменить сообщение {message_id} у пользователя {chat_id}: {e}")
+            fanout_stats.edit_fallbacks += 1
+    return await _deliver(chat_id, text, reply_markup, priority)
+
+
+async def fan_out_edit(texts: dict[int, str], message_ids: dict[int, int], reply_markup=None,
+                       priority: Priority = Priority.ROUND_QUESTION) -> dict[int, Optional[Delivery]]:
+    """Как fan_out, но правит уже отправленное игроку сообщение (message_ids), а новое шлёт только при неудаче"""
+    chat_ids = list(texts)
+    results = await asyncio.gather(*(
+        _deliver_edit(chat_id, message_ids.get(chat_id), texts[chat_id], reply_markup, priority)
+        for chat_id in chat_ids
+    ))
+    deliveries = dict(zip(chat_ids, results))
+    fanout_stats.record(deliveries)
+    return deliveries
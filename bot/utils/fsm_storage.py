@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from bot.utils import config
+from bot.utils.logging_config import setup_logging
+
+setup_logging()
+
+
+def _key(key: StorageKey) -> str:
+    return (f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+            f"{key.business_connection_id or ''}:{key.destiny}")
+
+
+class RuntimeRegistry:
+    """Объекты, которые живут только в этом процессе (задачи, события, сообщения в памяти).
+
+    В данные FSM кладётся только то, что сериализуется в JSON, — иначе состояние
+    не переживёт перезапуск и не будет видно другим процессам. Всё остальное
+    хранится здесь, по тому же ключу пользователя, и стирается вместе с его
+    данными FSM (state.clear()).
+    """
+
+    def __init__(self):
+        self._objects = {}  # ключ хранилища: {имя: объект}
+
+    def put(self, key: StorageKey, name: str, obj: Any):
+        self._objects.setdefault(_key(key), {})[name] = obj
+
+    def get(self, key: StorageKey, name: str, default: Any = None) -> Any:
+        return self._objects.get(_key(key), {}).get(name, default)
+
+    def pop(self, key: StorageKey, name: str, default: Any = None) -> Any:
+        objects = self._objects.get(_key(key))
+        if not objects:
+            return default
+        obj = objects.pop(name, default)
+        if not objects:
+            del self._objects[_key(key)]
+        return obj
+
+    def clear(self, key: StorageKey):
+        self._objects.pop(_key(key), None)
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+
+runtime = RuntimeRegistry()
+_active = None  # хранилище, созданное create_storage()
+_active_backend = None
+
+
+def _dump(data: Dict[str, Any]) -> str:
+    try:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    except TypeError as e:
+        raise TypeError(
+            f"Данные FSM должны сериализоваться в JSON ({e}); объекты процесса храните в fsm_storage.runtime"
+        ) from None
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM в файле SQLite в режиме WAL — общий для всех процессов бота на одной машине.
+
+    WAL позволяет читать параллельно с записью из других процессов, synchronous=NORMAL
+    не ждёт fsync на каждый коммит (при сбое питания теряются лишь последние
+    изменения состояния, но не целостность файла). Данные — JSON, поэтому
+    несериализуемое значение отклоняется сразу при записи, а не теряется при перезапуске.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._db = None
+        self._connect_lock = asyncio.Lock()
+
+        self.reads = 0
+        self.writes = 0
+        self.time_total = 0.0
+
+    async def _connection(self):
+        if self._db is None:
+            import aiosqlite  # нужен только этому хранилищу
+
+            async with self._connect_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.path)
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA synchronous=NORMAL")
+                    await db.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+                    await db.execute("""
+                        CREATE TABLE IF NOT EXISTS fsm (
+                            key TEXT PRIMARY KEY,
+                            state TEXT,
+                            data TEXT NOT NULL DEFAULT '{}'
+                        )
+                    """)
+                    await db.commit()
+                    self._db = db
+        return self._db
+
+    async def _write(self, query: str, params: tuple):
+        started = time.perf_counter()
+        db = await self._connection()
+        await db.execute(query, params)
+        await db.commit()
+        self.writes += 1
+        self.time_total += time.perf_counter() - started
+
+    async def _read(self, query: str, params: tuple):
+        started = time.perf_counter()
+        db = await self._connection()
+        async with db.execute(query, params) as cursor:
+            row = await cursor.fetchone()
+        self.reads += 1
+        self.time_total += time.perf_counter() - started
+        return row
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._write(
+            "INSERT INTO fsm (key, state) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET state = excluded.state",
+            (_key(key), value)
+        )
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._read("SELECT state FROM fsm WHERE key = ?", (_key(key),))
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        if not data:
+            runtime.clear(key)
+        await self._write(
+            "INSERT INTO fsm (key, data) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET data = excluded.data",
+            (_key(key), _dump(data))
+        )
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._read("SELECT data FROM fsm WHERE key = ?", (_key(key),))
+        return json.loads(row[0]) if row else {}
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        operations = self.reads + self.writes
+        return {
+            "backend": "sqlite",
+            "reads": self.reads,
+            "writes": self.writes,
+            "avg_ms": round(self.time_total / operations * 1000, 3) if operations else 0.0,
+        }
+
+
+class CheckedMemoryStorage(MemoryStorage):
+    """MemoryStorage с той же проверкой данных, что и у постоянных хранилищ:
+    код, работающий в одном процессе, не сломается при переходе на sqlite/redis"""
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        _dump(data)
+        if not data:
+            runtime.clear(key)
+        await super().set_data(key, data)
+
+
+def create_storage(backend: str = config.FSM_STORAGE) -> BaseStorage:
+    """Хранилище FSM по настройке FSM_STORAGE: memory, sqlite или redis"""
+    global _active, _active_backend
+    if backend == "memory":
+        storage = CheckedMemoryStorage()
+    elif backend == "sqlite":
+        storage = SQLiteStorage(config.FSM_SQLITE_PATH)
+    elif backend == "redis":
+        # Пакет redis нужен только этому варианту; сервер может быть и совместимым (KeyDB, Dragonfly)
+        from aiogram.fsm.storage.redis import RedisStorage
+        storage = RedisStorage.from_url(config.FSM_REDIS_URL)
+    else:
+        raise ValueError(f"Неизвестное хранилище FSM: {backend}")
+    logging.info(f"Хранилище FSM: {backend}")
+    _active, _active_backend = storage, backend
+    return storage
+
+
+def storage_stats() -> dict:
+    """Показатели хранилища, созданного create_storage(), для админ-панели"""
+    result = {"backend": _active_backend or "нет", "reads": "—", "writes": "—", "avg_ms": "—"}
+    if isinstance(_active, SQLiteStorage):
+        result.update(_active.stats())
+    result["runtime_keys"] = len(runtime)
+    return result
+
+
+if __name__ == "__main__":
+    # Задержка get/set состояния и данных по хранилищам.
+    # Запуск: python -m bot.utils.fsm_storage
+    import os
+    import tempfile
+
+    OPERATIONS = 5000
+
+    async def bench(storage: BaseStorage) -> dict:
+        keys = [StorageKey(bot_id=1, chat_id=user_id, user_id=user_id) for user_id in range(500)]
+        timings = {"set_state": [], "get_state": [], "set_data": [], "get_data": []}
+        for i in range(OPERATIONS):
+            key = keys[i % len(keys)]
+            for name, call in (
+                ("set_state", lambda: storage.set_state(key, "GameStates:waiting_for_room_id")),
+                ("get_state", lambda: storage.get_state(key)),
+                ("set_data", lambda: storage.set_data(key, {"room_id": i, "status_message_id": i * 2})),
+                ("get_data", lambda: storage.get_data(key)),
+            ):
+                started = time.perf_counter()
+                await call()
+                timings[name].append(time.perf_counter() - started)
+        await storage.close()
+        result = {}
+        for name, values in timings.items():
+            values.sort()
+            result[name] = (values[len(values) // 2] * 1e6, values[int(len(values) * 0.99)] * 1e6)
+        return result
+
+    async def main():
+        backends = {"memory": CheckedMemoryStorage()}
+        path = os.path.join(tempfile.mkdtemp(), "fsm.sqlite3")
+        backends["sqlite"] = SQLiteStorage(path)
+        try:
+            backends["redis"] = create_storage("redis")
+            await backends["redis"].redis.ping()
+        except Exception as e:
+            backends.pop("redis", None)
+            print(f"redis пропущен: {e!r}")
+
+        for name, storage in backends.items():
+            result = await bench(storage)
+            line = ", ".join(f"{op} p50 {p50:.1f} мкс / p99 {p99:.1f} мкс" for op, (p50, p99) in result.items())
+            print(f"{name}: {line}")
+
+    asyncio.run(main())
@@ -1,148 +1,391 @@
 import asyncio
 import random
 import logging
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from bot.utils.db import create_connection
+import sys
+import time
+from array import array
+from typing import Optional
+from bot.utils import config
+from bot.utils.db import acquire
+from bot.utils.fanout import fan_out, fan_out_edit, fanout_stats
+from bot.utils.outbound import Priority
+from bot.keyboards.game_kb import BANK_OPTION, get_answer_keyboard
+from bot.utils import render
+from bot.utils.question_bank import question_bank, seen_questions
+from bot.utils.history import archive_game
+from bot.utils.room_actor import room_actors
+from bot.utils.deadlines import deadlines
+from bot.utils.supervisor import supervisor
+
+class PlayerState:
+    """Состояние игрока в текущей игре (копия строки game_players в памяти)"""
+    __slots__ = ("row_id", "user_id", "score", "is_active", "is_banked",
+                 "last_answer_correct", "answered_this_round", "rounds_survived",
+                 "correct_answers", "wrong_answers", "exit_order", "dirty")
+
+    def __init__(self, row_id, user_id, score, is_active, is_banked, last_answer_correct):
+        self.row_id = row_id
+        self.user_id = user_id
+        self.score = score
+        self.is_active = bool(is_active)
+        self.is_banked = bool(is_banked)
+        self.last_answer_correct = last_answer_correct
+        self.answered_this_round = False
+        self.rounds_survived = 0
+        # Счётчики для общей статистики игрока — пишутся в players один раз в конце игры
+        self.correct_answers = 0
+        self.wrong_answers = 0
+        self.exit_order = 0  # номер выхода из игры (банк или выбывание) — для выбора победителя при равенстве
+        self.dirty = False
+
+
+class FlushStats:
+    """Счётчики отложенной записи состояния игр в БД"""
+
+    def __init__(self):
+        self.flushes = 0
+        self.rows = 0
+        self.max_rows = 0
+        self.time_total = 0.0
+        self.time_max = 0.0
+        self.errors = 0
+
+    def record(self, rows: int, elapsed: float):
+        self.flushes += 1
+        self.rows += rows
+        self.max_rows = max(self.max_rows, rows)
+        self.time_total += elapsed
+        self.time_max = max(self.time_max, elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "flushes": self.flushes,
+            "rows": self.rows,
+            "avg_rows": round(self.rows / self.flushes, 2) if self.flushes else 0.0,
+            "max_rows": self.max_rows,
+            "avg_ms": round(self.time_total / self.flushes * 1000, 3) if self.flushes else 0.0,
+            "max_ms": round(self.time_max * 1000, 3),
+            "errors": self.errors,
+        }
+
+
+class RoundStats:
+    """Счётчики завершения раундов: досрочно (все ответили) или по таймеру"""
+
+    def __init__(self):
+        self.rounds = 0
+        self.ended_early = 0
+        self.timed_out = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record(self, ended_early: bool, latency: float = 0.0):
+        self.rounds += 1
+        if ended_early:
+            self.ended_early += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        else:
+            self.timed_out += 1
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "ended_early": self.ended_early,
+            "timed_out": self.timed_out,
+            "end_latency_avg_ms": round(self.latency_total / self.ended_early * 1000, 3) if self.ended_early else 0.0,
+            "end_latency_max_ms": round(self.latency_max * 1000, 3),
+        }
+
+
+flush_stats = FlushStats()
+round_stats = RoundStats()
 
 class GameEngine:
+    """Одна идущая игра. Живёт в реестре games: создаётся games.create(), убирается games.remove()"""
+    __slots__ = ("room_id", "bot", "message_ids", "pending_results", "current_question", "options",
+                 "correct_option", "players", "answers", "round_deadline", "round_closed",
+                 "last_answer_at", "deadlines", "state", "round_number", "deck", "deck_position",
+                 "prefetched", "_prefetch_task", "names", "exits")
+
     def __init__(self, room_id: int, bot):
         self.room_id = room_id
         self.bot = bot
-        self.message_ids = {}  # user_id: message_id
+        self.message_ids = {}  # user_id: message_id — «живое» сообщение игры у каждого игрока
+        self.pending_results = {}  # user_id: итог прошлого раунда, покажем вместе со следующим вопросом
         self.current_question = None
-        self.answer_mapping = {}  # answer_text: is_correct
+        self.options = []  # варианты ответа текущего раунда в порядке кнопок
+        self.correct_option = None  # индекс правильного варианта в self.options
         self.players = []
         self.answers = {}  # user_id: 'answer' / 'bank' / None
+        self.round_deadline = None  # таймер конца раунда в общем колесе сроков
+        self.round_closed = False
+        self.last_answer_at = None
+        self.deadlines = {}  # user_id: time.monotonic(), до которого принимается ответ
+        self.state = {}  # user_id: PlayerState — основная копия, в БД пишется пачкой
         self.round_number = 1
+        self.deck = array("q")  # ID вопросов игры в порядке раундов
+        self.deck_position = 0
+        self.prefetched = {}  # question_id: вопрос, подгруженный заранее
+        self._prefetch_task = None
+        self.names = {}  # user_id: имя в Telegram — обновит players.name в конце игры
+        self.exits = 0  # сколько раз игроки выходили из игры — счётчик для PlayerState.exit_order
 
     async def start_game(self):
-        await self.load_active_players()
+        await self.load_state()
+        await self.build_deck()
         await self.start_round()
 
-    async def load_active_players(self):
-        connection = create_connection()
-        if connection:
-            try:
+    async def build_deck(self):
+        """Собирает колоду вопросов на игру и сразу подгружает первые раунды одним запросом"""
+        if not question_bank.loaded:
+            await question_bank.reload()
+        self.deck = array("q", question_bank.draw_deck(
+            config.GAME_DECK_SIZE,
+            exclude=seen_questions.union(self.players)
+        ))
+        self.deck_position = 0
+        await self.prefetch_questions()
+
+    async def prefetch_questions(self):
+        """Подгружает вопросы на QUESTION_PREFETCH раундов вперёд"""
+        upcoming = [
+            question_id
+            for question_id in self.deck[self.deck_position:self.deck_position + config.QUESTION_PREFETCH]
+            if question_id not in self.prefetched
+        ]
+        if upcoming:
+            self.prefetched.update(await question_bank.get_many(upcoming))
+
+    async def next_question(self):
+        """Следующий вопрос из колоды; вопросы на следующие раунды догружаются в фоне"""
+        question = None
+        while question is None:
+            if self.deck_position >= len(self.deck):
+                # Колода закончилась — добираем новую; вопросы этой игры не повторяются никогда,
+                # поэтому, когда банк исчерпан, игра заканчивается
+                extra = question_bank.draw_deck(
+                    config.GAME_DECK_SIZE,
+                    exclude=seen_questions.union(self.players),
+                    forbid=set(self.deck)
+                )
+                if not extra:
+                    return None
+                self.deck.extend(extra)
+
+            question_id = self.deck[self.deck_position]
+            self.deck_position += 1
+            question = self.prefetched.pop(question_id, None)
+            if question is None:
+                # Фоновая подгрузка не успела — берём вопрос напрямую
+                question = await question_bank.get(question_id)
+
+        seen_questions.mark(self.players, question["id"])
+        if self._prefetch_task is None or self._prefetch_task.done():
+            self._prefetch_task = supervisor.spawn(self.prefetch_questions(), "prefetch", ("game", self.room_id))
+        return question
+
+    async def load_state(self):
+        """Один раз читает участников игры из game_players; дальше состояние живёт в памяти"""
+        async with acquire() as connection:
+            cursor = connection.cursor()
+            await cursor.execute("""
+                SELECT id, user_id, score, is_active, is_banked, last_answer_correct
+                FROM game_players
+                WHERE room_id = %s
+                ORDER BY id
+            """, (self.room_id,))
+            self.state = {row[1]: PlayerState(*row) for row in cursor.fetchall()}
+        self.load_active_players()
+
+    def load_active_players(self):
+        self.players = [user_id for user_id, player in self.state.items() if player.is_active]
+
+    async def flush_state(self):
+        """Записывает изменённые строки game_players одним запросом"""
+        dirty = [player for player in self.state.values() if player.dirty]
+        if not dirty:
+            return
+
+        started = time.perf_counter()
+        try:
+            async with acquire() as connection:
                 cursor = connection.cursor()
-                cursor.execute("""
-                    SELECT user_id FROM game_players
-                    WHERE room_id = %s AND is_active = TRUE
-                """, (self.room_id,))
-                self.players = [row[0] for row in cursor.fetchall()]
-            finally:
-                connection.close()
+                # Строки уже есть — по первичному ключу INSERT превращается в UPDATE,
+                # а executemany склеивает всё в один многострочный запрос
+                await cursor.executemany("""
+                    INSERT INTO game_players
+                        (id, room_id, user_id, score, is_active, is_banked,
+                         last_answer_correct, answered_this_round)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        score = VALUES(score),
+                        is_active = VALUES(is_active),
+                        is_banked = VALUES(is_banked),
+                        last_answer_correct = VALUES(last_answer_correct),
+                        answered_this_round = VALUES(answered_this_round)
+                """, [
+                    (player.row_id, self.room_id, player.user_id, player.score, player.is_active,
+                     player.is_banked, player.last_answer_correct, player.answered_this_round)
+                    for player in dirty
+                ])
+                await connection.commit()
+        except Exception as e:
+            flush_stats.errors += 1
+            logging.error(f"[room {self.room_id}] Ошибка записи состояния игры: {e}")
+            return
+
+        for player in dirty:
+            player.dirty = False
+        flush_stats.record(len(dirty), time.perf_counter() - started)
 
     async def start_round(self):
-        self.current_question = await self.get_random_question()
-        self.answer_mapping = self.shuffle_answers(self.current_question)
+        self.current_question = await self.next_question()
+        if self.current_question is None:
+            logging.error(f"[room {self.room_id}] Закончились вопросы для раунда {self.round_number}")
+            if self.pending_results:
+                await fan_out_edit(self.pending_results, self.message_ids, priority=Priority.ROUND_RESULT)
+                self.pending_results = {}
+            await self.finish_game()
+            return
+        self.options, self.correct_option = self.shuffle_answers(self.current_question)
         self.answers = {pid: None for pid in self.players}
+        self.round_closed = False
+        self.last_answer_at = None
+        for user_id in self.players:
+            player = self.state[user_id]
+            player.answered_this_round = False
+            player.last_answer_correct = None
 
-        question_text = f"<b>Вопрос №{self.round_number}</b>\n\n"
-        question_text += f"{self.current_question['question']}"
+        # Текст и клавиатура раунда собираются из кэша один раз и общие для всех игроков
+        question_text = render.question_text(self.current_question, self.round_number)
+        keyboard = get_answer_keyboard(self.room_id, self.round_number, tuple(self.options))
 
-        keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [InlineKeyboardButton(text=ans, callback_data=f"answer:{ans}")]
-                for ans in self.answer_mapping.keys()
-            ] + [[InlineKeyboardButton(text="💰 Банк", callback_data="bank")]]
-        )
+        # Рассылаем вопрос всем сразу; часы каждого игрока запускаются с момента доставки ему
+        texts = {user_id: question_text for user_id in self.players}
+        if config.GAME_MESSAGE_MODE == "edit":
+            # Итог прошлого раунда и новый вопрос — одной правкой вместо двух сообщений
+            for user_id in self.players:
+                result = self.pending_results.pop(user_id, None)
+                if result is not None:
+                    texts[user_id] = f"{result}\n\n{question_text}"
+                    fanout_stats.calls_saved += 1
+            deliveries = await fan_out_edit(texts, self.message_ids, keyboard, Priority.ROUND_QUESTION)
+        else:
+            deliveries = await fan_out(texts, keyboard, Priority.ROUND_QUESTION)
+        self.deadlines = {}
+        for user_id, delivery in deliveries.items():
+            if delivery is None:
+                continue
+            self.message_ids[user_id] = delivery.message.message_id
+            self.deadlines[user_id] = delivery.delivered_at + config.ROUND_SECONDS
 
-        for user_id in self.players:
-            msg = await self.bot.send_message(user_id, question_text, reply_markup=keyboard)
-            self.message_ids[user_id] = msg.message_id
+        # Раунд длится, пока не истечёт время у игрока, получившего вопрос последним;
+        # срок держит общее колесо, а не отдельная задача на игру
+        round_ends_at = max(self.deadlines.values(), default=time.monotonic())
+        self.round_deadline = deadlines.schedule_at(round_ends_at, self.round_timeout, self.round_number)
 
-        asyncio.create_task(self.round_timer())
+    def round_timeout(self, round_number: int):
+        """Срок раунда истёк — конец раунда встаёт в ящик комнаты после уже пришедших ответов"""
+        room_actors.tell(self.room_id, "timeout", self.end_round, round_number, False)
 
-    async def round_timer(self):
-        for _ in range(20):
-            if all(v is not None for v in self.answers.values()):
-                break
-            await asyncio.sleep(1)
+    async def end_round(self, round_number: int, ended_early: bool):
+        if round_number != self.round_number or self.round_closed:
+            return  # раунд уже закрыт: и последний ответ, и срок могли прийти почти одновременно
+        self.round_closed = True
+        deadlines.cancel(self.round_deadline)
+        if ended_early:
+            round_stats.record(True, time.perf_counter() - self.last_answer_at)
+        else:
+            round_stats.record(False)
         await self.finish_round()
 
-    async def handle_answer(self, user_id: int, answer_text: str):
-        if self.answers.get(user_id) is not None:
-            return  # уже ответил
+    def register_answer(self, user_id: int, status: str):
+        """Запоминает ответ и закрывает раунд, если ответили все, кому вопрос был доставлен"""
+        self.answers[user_id] = status
+        if all(self.answers[uid] is not None for uid in self.deadlines):
+            self.last_answer_at = time.perf_counter()
+            # Мы внутри обработчика ящика — конец раунда ставится следующим событием
+            room_actors.tell(self.room_id, "round_end", self.end_round, self.round_number, True)
 
-        if answer_text == "bank":
-            self.answers[user_id] = "bank"
+    async def handle_answer(self, user_id: int, round_number: int, option: int) -> bool:
+        """Принимает ответ игрока; False — если ответ не засчитан"""
+        if round_number != self.round_number:
+            return False  # клик по вопросу из прошлого раунда
+        if user_id not in self.answers or self.answers[user_id] is not None:
+            return False  # не участник раунда или уже ответил
+        if time.monotonic() > self.deadlines.get(user_id, 0):
+            return False  # время этого игрока истекло
+
+        if option == BANK_OPTION:
+            self.register_answer(user_id, "bank")
             await self.mark_player_banked(user_id)
-            return
+            return True
 
-        is_correct = self.answer_mapping.get(answer_text, False)
-        self.answers[user_id] = ("correct" if is_correct else "wrong")
+        if not 0 <= option < len(self.options):
+            return False
+        is_correct = option == self.correct_option
 
-        connection = create_connection()
-        if connection:
-            try:
-                cursor = connection.cursor()
-                cursor.execute("""
-                    UPDATE game_players
-                    SET answered_this_round = TRUE,
-                        last_answer_correct = %s,
-                        score = score + CASE WHEN %s THEN 100 ELSE 0 END
-                    WHERE user_id = %s AND room_id = %s
-                """, (is_correct, is_correct, user_id, self.room_id))
-                connection.commit()
-            finally:
-                connection.close()
+        player = self.state[user_id]
+        player.answered_this_round = True
+        player.last_answer_correct = is_correct
+        if is_correct:
+            player.score += 100
+            player.correct_answers += 1
+        else:
+            player.wrong_answers += 1
+        player.dirty = True
+        self.register_answer(user_id, "correct" if is_correct else "wrong")
+
+        if config.GAME_STATE_DURABILITY == "sync":
+            await self.flush_state()
+        return True
 
     async def mark_player_banked(self, user_id: int):
-        connection = create_connection()
-        if connection:
-            try:
-                cursor = connection.cursor()
-                cursor.execute("""
-                    UPDATE game_players
-                    SET is_banked = TRUE,
-                        is_active = FALSE
-                    WHERE user_id = %s AND room_id = %s
-                """, (user_id, self.room_id))
-                connection.commit()
-            finally:
-                connection.close()
+        player = self.state[user_id]
+        player.is_banked = True
+        player.is_active = False
+        self.exits += 1
+        player.exit_order = self.exits
+        player.dirty = True
+
+        if config.GAME_STATE_DURABILITY == "sync":
+            await self.flush_state()
 
     async def finish_round(self):
-        connection = create_connection()
         eliminated = []
         survivors = []
         banker_ids = []
 
-        if connection:
-            try:
-                cursor = connection.cursor()
+        # Ищем минимальный балл среди активных
+        scores = [player.score for player in self.state.values() if player.is_active]
+        min_score = min(scores) if scores else 0
+
+        for user_id, player in self.state.items():
+            if player.is_banked:
+                banker_ids.append(user_id)
+            elif player.is_active:
+                if player.score == min_score and not player.last_answer_correct:
+                    eliminated.append(user_id)
+                else:
+                    survivors.append(user_id)
 
-                # Получаем всех игроков
-                cursor.execute("""
-                    SELECT user_id, score, is_banked, last_answer_correct, is_active
-                    FROM game_players
-                    WHERE room_id = %s
-                """, (self.room_id,))
-                data = cursor.fetchall()
-
-                # Ищем минимальный балл среди активных
-                scores = [row[1] for row in data if row[4]]
-                min_score = min(scores) if scores else 0
-
-                for user_id, score, is_banked, correct, is_active in data:
-                    if is_banked:
-                        banker_ids.append(user_id)
-                    elif is_active:
-                        if score == min_score and not correct:
-                            eliminated.append(user_id)
-                        else:
-                            survivors.append(user_id)
-
-                # Выкидываем проигравших
-                for user_id in eliminated:
-                    cursor.execute("""
-                        UPDATE game_players SET is_active = FALSE WHERE user_id = %s AND room_id = %s
-                    """, (user_id, self.room_id))
-                connection.commit()
-            finally:
-                connection.close()
+        # Выкидываем проигравших; выбывшие в одном раунде выходят одновременно
+        if eliminated:
+            self.exits += 1
+        for user_id in eliminated:
+            player = self.state[user_id]
+            player.is_active = False
+            player.exit_order = self.exits
+            player.dirty = True
+        for user_id in survivors:
+            self.state[user_id].rounds_survived += 1
+
+        # Всё, что изменилось за раунд, уходит в БД одним запросом
+        await self.flush_state()
 
         # Показываем итоги всем
+        results = {}
         for user_id in self.players:
             status = self.answers.get(user_id)
             if status == "bank":
@@ -159,37 +402,173 @@ class GameEngine:
                 text += "\n\n<b>Вы выбыли из игры!</b>"
             elif user_id in banker_ids:
                 text += "\n\nВы вышли в банк — очки сохранены."
-
-            await self.bot.send_message(user_id, text)
+            results[user_id] = text
 
         # Проверка — сколько игроков осталось
-        await self.load_active_players()
+        self.load_active_players()
+
+        if config.GAME_MESSAGE_MODE == "edit":
+            # Тем, кто играет дальше, итог покажем вместе со следующим вопросом,
+            # остальным — сразу, в том же сообщении игры
+            finished = {}
+            for user_id, text in results.items():
+                if user_id in self.players:
+                    self.pending_results[user_id] = text
+                else:
+                    finished[user_id] = text
+            if finished:
+                await fan_out_edit(finished, self.message_ids, priority=Priority.ROUND_RESULT)
+        else:
+            await fan_out(results, priority=Priority.ROUND_RESULT)
         if len(self.players) == 1:
             self.round_number += 1
             await self.start_round()
         elif len(self.players) == 0:
-            await self.bot.send_message(self.room_id, "Игра завершена.")
+            await self.finish_game()
+            # Чат игрока в личке совпадает с его user_id; room_id чатом не является
+            await fan_out({user_id: "Игра завершена." for user_id in self.state}, priority=Priority.ROUND_RESULT)
         else:
             self.round_number += 1
             await self.start_round()
 
-    async def get_random_question(self):
-        connection = create_connection()
-        if connection:
-            try:
-                cursor = connection.cursor()
-                cursor.execute("SELECT * FROM questions ORDER BY RAND() LIMIT 1")
-                row = cursor.fetchone()
-                return {
-                    "id": row[0],
-                    "question": row[1],
-                    "correct": row[2],
-                    "wrong": [x for x in row[3:12] if x]
-                }
-            finally:
-                connection.close()
+    def final_results(self) -> list[tuple]:
+        """Итоги игры для архива: [(user_id, score, rounds_survived, is_banked, result)]"""
+        # Победитель один: продержавшийся дольше всех, при равенстве — с большим счётом,
+        # затем ушедший в банк (раньше других), затем выбывший последним.
+        # При полном равенстве — тот, кто раньше вошёл в комнату
+        winner = max(self.state.values(), key=self._winner_key, default=None)
+        results = []
+        for user_id, player in self.state.items():
+            if player is winner:
+                result = "win"
+            elif player.is_banked:
+                result = "banked"
+            else:
+                result = "eliminated"
+            results.append((user_id, player.score, player.rounds_survived, player.is_banked, result))
+        return results
+
+    @staticmethod
+    def _winner_key(player: PlayerState) -> tuple:
+        exit_rank = -player.exit_order if player.is_banked else player.exit_order
+        return player.rounds_survived, player.score, player.is_banked, exit_rank
+
+    def player_stats(self, results: list[tuple]) -> list[tuple]:
+        """Прибавки к статистике игроков: [(user_id, score, correct_answers, wrong_answers, wins, name)]"""
+        rows = []
+        for user_id, score, _, _, result in results:
+            player = self.state[user_id]
+            # Очки сохраняют победитель и ушедшие в банк; выбывшие их теряют
+            kept_score = score if result in ("win", "banked") else 0
+            rows.append((user_id, kept_score, player.correct_answers, player.wrong_answers, int(result == "win"),
+                         self.names.get(user_id)))
+        return rows
+
+    async def finish_game(self):
+        """Игра окончена: итоги одной транзакцией уходят в game_history и статистику игроков"""
+        games.remove(self.room_id)
+        results = self.final_results()
+        await archive_game(self.room_id, results, self.player_stats(results))
 
     def shuffle_answers(self, question_data):
+        """Перемешанные варианты и индекс правильного среди них"""
         all_answers = [question_data["correct"]] + question_data["wrong"]
         random.shuffle(all_answers)
-        return {ans: (ans == question_data["correct"]) for ans in all_answers}
+        return all_answers, all_answers.index(question_data["correct"])
+
+
+def _deep_size(obj, seen: set) -> int:
+    """Приблизительный размер объекта вместе со всем, на что он ссылается"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    elif hasattr(obj, "__slots__") and not isinstance(obj, (asyncio.Task, asyncio.Event)):
+        size += sum(_deep_size(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+class EngineRegistry:
+    """Все идущие игры процесса по room_id.
+
+    Игра создаётся только через create(): если уже идёт capacity игр, новая не
+    допускается (admission control) — вызывающий сообщает игрокам, что мест нет.
+    remove() гасит таймер раунда и все фоновые задачи игры, чтобы от
+    законченной игры в памяти ничего не оставалось.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity  # 0 — без ограничения
+        self._engines = {}  # room_id: GameEngine
+
+        self.created = 0
+        self.finished = 0
+        self.rejected = 0
+        self.peak = 0
+
+    def __contains__(self, room_id: int) -> bool:
+        return room_id in self._engines
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    def get(self, room_id: int) -> Optional[GameEngine]:
+        return self._engines.get(room_id)
+
+    def admits(self) -> bool:
+        return self.capacity <= 0 or len(self._engines) < self.capacity
+
+    def create(self, room_id: int, bot) -> Optional[GameEngine]:
+        """Новая игра в комнате; None — достигнут предел одновременных игр"""
+        engine = self._engines.get(room_id)
+        if engine is not None:
+            return engine
+        if not self.admits():
+            self.rejected += 1
+            logging.warning(f"[room {room_id}] Игра не допущена: идёт {len(self._engines)} игр из {self.capacity}")
+            return None
+        engine = self._engines[room_id] = GameEngine(room_id, bot)
+        self.created += 1
+        self.peak = max(self.peak, len(self._engines))
+        return engine
+
+    def remove(self, room_id: int):
+        engine = self._engines.pop(room_id, None)
+        if engine is None:
+            return
+        deadlines.cancel(engine.round_deadline)
+        engine.round_deadline = None
+        # Все фоновые задачи игры — одной отменой группы
+        supervisor.cancel_group(("game", room_id))
+        engine._prefetch_task = None
+        engine.prefetched.clear()
+        self.finished += 1
+
+    def memory_per_game(self, sample: int = 20) -> int:
+        """Средний размер игры в байтах по нескольким идущим играм (бот и задачи не считаются)"""
+        engines = list(self._engines.values())[:sample]
+        if not engines:
+            return 0
+        total = 0
+        for engine in engines:
+            seen = {id(engine.bot)}
+            total += _deep_size(engine, seen)
+        return total // len(engines)
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._engines),
+            "capacity": self.capacity,
+            "peak": self.peak,
+            "created": self.created,
+            "finished": self.finished,
+            "rejected": self.rejected,
+            "bytes_per_game": self.memory_per_game(),
+        }
+
+
+games = EngineRegistry(capacity=config.MAX_CONCURRENT_GAMES)
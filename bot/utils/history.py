@@ -0,0 +1,155 @@
+import logging
+import time
+from datetime import date, datetime
+from bot.utils import config
+from bot.utils.db import acquire
+from bot.utils.leaderboard import leaderboard
+from bot.utils.sessions import sessions
+from bot.utils.sharding import MAINTENANCE_KEY, cluster
+from bot.utils.logging_config import setup_logging
+
+setup_logging()
+
+# Таблица чемпионов живёт в процессе общих задач — итоги игр из других процессов идут туда
+cluster.register("leaderboard_apply", leaderboard.apply)
+
+
+class ArchiveStats:
+    """Счётчики переноса сыгранных игр в game_history"""
+
+    def __init__(self):
+        self.games = 0
+        self.rows = 0
+        self.errors = 0
+        self.time_total = 0.0
+        self.time_max = 0.0
+        self.partitions_created = 0
+        self.partitions_dropped = 0
+
+    def record(self, rows: int, elapsed: float):
+        self.games += 1
+        self.rows += rows
+        self.time_total += elapsed
+        self.time_max = max(self.time_max, elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "games": self.games,
+            "rows": self.rows,
+            "errors": self.errors,
+            "avg_ms": round(self.time_total / self.games * 1000, 3) if self.games else 0.0,
+            "max_ms": round(self.time_max * 1000, 3),
+            "partitions_created": self.partitions_created,
+            "partitions_dropped": self.partitions_dropped,
+        }
+
+
+archive_stats = ArchiveStats()
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def archive_game(room_id: int, results: list[tuple], player_stats: list[tuple]) -> bool:
+    """Переносит законченную игру в архив, прибавляет статистику игрокам и убирает игру
+    из горячих таблиц — одной транзакцией.
+
+    results — [(user_id, score, rounds_survived, is_banked, result)],
+    player_stats — [(user_id, score, correct_answers, wrong_answers, wins, name)] — прибавки за игру
+    и имя из Telegram (None — не менять).
+    """
+    finished_at = datetime.now().replace(microsecond=0)
+    started = time.perf_counter()
+    try:
+        async with acquire() as connection:
+            cursor = connection.cursor()
+            await cursor.executemany("""
+                INSERT INTO game_history
+                    (finished_at, room_id, user_id, score, rounds_survived, is_banked, result)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, [(finished_at, room_id, *row) for row in results])
+            # Один многострочный upsert на всю игру: счётчики прибавляются, а не перезаписываются
+            await cursor.executemany("""
+                INSERT INTO players (id, score, correct_answers, wrong_answers, wins, name)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    name = COALESCE(VALUES(name), name),
+                    score = score + VALUES(score),
+                    correct_answers = correct_answers + VALUES(correct_answers),
+                    wrong_answers = wrong_answers + VALUES(wrong_answers),
+                    wins = wins + VALUES(wins)
+            """, player_stats)
+            # Итоговые очки для таблицы чемпионов — по первичному ключу, без сортировки всей таблицы
+            gained = {row[0]: row[1] for row in player_stats}
+            scores = []
+            if gained:
+                await cursor.execute(
+                    f"SELECT id, name, score FROM players WHERE id IN ({', '.join(['%s'] * len(gained))})",
+                    list(gained)
+                )
+                scores = cursor.fetchall()
+            await cursor.execute("DELETE FROM game_players WHERE room_id = %s", (room_id,))
+            await cursor.execute("DELETE FROM game_sessions WHERE room_id = %s", (room_id,))
+            await cursor.execute("UPDATE players SET current_room_id = NULL WHERE current_room_id = %s", (room_id,))
+            await cursor.execute("DELETE FROM rooms WHERE id = %s", (room_id,))
+            await connection.commit()
+    except Exception as e:
+        archive_stats.errors += 1
+        logging.error(f"[room {room_id}] Ошибка архивирования игры: {e}")
+        return False
+
+    # Комната и статистика игроков изменились — следующее чтение возьмёт их из БД
+    sessions.invalidate(*gained)
+    try:
+        await cluster.call_key(MAINTENANCE_KEY, "leaderboard_apply",
+                               [(user_id, name, score - gained[user_id], score) for user_id, name, score in scores])
+    except Exception as e:
+        # Итоги уже в БД — таблицу чемпионов поправит ближайшая пересборка
+        logging.error(f"[room {room_id}] Не удалось обновить таблицу чемпионов: {e}")
+    archive_stats.record(len(results), time.perf_counter() - started)
+    return True
+
+
+async def maintain_partitions(months_ahead: int = config.HISTORY_MONTHS_AHEAD,
+                              keep_months: int = config.HISTORY_KEEP_MONTHS):
+    """Заводит секции game_history на months_ahead месяцев вперёд и удаляет старше keep_months.
+
+    Новые секции выделяются из pmax (она пуста, пока секции заведены с запасом),
+    а удаление старого месяца — DROP PARTITION, без построчного DELETE.
+    """
+    this_month = date.today().replace(day=1)
+    async with acquire() as connection:
+        cursor = connection.cursor()
+        await cursor.execute("""
+            SELECT partition_name FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND table_name = 'game_history' AND partition_name IS NOT NULL
+        """)
+        existing = {row[0] for row in cursor.fetchall()}
+        if not existing:
+            return
+
+        months = sorted(name for name in existing if name != "pmax")
+        last = date(int(months[-1][1:5]), int(months[-1][5:7]), 1) if months else _add_months(this_month, -1)
+        missing = []
+        month = _add_months(last, 1)
+        while month <= _add_months(this_month, months_ahead):
+            missing.append(month)
+            month = _add_months(month, 1)
+        if missing:
+            partitions = ", ".join(
+                f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_add_months(month, 1):%Y-%m-%d}')"
+                for month in missing
+            ) + ", PARTITION pmax VALUES LESS THAN (MAXVALUE)"
+            await cursor.execute(f"ALTER TABLE game_history REORGANIZE PARTITION pmax INTO ({partitions})")
+            archive_stats.partitions_created += len(missing)
+            logging.info(f"game_history: добавлены секции {[f'p{m:%Y%m}' for m in missing]}")
+
+        if keep_months > 0:
+            oldest_kept = f"p{_add_months(this_month, -keep_months):%Y%m}"
+            expired = [name for name in months if name < oldest_kept]
+            if expired:
+                await cursor.execute(f"ALTER TABLE game_history DROP PARTITION {', '.join(expired)}")
+                archive_stats.partitions_dropped += len(expired)
+                logging.info(f"game_history: удалены секции {expired}")
@@ -0,0 +1,228 @@
+import asyncio
+import bisect
+import logging
+import time
+from bot.utils import config
+from bot.utils.db import acquire
+from bot.utils.logging_config import setup_logging
+
+setup_logging()
+
+
+class FenwickTree:
+    """Дерево Фенвика: прибавка в точке и сумма префикса за O(log n), размер растёт по требованию"""
+    __slots__ = ("tree",)
+
+    def __init__(self, size: int = 1024):
+        self.tree = [0] * (size + 1)
+
+    def _grow(self, index: int):
+        counts = [self.prefix(i) - self.prefix(i - 1) for i in range(len(self.tree) - 1)]
+        size = len(self.tree) - 1
+        while size <= index:
+            size *= 2
+        self.tree = [0] * (size + 1)
+        for i, count in enumerate(counts):
+            if count:
+                self.add(i, count)
+
+    def add(self, index: int, delta: int):
+        if index >= len(self.tree) - 1:
+            self._grow(index)
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index: int) -> int:
+        """Сумма по позициям 0..index включительно"""
+        index = min(index + 1, len(self.tree) - 1)
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+
+class Leaderboard:
+    """Таблица чемпионов в памяти.
+
+    Лучшие size игроков — отсортированный список, из него отдаются страницы.
+    Место любого игрока считается по гистограмме очков (дерево Фенвика по корзинам
+    шириной bucket) за O(log n). Место точное, только если все очки кратны bucket
+    (очки начисляются по 100, bucket по умолчанию 100); иначе игроки одной корзины
+    считаются равными и место может оказаться выше настоящего.
+    Итоги игр применяются сразу после записи в БД, а периодическая пересборка из БД
+    исправляет возможный дрейф; итоги, пришедшие во время пересборки, применяются
+    поверх неё.
+    """
+
+    def __init__(self, size: int, bucket: int, rebuild_interval: float):
+        self.size = size
+        self.bucket = bucket
+        self.rebuild_interval = rebuild_interval
+        self._top = []     # [(-score, user_id)] по возрастанию, т.е. по убыванию очков
+        self._names = {}   # user_id: имя — только для игроков из топа
+        self._histogram = FenwickTree()
+        self.players = 0
+        self.loaded = False
+        self._runner = None
+        self._buffer = None  # итоги игр, пришедшие во время пересборки
+
+        self.rebuilds = 0
+        self.last_rebuild = 0.0
+        self.updates = 0
+        self.replayed = 0
+        self.rank_lookups = 0
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logging.error(f"Ошибка пересборки таблицы чемпионов: {e}")
+            await asyncio.sleep(self.rebuild_interval)
+
+    async def rebuild(self):
+        """Полная пересборка: топ по индексу очков и гистограмма одним GROUP BY.
+
+        Все чтения идут из одного снимка БД. Итоги игр, пришедшие, пока шла пересборка,
+        сверяются с этим снимком: то, чего он ещё не видел, применяется поверх.
+        """
+        started = time.perf_counter()
+        self._buffer = []
+        try:
+            async with acquire() as connection:
+                cursor = connection.cursor()
+                await cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+                await cursor.execute(
+                    "SELECT id, name, score FROM players ORDER BY score DESC, id LIMIT %s",
+                    (self.size,)
+                )
+                top_rows = cursor.fetchall()
+                await cursor.execute(
+                    "SELECT score DIV %s, COUNT(*) FROM players GROUP BY score DIV %s",
+                    (self.bucket, self.bucket)
+                )
+                histogram_rows = cursor.fetchall()
+                # Очки в снимке у игроков, чьи итоги пришли во время пересборки;
+                # пока идёт запрос, могут прийти новые — тогда читаем и их
+                seen = {}
+                while True:
+                    pending = list({change[0] for change in self._buffer} - seen.keys())
+                    if not pending:
+                        break
+                    await cursor.execute(
+                        f"SELECT id, score FROM players WHERE id IN ({', '.join(['%s'] * len(pending))})",
+                        pending
+                    )
+                    found = dict(cursor.fetchall())
+                    seen.update((user_id, found.get(user_id)) for user_id in pending)
+                # Без await до подмены: всё, что придёт дальше, ляжет уже на новую таблицу
+                buffered, self._buffer = self._buffer, None
+                self._install(top_rows, histogram_rows)
+                # Последний итог каждого игрока против его очков в снимке
+                latest = {user_id: (name, score) for user_id, name, _, score in buffered}
+                replay = [(user_id, name, seen[user_id], score)
+                          for user_id, (name, score) in latest.items() if seen[user_id] != score]
+                self._apply(replay)
+                self.replayed += len(replay)
+                await connection.commit()
+        finally:
+            self._buffer = None
+        self.rebuilds += 1
+        self.last_rebuild = time.perf_counter() - started
+
+    def _install(self, top_rows, histogram_rows):
+        histogram = FenwickTree()
+        players = 0
+        for bucket, count in histogram_rows:
+            histogram.add(max(0, int(bucket)), count)
+            players += count
+
+        self._top = sorted((-score, user_id) for user_id, _, score in top_rows)
+        self._names = {user_id: name for user_id, name, _ in top_rows}
+        self._histogram = histogram
+        self.players = players
+        self.loaded = True
+
+    def apply(self, changes: list[tuple]):
+        """Применяет итоги игры: [(user_id, имя, очки до, очки после)]"""
+        if self._buffer is not None:
+            self._buffer.extend(changes)
+        if self.loaded:
+            self._apply(changes)
+
+    def _apply(self, changes):
+        for user_id, name, old_score, new_score in changes:
+            if old_score is None:
+                self.players += 1
+            else:
+                self._histogram.add(max(0, old_score // self.bucket), -1)
+            self._histogram.add(max(0, new_score // self.bucket), 1)
+
+            if old_score is not None:
+                index = bisect.bisect_left(self._top, (-old_score, user_id))
+                if index < len(self._top) and self._top[index] == (-old_score, user_id):
+                    del self._top[index]
+            if len(self._top) < self.size or (-new_score, user_id) < self._top[-1]:
+                bisect.insort(self._top, (-new_score, user_id))
+                self._names[user_id] = name
+                if len(self._top) > self.size:
+                    _, dropped = self._top.pop()
+                    self._names.pop(dropped, None)
+            else:
+                self._names.pop(user_id, None)
+            self.updates += 1
+
+    def rank_of(self, score: int) -> int:
+        """Место игрока с такими очками: 1 + число игроков с большим счётом.
+
+        Счёт внутри корзины не различается: при очках, не кратных bucket, игроки
+        той же корзины с большим счётом не учитываются.
+        """
+        self.rank_lookups += 1
+        return self.players - self._histogram.prefix(max(0, score // self.bucket)) + 1
+
+    def page(self, number: int, page_size: int) -> list[tuple]:
+        """Страница топа: [(место, user_id, имя, очки)]"""
+        start = number * page_size
+        rows = []
+        for negative_score, user_id in self._top[start:start + page_size]:
+            # Равные очки — равное место, как и в rank_of
+            rows.append((self.rank_of(-negative_score), user_id, self._names.get(user_id), -negative_score))
+        return rows
+
+    def pages(self, page_size: int) -> int:
+        return max(1, -(-len(self._top) // page_size))
+
+    def stats(self) -> dict:
+        return {
+            "players": self.players,
+            "top": len(self._top),
+            "rebuilds": self.rebuilds,
+            "last_rebuild_ms": round(self.last_rebuild * 1000, 1),
+            "updates": self.updates,
+            "replayed": self.replayed,
+            "rank_lookups": self.rank_lookups,
+        }
+
+
+leaderboard = Leaderboard(
+    size=config.LEADERBOARD_SIZE,
+    bucket=config.LEADERBOARD_BUCKET,
+    rebuild_interval=config.LEADERBOARD_REBUILD_INTERVAL
+)
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Optional
+from bot.utils import config
+from bot.utils.db import acquire
+from bot.utils.deadlines import deadlines
+from bot.utils.logging_config import setup_logging
+from bot.utils.outbound import Priority, outbound
+from bot.utils.sharding import cluster
+from bot.utils.supervisor import supervisor
+from bot.keyboards import game_kb
+
+setup_logging()
+
+
+class Lobby:
+    """Ожидающая комната: состав и сообщения статуса участников живут в памяти"""
+    __slots__ = ("room_id", "is_private", "players_count", "members", "shown",
+                 "countdown_until", "changed", "closed", "task", "timer")
+
+    def __init__(self, room_id: int, is_private: bool):
+        self.room_id = room_id
+        self.is_private = is_private
+        self.players_count = 0
+        self.members = {}  # user_id: (chat_id, message_id) сообщения статуса или None, пока оно не отправлено
+        self.shown = {}    # user_id: (текст, число игроков), которые сейчас видит участник
+        self.countdown_until = None  # time.monotonic() автостарта игры
+        self.changed = asyncio.Event()
+        self.closed = False  # игра стартует — новых участников не принимаем
+        self.task = None
+        self.timer = None  # ближайший срок лобби в общем колесе: смена секунды или старт
+
+    def countdown_left(self, now: float) -> Optional[int]:
+        if self.countdown_until is None:
+            return None
+        return max(0, math.ceil(self.countdown_until - now))
+
+    def status_text(self, left: Optional[int]) -> str:
+        if self.is_private:
+            return f"🔒 Приватная комната: {self.room_id}\nПригласите друзей, отправив им этот ID"
+        if left is None:
+            return f"🕐 Ожидаем игроков... ({self.players_count}/4)"
+        return f"⏳ Игроков: {self.players_count}/4\n⌛ Игра начнётся через: {left} сек"
+
+
+class LobbyHub:
+    """Состав ожидающих комнат в памяти процесса.
+
+    add_player_to_room / remove_player_from_room публикуют изменения сюда, а один
+    координатор на комнату правит сообщения статуса всех участников — только когда
+    меняется число игроков или секунда обратного отсчёта. БД при этом не опрашивается.
+    Сроки отсчёта держит общее колесо таймеров, а время старта пишется в
+    rooms.start_timer_time, чтобы отсчёт пережил перезапуск бота (restore()).
+    """
+
+    def __init__(self):
+        self.lobbies = {}        # room_id: Lobby
+        self.rooms_by_user = {}  # user_id: room_id
+        # Вызывается по истечении отсчёта: async (room_id, {user_id: (chat_id, message_id) или None})
+        self.on_countdown_end = None
+
+        self.events = 0
+        self.edits = 0
+        self.unchanged = 0
+        self.games_started = 0
+        self.restored = 0
+
+    def accepts(self, room_id: int) -> bool:
+        """Можно ли войти в комнату: игра в ней ещё не стартует"""
+        lobby = self.lobbies.get(room_id)
+        return lobby is None or not lobby.closed
+
+    def room_of(self, user_id: int) -> Optional[int]:
+        return self.rooms_by_user.get(user_id)
+
+    def players_count(self, room_id: int) -> Optional[int]:
+        lobby = self.lobbies.get(room_id)
+        return lobby.players_count if lobby is not None else None
+
+    def joined(self, room_id: int, user_id: int, players_count: int, is_private: bool):
+        lobby = self.lobbies.get(room_id)
+        if lobby is None:
+            lobby = self.lobbies[room_id] = Lobby(room_id, is_private)
+            lobby.task = supervisor.spawn(self._coordinate(lobby), "lobby", ("room", room_id))
+        lobby.members.setdefault(user_id, None)
+        lobby.players_count = players_count
+        self.rooms_by_user[user_id] = room_id
+        self._publish(lobby)
+
+    def left(self, room_id: int, user_id: int, players_count: int):
+        if self.rooms_by_user.get(user_id) == room_id:
+            del self.rooms_by_user[user_id]
+        lobby = self.lobbies.get(room_id)
+        if lobby is None:
+            return
+        lobby.members.pop(user_id, None)
+        lobby.shown.pop(user_id, None)
+        lobby.players_count = players_count
+        self._publish(lobby)
+
+    def attach(self, room_id: int, user_id: int, chat_id: int, message_id: int):
+        """Запоминает сообщение статуса участника — дальше его правит координатор комнаты"""
+        lobby = self.lobbies.get(room_id)
+        if lobby is None or user_id not in lobby.members:
+            return
+        lobby.members[user_id] = (chat_id, message_id)
+        lobby.shown.pop(user_id, None)
+        self._publish(lobby)
+
+    def _publish(self, lobby: Lobby):
+        self.events += 1
+        lobby.changed.set()
+
+    async def _coordinate(self, lobby: Lobby):
+        room_id = lobby.room_id
+        try:
+            while lobby.players_count > 0:
+                lobby.changed.clear()
+                now = time.monotonic()
+
+                if not lobby.is_private:
+                    if lobby.players_count >= config.LOBBY_MIN_PLAYERS:
+                        if lobby.countdown_until is None:
+                            lobby.countdown_until = now + config.LOBBY_COUNTDOWN_SECONDS
+                            await self._save_start_time(room_id, config.LOBBY_COUNTDOWN_SECONDS)
+                    elif lobby.countdown_until is not None:
+                        logging.info(f"В комнате {room_id} осталось <{config.LOBBY_MIN_PLAYERS} игроков — таймер сброшен")
+                        lobby.countdown_until = None
+                        await self._save_start_time(room_id, None)
+
+                left = lobby.countdown_left(now)
+                if left == 0:
+                    await self._start_game(lobby)
+                    return
+
+                await self._render(lobby, lobby.status_text(left))
+
+                # Спим до следующего события; смену секунды (последняя — сам старт) отмеряет колесо
+                deadlines.cancel(lobby.timer)
+                lobby.timer = None
+                if left is not None:
+                    lobby.timer = deadlines.schedule_at(lobby.countdown_until - (left - 1), lobby.changed.set)
+                await lobby.changed.wait()
+            logging.info(f"[room {room_id}] Лобби опустело")
+        except Exception as e:
+            logging.error(f"Координатор лобби {room_id} завершился с ошибкой: {e}", exc_info=True)
+        finally:
+            deadlines.cancel(lobby.timer)
+            if self.lobbies.get(room_id) is lobby:
+                del self.lobbies[room_id]
+            for user_id in lobby.members:
+                if self.rooms_by_user.get(user_id) == room_id:
+                    del self.rooms_by_user[user_id]
+
+    async def _render(self, lobby: Lobby, text: str, with_keyboard: bool = True):
+        view = (text, lobby.players_count)
+        edits = []
+        for user_id, target in lobby.members.items():
+            if target is None:
+                continue
+            if lobby.shown.get(user_id) == view:
+                self.unchanged += 1
+                continue
+            lobby.shown[user_id] = view
+            chat_id, message_id = target
+            kwargs = {}
+            if with_keyboard:
+                kwargs["reply_markup"] = game_kb.get_room_status_keyboard(lobby.room_id, lobby.players_count)
+            edits.append(outbound.edit(chat_id, message_id, text, Priority.LOBBY_STATUS, **kwargs))
+
+        if not edits:
+            return
+        self.edits += len(edits)
+        for result in await asyncio.gather(*edits, return_exceptions=True):
+            if isinstance(result, Exception):
+                logging.warning(f"[room {lobby.room_id}] Не удалось обновить статус лобби: {result}")
+
+    async def _save_start_time(self, room_id: int, delay: Optional[float]):
+        """Время автостарта в rooms.start_timer_time (по часам БД); None — отсчёт сброшен"""
+        try:
+            async with acquire() as connection:
+                cursor = connection.cursor()
+                if delay is None:
+                    await cursor.execute("UPDATE rooms SET start_timer_time = NULL WHERE id = %s", (room_id,))
+                else:
+                    await cursor.execute(
+                        "UPDATE rooms SET start_timer_time = NOW() + INTERVAL %s SECOND WHERE id = %s",
+                        (math.ceil(delay), room_id)
+                    )
+                await connection.commit()
+        except Exception as e:
+            logging.error(f"[room {room_id}] Не удалось сохранить время старта: {e}")
+
+    async def restore(self) -> int:
+        """После перезапуска поднимает лобби с идущим отсчётом из rooms.start_timer_time.
+
+        Сообщений статуса у восстановленных участников нет, поэтому до старта их
+        не правим, а игра придёт новыми сообщениями.
+        """
+        async with acquire() as connection:
+            cursor = connection.cursor()
+            await cursor.execute("""
+                SELECT r.id, r.is_private, TIMESTAMPDIFF(SECOND, NOW(), r.start_timer_time), m.user_id
+                FROM rooms r
+                JOIN room_members m ON m.room_id = r.id
+                WHERE r.start_timer_time IS NOT NULL
+                ORDER BY r.id, m.slot
+            """)
+            rows = cursor.fetchall()
+
+        now = time.monotonic()
+        restored = []
+        for room_id, is_private, left, user_id in rows:
+            if not cluster.owns(room_id):
+                continue  # комнату поднимет её процесс
+            lobby = self.lobbies.get(room_id)
+            if lobby is None:
+                lobby = self.lobbies[room_id] = Lobby(room_id, bool(is_private))
+                lobby.countdown_until = now + max(0, left)
+                restored.append(lobby)
+            if lobby in restored:
+                lobby.members[user_id] = None
+                lobby.players_count += 1
+                self.rooms_by_user[user_id] = room_id
+
+        for lobby in restored:
+            lobby.task = supervisor.spawn(self._coordinate(lobby), "lobby", ("room", lobby.room_id))
+        self.restored += len(restored)
+        if restored:
+            logging.info(f"Восстановлено лобби с отсчётом: {len(restored)}")
+        return len(restored)
+
+    async def _start_game(self, lobby: Lobby):
+        lobby.closed = True
+        await self._save_start_time(lobby.room_id, None)
+        await self._render(lobby, "⌛ Время ожидания истекло. Игра начинается!", with_keyboard=False)
+        self.games_started += 1
+        if self.on_countdown_end is not None:
+            await self.on_countdown_end(lobby.room_id, dict(lobby.members))
+
+    def stats(self) -> dict:
+        return {
+            "lobbies": len(self.lobbies),
+            "members": len(self.rooms_by_user),
+            "events": self.events,
+            "edits": self.edits,
+            "unchanged": self.unchanged,
+            "games_started": self.games_started,
+            "restored": self.restored,
+        }
+
+
+lobbies = LobbyHub()
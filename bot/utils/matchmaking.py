@@ -0,0 +1,244 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter, deque
+from bot.utils import config
+from bot.utils.logging_config import setup_logging
+from bot.utils.supervisor import supervisor
+
+setup_logging()
+
+
+def skill_rating(score: int, wins: int) -> int:
+    """Рейтинг для подбора соперников: общий счёт плюс вес за каждую победу"""
+    return (score or 0) + (wins or 0) * 1000
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class QueueEntry:
+    __slots__ = ("user_id", "skill", "bucket", "chat_id", "message_id", "enqueued_at", "active")
+
+    def __init__(self, user_id: int, skill: int, bucket: int, chat_id: int, message_id: int,
+                 enqueued_at: float = None):
+        self.user_id = user_id
+        self.skill = skill
+        self.bucket = bucket
+        self.chat_id = chat_id
+        self.message_id = message_id  # сообщение «Ищем соперников», станет сообщением игры
+        self.enqueued_at = time.monotonic() if enqueued_at is None else enqueued_at
+        self.active = True
+
+
+class MatchmakingQueue:
+    """Очередь «Случайных соперников».
+
+    Игроки раскладываются по корзинам рейтинга (FIFO внутри корзины). Полная корзина
+    сразу даёт комнату из max_players. Если самый старый игрок ждёт дольше max_wait,
+    ему собирается комната из min_players..max_players из его и соседних корзин — с
+    каждым следующим max_wait соседство расширяется. Постановка в очередь — O(log n),
+    отмена — O(1) (запись помечается и выбрасывается при встрече).
+    """
+
+    def __init__(self, min_players: int, max_players: int, max_wait: float, bucket_width: int):
+        self.min_players = min_players
+        self.max_players = max_players
+        self.max_wait = max_wait
+        self.bucket_width = bucket_width
+        # Вызывается для каждой собранной комнаты: async (list[QueueEntry])
+        self.on_match = None
+
+        self.entries = {}       # user_id: QueueEntry
+        self.buckets = {}       # корзина: deque[QueueEntry] (могут быть отменённые)
+        self.bucket_sizes = {}  # корзина: число активных игроков
+        self._deadlines = []    # куча (срок, seq, QueueEntry)
+        self._ready = set()     # корзины, набравшие max_players
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner = None
+
+        self.matches = 0
+        self.matched = 0
+        self.cancelled = 0
+        self.sizes = Counter()
+        self.waits = deque(maxlen=1000)  # время до матча последних игроков
+
+    def is_queued(self, user_id: int) -> bool:
+        return user_id in self.entries
+
+    def enqueue(self, user_id: int, skill: int, chat_id: int, message_id: int) -> bool:
+        if user_id in self.entries:
+            return False
+        bucket = skill // self.bucket_width if self.bucket_width > 0 else 0
+        self._insert(QueueEntry(user_id, skill, bucket, chat_id, message_id))
+        return True
+
+    def requeue(self, entries: list) -> int:
+        """Возвращает игроков сорвавшегося матча в очередь с прежним временем ожидания"""
+        requeued = 0
+        for entry in entries:
+            if entry.user_id not in self.entries:
+                self._insert(QueueEntry(entry.user_id, entry.skill, entry.bucket,
+                                        entry.chat_id, entry.message_id, entry.enqueued_at))
+                requeued += 1
+        return requeued
+
+    def _insert(self, entry: QueueEntry):
+        bucket = entry.bucket
+        self.entries[entry.user_id] = entry
+        self.buckets.setdefault(bucket, deque()).append(entry)
+        self.bucket_sizes[bucket] = self.bucket_sizes.get(bucket, 0) + 1
+        heapq.heappush(self._deadlines, (entry.enqueued_at + self.max_wait, next(self._seq), entry))
+        if self.bucket_sizes[bucket] >= self.max_players:
+            self._ready.add(bucket)
+
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def cancel(self, user_id: int) -> bool:
+        entry = self.entries.pop(user_id, None)
+        if entry is None:
+            return False
+        self._drop(entry)
+        self.cancelled += 1
+        return True
+
+    def _drop(self, entry: QueueEntry):
+        entry.active = False
+        self.bucket_sizes[entry.bucket] -= 1
+        if self.bucket_sizes[entry.bucket] == 0:
+            del self.bucket_sizes[entry.bucket]
+            del self.buckets[entry.bucket]
+
+    def _take(self, bucket: int, count: int) -> list:
+        """Снимает до count игроков из головы корзины, пропуская отменённых"""
+        taken = []
+        queue = self.buckets.get(bucket)
+        while queue and len(taken) < count:
+            entry = queue.popleft()
+            if entry.active:
+                del self.entries[entry.user_id]
+                self._drop(entry)
+                taken.append(entry)
+        return taken
+
+    def _gather(self, entry: QueueEntry, now: float):
+        """Комната для давно ждущего игрока из его корзины и ближайших соседних"""
+        radius = int((now - entry.enqueued_at) // self.max_wait) if self.max_wait > 0 else 0
+        nearby = sorted(
+            (abs(bucket - entry.bucket), bucket)
+            for bucket in self.bucket_sizes
+            if abs(bucket - entry.bucket) <= radius
+        )
+        if sum(self.bucket_sizes[bucket] for _, bucket in nearby) < self.min_players:
+            return None
+
+        group = []
+        for _, bucket in nearby:
+            group += self._take(bucket, self.max_players - len(group))
+            if len(group) == self.max_players:
+                break
+        return group
+
+    def _collect(self, now: float) -> list:
+        groups = []
+        for bucket in list(self._ready):
+            while self.bucket_sizes.get(bucket, 0) >= self.max_players:
+                groups.append(self._take(bucket, self.max_players))
+        self._ready.clear()
+
+        while self._deadlines:
+            deadline, _, entry = self._deadlines[0]
+            if not entry.active:
+                heapq.heappop(self._deadlines)
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(self._deadlines)
+            group = self._gather(entry, now)
+            if group is not None:
+                groups.append(group)
+            if entry.active:
+                # Соперников рядом нет (или комнату забрали ждавшие дольше) — ещё max_wait с более широким поиском
+                heapq.heappush(self._deadlines, (now + self.max_wait, next(self._seq), entry))
+        return groups
+
+    async def _run(self):
+        while self.entries:
+            self._wakeup.clear()
+            now = time.monotonic()
+            for group in self._collect(now):
+                self._record(group, now)
+                if self.on_match is not None:
+                    supervisor.spawn(self.on_match(group), "match")
+
+            timeout = self._deadlines[0][0] - now if self._deadlines else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _record(self, group: list, now: float):
+        self.matches += 1
+        self.matched += len(group)
+        self.sizes[len(group)] += 1
+        for entry in group:
+            self.waits.append(now - entry.enqueued_at)
+        logging.info(f"Подобрана комната из {len(group)} игроков")
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits)
+        return {
+            "queued": len(self.entries),
+            "buckets": len(self.bucket_sizes),
+            "matches": self.matches,
+            "matched": self.matched,
+            "cancelled": self.cancelled,
+            "sizes": dict(sorted(self.sizes.items())),
+            "wait_p50_s": round(_percentile(waits, 0.5), 3),
+            "wait_p90_s": round(_percentile(waits, 0.9), 3),
+            "wait_p99_s": round(_percentile(waits, 0.99), 3),
+        }
+
+
+matchmaking = MatchmakingQueue(
+    min_players=config.MATCH_MIN_PLAYERS,
+    max_players=config.MATCH_MAX_PLAYERS,
+    max_wait=config.MATCH_MAX_WAIT,
+    bucket_width=config.MATCH_SKILL_BUCKET
+)
+
+
+if __name__ == "__main__":
+    # Нагрузочный прогон: поток игроков со случайным рейтингом, без Telegram и БД.
+    # Запуск: python -m bot.utils.matchmaking
+    import random
+
+    async def bench(users: int = 20000, arrivals_per_sec: float = 2000.0):
+        queue = MatchmakingQueue(min_players=2, max_players=4, max_wait=0.5, bucket_width=3000)
+
+        async def on_match(group):
+            pass
+
+        queue.on_match = on_match
+        enqueue_time = 0.0
+        for user_id in range(users):
+            started = time.perf_counter()
+            queue.enqueue(user_id, random.randint(0, 30000), user_id, 0)
+            enqueue_time += time.perf_counter() - started
+            if user_id % 100 == 0:
+                await asyncio.sleep(100 / arrivals_per_sec)
+        while len(queue.entries) >= queue.min_players:
+            await asyncio.sleep(0.1)
+
+        print(f"Игроков: {users}, постановка в очередь: {enqueue_time / users * 1e6:.2f} мкс")
+        print(queue.stats())
+
+    asyncio.run(bench())
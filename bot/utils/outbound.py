@@ -0,0 +1,264 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from aiogram.exceptions import TelegramRetryAfter
+from bot.utils import config
+from bot.utils.logging_config import setup_logging
+from bot.utils.rate_limit import ChatRateLimiter
+
+setup_logging()
+
+
+class Priority(IntEnum):
+    """Классы исходящих сообщений: чем меньше число, тем раньше уходит"""
+    ROUND_QUESTION = 0
+    ROUND_RESULT = 1
+    LOBBY_STATUS = 2
+    BROADCAST = 3
+
+
+class OutboundJob:
+    __slots__ = ("priority", "seq", "chat_id", "method", "kwargs", "future",
+                 "enqueued_at", "not_before", "retries", "coalesce_key")
+
+    def __init__(self, priority, seq, chat_id, method, kwargs, future, coalesce_key=None):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.method = method
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.not_before = 0.0
+        self.retries = 0
+        self.coalesce_key = coalesce_key
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def _copy_result(source: asyncio.Future, target: asyncio.Future):
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class OutboundScheduler:
+    """Единая очередь исходящих запросов к Bot API.
+
+    Общий лимит и лимит на чат — вёдра токенов; внутри лимитов сообщения уходят
+    по приоритету. Несколько правок одного сообщения, ждущих в очереди,
+    склеиваются в одну. На 429 (TelegramRetryAfter) запрос откладывается и
+    повторяется автоматически, а ведро чата останавливается на retry_after;
+    если 429 пришёл сразу в нескольких чатах, лимит общий — останавливается и общее ведро.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float,
+                 max_inflight: int = 100, max_retries: int = 5):
+        self.limiter = ChatRateLimiter(global_rate, chat_rate, chat_burst)
+        self.max_retries = max_retries
+        self.bot = None
+
+        self._queue = []     # куча готовых к отправке задач
+        self._delayed = []   # куча (not_before, seq, job) — ждут лимита чата или retry-after
+        self._pending_edits = {}  # (chat_id, message_id): job
+        self._throttled = {}      # chat_id: до какого момента действует его последний 429
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._tasks = set()
+        self._runner = None
+
+        # Статистика по приоритетам
+        self.depth = {p: 0 for p in Priority}
+        self.dispatched = {p: 0 for p in Priority}
+        self.wait_total = {p: 0.0 for p in Priority}
+        self.wait_max = {p: 0.0 for p in Priority}
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+        self.global_pauses = 0
+
+    def start(self, bot):
+        self.bot = bot
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    def _enqueue(self, job: OutboundJob):
+        self.depth[job.priority] += 1
+        heapq.heappush(self._queue, job)
+        self._wakeup.set()
+
+    def submit(self, chat_id: int, method: str, priority: Priority, kwargs: dict, coalesce_key=None) -> asyncio.Future:
+        """Ставит вызов bot.<method>(**kwargs) в очередь; результат — через future"""
+        if coalesce_key is not None:
+            pending = self._pending_edits.get(coalesce_key)
+            if pending is not None:
+                # Предыдущая правка ещё не ушла — просто подменяем её содержимое
+                pending.kwargs = kwargs
+                self.coalesced += 1
+                if priority < pending.priority:
+                    # Новое содержимое срочнее старого — правка уходит с его приоритетом
+                    self.depth[pending.priority] -= 1
+                    pending.priority = Priority(priority)
+                    self.depth[pending.priority] += 1
+                    heapq.heapify(self._queue)
+                return pending.future
+
+        future = asyncio.get_running_loop().create_future()
+        job = OutboundJob(Priority(priority), next(self._seq), chat_id, method, kwargs, future, coalesce_key)
+        if coalesce_key is not None:
+            self._pending_edits[coalesce_key] = job
+        self._enqueue(job)
+        return future
+
+    async def send(self, chat_id: int, text: str, priority: Priority = Priority.BROADCAST, **kwargs):
+        kwargs.update(chat_id=chat_id, text=text)
+        return await self.submit(chat_id, "send_message", priority, kwargs)
+
+    async def edit(self, chat_id: int, message_id: int, text: str, priority: Priority = Priority.LOBBY_STATUS, **kwargs):
+        kwargs.update(chat_id=chat_id, message_id=message_id, text=text)
+        return await self.submit(chat_id, "edit_message_text", priority, kwargs, coalesce_key=(chat_id, message_id))
+
+    async def _next_job(self) -> OutboundJob:
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, job = heapq.heappop(self._delayed)
+                heapq.heappush(self._queue, job)
+
+            if not self._queue:
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job = heapq.heappop(self._queue)
+
+            # Чат исчерпал лимит — откладываем задачу, не задерживая остальные чаты
+            bucket = self.limiter.chat_bucket(job.chat_id)
+            wait = bucket.wait_time()
+            if wait > 0:
+                job.not_before = now + wait
+                heapq.heappush(self._delayed, (job.not_before, job.seq, job))
+                continue
+
+            bucket.reserve()
+            return job
+
+    async def _run(self):
+        while True:
+            # Сначала ждём общий лимит и только потом выбираем задачу:
+            # так уходит самая приоритетная из накопившихся за время ожидания
+            await self.limiter.global_bucket.acquire()
+            await self._inflight.acquire()
+            job = await self._next_job()
+
+            if job.coalesce_key is not None and self._pending_edits.get(job.coalesce_key) is job:
+                del self._pending_edits[job.coalesce_key]
+
+            waited = time.monotonic() - job.enqueued_at
+            self.depth[job.priority] -= 1
+            self.dispatched[job.priority] += 1
+            self.wait_total[job.priority] += waited
+            self.wait_max[job.priority] = max(self.wait_max[job.priority], waited)
+
+            task = asyncio.create_task(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: OutboundJob):
+        try:
+            result = await getattr(self.bot, job.method)(**job.kwargs)
+            if not job.future.done():
+                job.future.set_result(result)
+        except TelegramRetryAfter as e:
+            # Лимит исчерпан не только для этой задачи: следующие сообщения в чат тоже ждут
+            self._throttle(job.chat_id, e.retry_after)
+            if job.retries >= self.max_retries:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            job.retries += 1
+            self.retried += 1
+            logging.warning(f"429 для чата {job.chat_id}: повтор через {e.retry_after} сек")
+
+            if job.coalesce_key is not None:
+                newer = self._pending_edits.get(job.coalesce_key)
+                if newer is not None:
+                    # Пока ждали, пришла более свежая правка — старую не повторяем
+                    self.coalesced += 1
+                    newer.future.add_done_callback(lambda f, old=job.future: _copy_result(f, old))
+                    return
+                self._pending_edits[job.coalesce_key] = job
+
+            job.not_before = time.monotonic() + e.retry_after
+            self.depth[job.priority] += 1
+            heapq.heappush(self._delayed, (job.not_before, job.seq, job))
+            self._wakeup.set()
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._inflight.release()
+
+    def _throttle(self, chat_id: int, retry_after: float):
+        now = time.monotonic()
+        self._throttled = {chat: until for chat, until in self._throttled.items() if until > now}
+        # 429 сразу в двух разных чатах — превышен общий лимит бота, а не лимит чата
+        is_global = any(chat != chat_id for chat in self._throttled)
+        self._throttled[chat_id] = now + retry_after
+        self.limiter.chat_bucket(chat_id).pause(retry_after)
+        if is_global:
+            self.limiter.global_bucket.pause(retry_after)
+            self.global_pauses += 1
+
+    def stats(self) -> dict:
+        per_priority = {}
+        for p in Priority:
+            dispatched = self.dispatched[p]
+            per_priority[p.name] = {
+                "depth": self.depth[p],
+                "dispatched": dispatched,
+                "wait_avg_ms": round(self.wait_total[p] / dispatched * 1000, 3) if dispatched else 0.0,
+                "wait_max_ms": round(self.wait_max[p] * 1000, 3),
+            }
+        return {
+            "depth": sum(self.depth.values()),
+            "delayed": len(self._delayed),
+            "inflight": len(self._tasks),
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failed": self.failed,
+            "global_pauses": self.global_pauses,
+            "priorities": per_priority,
+        }
+
+
+outbound = OutboundScheduler(
+    global_rate=config.TELEGRAM_GLOBAL_RATE,
+    chat_rate=config.TELEGRAM_CHAT_RATE,
+    chat_burst=config.TELEGRAM_CHAT_BURST
+)
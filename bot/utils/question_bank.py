@@ -0,0 +1,274 @@
+import logging
+import random
+import time
+from array import array
+from collections import OrderedDict, deque
+from typing import Iterable, Optional
+from bot.utils import config
+from bot.utils.db import acquire
+from bot.utils.logging_config import setup_logging
+
+setup_logging()
+
+QUESTION_COLUMNS = (
+    "id, question, correct_answer, "
+    "wrong_answer_1, wrong_answer_2, wrong_answer_3, "
+    "wrong_answer_4, wrong_answer_5, wrong_answer_6, "
+    "wrong_answer_7, wrong_answer_8, wrong_answer_9"
+)
+
+
+def _pack(row) -> tuple:
+    """Строка из questions -> компактный кортеж (вопрос, правильный ответ, неправильные)"""
+    return row[1], row[2], tuple(x for x in row[3:12] if x)
+
+
+def _unpack(question_id: int, body: tuple) -> dict:
+    question, correct, wrong = body
+    return {
+        "id": question_id,
+        "question": question,
+        "correct": correct,
+        "wrong": list(wrong)
+    }
+
+
+class QuestionBank:
+    """Общий для процесса кэш вопросов.
+
+    ID всех вопросов лежат в массиве-«мешке» (shuffle bag): мешок перемешивается
+    один раз и выдаёт по одному ID с конца, поэтому выбор случайного вопроса — O(1)
+    и без ORDER BY RAND(). Тексты вопросов хранятся в ограниченном LRU-кэше.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._live = set()       # ID существующих вопросов
+        self._bag = array("q")   # ID, ещё не выданные в текущем круге
+        self._bodies = OrderedDict()  # id: (question, correct, wrong)
+        self.loaded = False
+        # В режиме шардов у каждого процесса свой банк: об изменениях вопроса
+        # из админ-панели остальным сообщает кластер — (question_id, удалён ли)
+        self.on_changed = None
+
+        # Счётчики для статистики
+        self.hits = 0
+        self.misses = 0
+        self.draws = 0
+        self.reloads = 0
+        self.refreshes = 0
+        self.last_reload_ms = 0.0
+        self.last_reload_at = None
+
+    def __len__(self):
+        return len(self._live)
+
+    async def reload(self):
+        """Полная загрузка банка из БД (при старте бота)"""
+        started = time.perf_counter()
+        async with acquire() as connection:
+            cursor = connection.cursor()
+            await cursor.execute("SELECT id FROM questions")
+            ids = [row[0] for row in cursor.fetchall()]
+            await cursor.execute(f"SELECT {QUESTION_COLUMNS} FROM questions LIMIT %s", (self.capacity,))
+            rows = cursor.fetchall()
+            cursor.close()
+
+        self._live = set(ids)
+        self._bag = array("q", ids)
+        random.shuffle(self._bag)
+        self._bodies = OrderedDict((row[0], _pack(row)) for row in rows)
+        self.loaded = True
+
+        self.reloads += 1
+        self.last_reload_ms = round((time.perf_counter() - started) * 1000, 3)
+        self.last_reload_at = time.time()
+        logging.info(f"Банк вопросов загружен: {len(ids)} вопросов за {self.last_reload_ms} мс")
+
+    def draw(self) -> Optional[int]:
+        """Случайный ID вопроса из мешка; когда мешок пуст — он перемешивается заново"""
+        while True:
+            if not self._bag:
+                if not self._live:
+                    return None
+                self._bag = array("q", self._live)
+                random.shuffle(self._bag)
+            question_id = self._bag.pop()
+            # Удалённые вопросы выбрасываем из мешка лениво
+            if question_id in self._live:
+                self.draws += 1
+                return question_id
+
+    def draw_deck(self, size: int, exclude: set = frozenset(), forbid: set = frozenset()) -> list[int]:
+        """Колода из size неповторяющихся ID.
+
+        Вопросы из exclude берутся только если других не хватает, из forbid — никогда
+        (колода может оказаться короче size или пустой).
+        """
+        deck = []
+        taken = set()
+        postponed = []
+        # Остаток текущего круга мешка и ещё один полный круг: за это время
+        # каждый вопрос банка выпадет хотя бы раз
+        for _ in range(len(self._bag) + len(self._live)):
+            if len(deck) >= size:
+                break
+            question_id = self.draw()
+            if question_id is None:
+                break
+            if question_id in taken or question_id in forbid:
+                continue
+            taken.add(question_id)
+            if question_id in exclude:
+                postponed.append(question_id)
+            else:
+                deck.append(question_id)
+        deck.extend(postponed[:size - len(deck)])
+        return deck
+
+    def _remember(self, question_id: int, body: tuple):
+        self._bodies[question_id] = body
+        self._bodies.move_to_end(question_id)
+        while len(self._bodies) > self.capacity:
+            self._bodies.popitem(last=False)
+
+    async def get(self, question_id: int) -> Optional[dict]:
+        """Вопрос по ID: из кэша или (при промахе) из БД"""
+        body = self._bodies.get(question_id)
+        if body is not None:
+            self.hits += 1
+            self._bodies.move_to_end(question_id)
+        else:
+            self.misses += 1
+            async with acquire() as connection:
+                cursor = connection.cursor()
+                await cursor.execute(f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = %s", (question_id,))
+                row = cursor.fetchone()
+                cursor.close()
+            if row is None:
+                self.remove(question_id)
+                return None
+            body = _pack(row)
+            self._remember(question_id, body)
+
+        return _unpack(question_id, body)
+
+    async def get_many(self, question_ids: list[int]) -> dict[int, dict]:
+        """Несколько вопросов сразу: промахи кэша дочитываются одним запросом"""
+        found = {}
+        missing = []
+        for question_id in question_ids:
+            body = self._bodies.get(question_id)
+            if body is None:
+                missing.append(question_id)
+            else:
+                # Попадания поднимаем в конец LRU до того, как промахи начнут вытеснять старые записи
+                self._bodies.move_to_end(question_id)
+                found[question_id] = body
+        self.hits += len(question_ids) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            placeholders = ", ".join(["%s"] * len(missing))
+            async with acquire() as connection:
+                cursor = connection.cursor()
+                await cursor.execute(
+                    f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id IN ({placeholders})",
+                    missing
+                )
+                rows = cursor.fetchall()
+                cursor.close()
+            for row in rows:
+                found[row[0]] = _pack(row)
+                self._remember(row[0], found[row[0]])
+            for question_id in missing:
+                if question_id not in found:
+                    self.remove(question_id)
+
+        # Ответ собирается не из кэша: пачка больше capacity не теряет вытесненные записи
+        return {
+            question_id: _unpack(question_id, found[question_id])
+            for question_id in question_ids
+            if question_id in found
+        }
+
+    async def refresh(self, question_id: int, notify: bool = True):
+        """Перечитывает один вопрос после добавления или изменения в админ-панели.
+
+        notify=False — изменение пришло от другого процесса, пересылать его обратно не нужно
+        """
+        async with acquire() as connection:
+            cursor = connection.cursor()
+            await cursor.execute(f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = %s", (question_id,))
+            row = cursor.fetchone()
+            cursor.close()
+
+        self.refreshes += 1
+        if row is None:
+            self.remove(question_id, notify)
+            return
+
+        if question_id not in self._live:
+            self._live.add(question_id)
+            # Новый вопрос кладём в случайное место мешка, чтобы он попал в текущий круг
+            self._bag.append(question_id)
+            j = random.randrange(len(self._bag))
+            self._bag[-1], self._bag[j] = self._bag[j], self._bag[-1]
+        self._remember(question_id, _pack(row))
+        if notify and self.on_changed is not None:
+            self.on_changed(question_id, False)
+
+    def remove(self, question_id: int, notify: bool = True):
+        """Убирает вопрос из банка (из мешка — лениво, при следующей выдаче)"""
+        self._live.discard(question_id)
+        self._bodies.pop(question_id, None)
+        if notify and self.on_changed is not None:
+            self.on_changed(question_id, True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "questions": len(self._live),
+            "cached": len(self._bodies),
+            "capacity": self.capacity,
+            "draws": self.draws,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0.0,
+            "reloads": self.reloads,
+            "refreshes": self.refreshes,
+            "last_reload_ms": self.last_reload_ms,
+        }
+
+
+class SeenQuestions:
+    """Недавно заданные игрокам вопросы: по пользователю — короткая очередь ID"""
+
+    def __init__(self, per_user: int, max_users: int):
+        self.per_user = per_user
+        self.max_users = max_users
+        self._seen = OrderedDict()  # user_id: deque(question_id)
+
+    def mark(self, user_ids: Iterable[int], question_id: int):
+        for user_id in user_ids:
+            recent = self._seen.get(user_id)
+            if recent is None:
+                recent = self._seen[user_id] = deque(maxlen=self.per_user)
+                if len(self._seen) > self.max_users:
+                    self._seen.popitem(last=False)
+            else:
+                self._seen.move_to_end(user_id)
+            recent.append(question_id)
+
+    def union(self, user_ids: Iterable[int]) -> set:
+        """Все вопросы, которые недавно видел хотя бы один из игроков"""
+        result = set()
+        for user_id in user_ids:
+            recent = self._seen.get(user_id)
+            if recent:
+                result.update(recent)
+        return result
+
+
+question_bank = QuestionBank(capacity=config.QUESTION_CACHE_SIZE)
+seen_questions = SeenQuestions(per_user=config.SEEN_QUESTIONS_PER_USER, max_users=config.SEEN_QUESTIONS_MAX_USERS)
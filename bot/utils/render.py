@@ -0,0 +1,81 @@
+import html
+from functools import lru_cache
+from bot.utils import config
+
+
+@lru_cache(maxsize=config.RENDER_CACHE_SIZE)
+def _question_body(question_id: int, question: str) -> str:
+    # Текст входит в ключ: после правки вопроса в админке появится новая запись, старая вытеснится
+    return html.escape(question)
+
+
+def question_text(question: dict, round_number: int) -> str:
+    """Текст вопроса для игрока: заголовок раунда + заранее экранированное тело вопроса"""
+    return (
+        f"<b>Вопрос №{round_number}</b>\n\n"
+        f"{_question_body(question['id'], question['question'])}\n\n"
+        f"⏱ {config.ROUND_SECONDS:g} сек на ответ"
+    )
+
+
+def cache_stats() -> dict:
+    from bot.keyboards import game_kb
+
+    result = {"question_body": _question_body.cache_info()}
+    for name in ("get_room_status_keyboard", "get_private_room_keyboard"):
+        result[name] = getattr(game_kb, name).cache_info()
+    return result
+
+
+if __name__ == "__main__":
+    # Замер на раунд (4 игрока): тело вопроса и клавиатура раунда + обновление статуса лобби
+    # у каждого ожидающего — с кэшем и без него. Запуск: python -m bot.utils.render
+    import random
+    import time
+    import tracemalloc
+    from bot.keyboards import game_kb
+
+    players = 4
+    rounds = 2000
+    question = {"id": 1, "question": "Сколько будет 2 + 2 & <почему>?"}
+    options = ("4", "5", "3", "22")
+
+    def one_round(cached: bool, round_number: int) -> list:
+        build_lobby = game_kb.get_room_status_keyboard if cached else game_kb.get_room_status_keyboard.__wrapped__
+        render_body = _question_body if cached else _question_body.__wrapped__
+        built = [render_body(question["id"], question["question"]) for _ in range(players)]
+        built.append(game_kb.get_answer_keyboard(7, round_number, tuple(random.sample(options, len(options)))))
+        built.extend(build_lobby(7, players) for _ in range(players))
+        return built
+
+    def measure(cached: bool) -> tuple[float, float, float]:
+        started = time.perf_counter()
+        for round_number in range(rounds):
+            one_round(cached, round_number)
+        elapsed = time.perf_counter() - started
+
+        # Выделения за раунд: результаты раундов удерживаются до второго снимка, поэтому
+        # каждый созданный раундом объект (строки, разметки, кнопки) виден как новый блок.
+        # Промежуточные объекты, освобождённые внутри раунда, в счёт не попадают
+        measured = 200
+        kept = [None] * measured
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for index in range(measured):
+            kept[index] = one_round(cached, rounds + index)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        own = tracemalloc.Filter(False, tracemalloc.__file__)
+        diff = after.filter_traces([own]).compare_to(before.filter_traces([own]), "filename")
+        blocks = sum(stat.count_diff for stat in diff)
+        size = sum(stat.size_diff for stat in diff)
+        return elapsed / rounds * 1e6, blocks / measured, size / measured
+
+    uncached_us, uncached_blocks, uncached_bytes = measure(cached=False)
+    cached_us, cached_blocks, cached_bytes = measure(cached=True)
+    print(f"Раундов: {rounds}, игроков: {players}")
+    print(f"Без кэша: {uncached_us:.1f} мкс, {uncached_blocks:.0f} выделений ({uncached_bytes:.0f} байт) на раунд")
+    print(f"С кэшем:  {cached_us:.1f} мкс, {cached_blocks:.0f} выделений ({cached_bytes:.0f} байт) на раунд")
+    print(f"Сэкономлено за раунд: {uncached_blocks - cached_blocks:.0f} выделений")
+    for name, info in cache_stats().items():
+        print(f"{name}: {info}")
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from bot.utils import config
+from bot.utils.logging_config import setup_logging
+from bot.utils.supervisor import supervisor
+
+setup_logging()
+
+
+def _consume(future: asyncio.Future):
+    if not future.cancelled():
+        future.exception()
+
+
+class RoomEvent:
+    __slots__ = ("kind", "handler", "args", "future", "enqueued_at")
+
+    def __init__(self, kind: str, handler, args: tuple, future: asyncio.Future):
+        self.kind = kind
+        self.handler = handler
+        self.args = args
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class RoomActor:
+    """Почтовый ящик комнаты: события обрабатываются строго по одному и по порядку"""
+    __slots__ = ("room_id", "mailbox", "task", "processed", "failed", "max_depth",
+                 "wait_total", "wait_max", "busy_total", "busy_max")
+
+    def __init__(self, room_id: int):
+        self.room_id = room_id
+        self.mailbox = asyncio.Queue()
+        self.task = None
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.wait_total = 0.0  # от постановки в ящик до начала обработки
+        self.wait_max = 0.0
+        self.busy_total = 0.0  # сама обработка
+        self.busy_max = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.mailbox.qsize(),
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "failed": self.failed,
+            "wait_avg_ms": round(self.wait_total / self.processed * 1000, 3) if self.processed else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "busy_avg_ms": round(self.busy_total / self.processed * 1000, 3) if self.processed else 0.0,
+            "busy_max_ms": round(self.busy_max * 1000, 3),
+        }
+
+
+class RoomActors:
+    """Комнаты-акторы: всё, что меняет комнату (вход, выход, ответ, банк, конец раунда),
+    идёт через её почтовый ящик и выполняется одной задачей по очереди.
+
+    Поэтому внутри комнаты нет гонок и не нужны блокировки строк в БД. Актор
+    создаётся по первому событию и завершается, простояв без событий idle секунд.
+    Обработчик события не должен сам ждать события своей же комнаты — это взаимная
+    блокировка; такие продолжения ставятся в ящик через tell().
+    """
+
+    def __init__(self, idle: float):
+        self.idle = idle
+        self.actors = {}  # room_id: RoomActor
+
+        self.events = 0
+        self.retired = 0
+        # Итоги завершившихся акторов, чтобы общая статистика не терялась
+        self._done_processed = 0
+        self._done_wait_total = 0.0
+        self.wait_max = 0.0
+
+    def post(self, room_id: int, kind: str, handler, *args) -> asyncio.Future:
+        """Кладёт событие в ящик комнаты; будущий результат — то, что вернёт handler(*args)"""
+        actor = self.actors.get(room_id)
+        if actor is None:
+            actor = self.actors[room_id] = RoomActor(room_id)
+            actor.task = supervisor.spawn(self._run(actor), "room_actor", ("room", room_id))
+        future = asyncio.get_running_loop().create_future()
+        actor.mailbox.put_nowait(RoomEvent(kind, handler, args, future))
+        actor.max_depth = max(actor.max_depth, actor.mailbox.qsize())
+        self.events += 1
+        return future
+
+    def tell(self, room_id: int, kind: str, handler, *args):
+        """post() без ожидания результата; ошибки обработчика актор уже записал в лог"""
+        self.post(room_id, kind, handler, *args).add_done_callback(_consume)
+
+    async def call(self, room_id: int, kind: str, handler, *args):
+        """post() и ожидание результата"""
+        return await self.post(room_id, kind, handler, *args)
+
+    async def _run(self, actor: RoomActor):
+        try:
+            while True:
+                if not actor.mailbox.empty():
+                    # Очередь не пуста — без wait_for: он заводит отдельную задачу на каждое ожидание
+                    event = actor.mailbox.get_nowait()
+                else:
+                    try:
+                        event = await asyncio.wait_for(actor.mailbox.get(), self.idle)
+                    except asyncio.TimeoutError:
+                        # Между таймаутом и удалением нет await — новое событие не потеряется
+                        if actor.mailbox.empty():
+                            return
+                        continue
+
+                started = time.perf_counter()
+                wait = started - event.enqueued_at
+                try:
+                    result = await event.handler(*event.args)
+                except Exception as e:
+                    actor.failed += 1
+                    logging.error(f"[room {actor.room_id}] Ошибка обработки события {event.kind}: {e}", exc_info=True)
+                    if not event.future.done():
+                        event.future.set_exception(e)
+                else:
+                    if not event.future.done():
+                        event.future.set_result(result)
+
+                busy = time.perf_counter() - started
+                actor.processed += 1
+                actor.wait_total += wait
+                actor.wait_max = max(actor.wait_max, wait)
+                actor.busy_total += busy
+                actor.busy_max = max(actor.busy_max, busy)
+        finally:
+            if self.actors.get(actor.room_id) is actor:
+                del self.actors[actor.room_id]
+            self.retired += 1
+            self._done_processed += actor.processed
+            self._done_wait_total += actor.wait_total
+            self.wait_max = max(self.wait_max, actor.wait_max)
+            while not actor.mailbox.empty():
+                event = actor.mailbox.get_nowait()
+                if not event.future.done():
+                    event.future.cancel()
+
+    def room_stats(self, room_id: int):
+        actor = self.actors.get(room_id)
+        return actor.stats() if actor is not None else None
+
+    def busiest(self, limit: int = 5) -> list[tuple[int, dict]]:
+        """Комнаты с самыми длинными очередями прямо сейчас"""
+        actors = sorted(self.actors.values(), key=lambda a: (a.mailbox.qsize(), a.wait_max), reverse=True)
+        return [(actor.room_id, actor.stats()) for actor in actors[:limit]]
+
+    def stats(self) -> dict:
+        processed = self._done_processed + sum(a.processed for a in self.actors.values())
+        wait_total = self._done_wait_total + sum(a.wait_total for a in self.actors.values())
+        return {
+            "actors": len(self.actors),
+            "retired": self.retired,
+            "events": self.events,
+            "processed": processed,
+            "depth": sum(a.mailbox.qsize() for a in self.actors.values()),
+            "wait_avg_ms": round(wait_total / processed * 1000, 3) if processed else 0.0,
+            "wait_max_ms": round(max([self.wait_max] + [a.wait_max for a in self.actors.values()]) * 1000, 3),
+        }
+
+
+room_actors = RoomActors(idle=config.ROOM_ACTOR_IDLE)
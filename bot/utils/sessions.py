@@ -0,0 +1,125 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from bot.utils import config
+from bot.utils.db import acquire
+from bot.utils.logging_config import setup_logging
+
+setup_logging()
+
+
+class Session:
+    """Снимок игрока: текущая комната и статистика из players"""
+    __slots__ = ("known", "room_id", "score", "correct_answers", "wrong_answers", "wins", "name", "expires")
+
+    def __init__(self, row: Optional[tuple], expires: float):
+        self.known = row is not None  # есть ли игрок в players
+        (self.room_id, self.score, self.correct_answers, self.wrong_answers,
+         self.wins, self.name) = row or (None, 0, 0, 0, 0, None)
+        self.expires = expires
+
+
+class SessionCache:
+    """Общий для всех обработчиков кэш сессий игроков со сквозным чтением.
+
+    Промах — одно чтение players по первичному ключу, которое сразу даёт и комнату,
+    и статистику. Вход и выход из комнаты записывают новую комнату прямо в кэш,
+    итоги игры и сборщик сбрасывают записи. TTL ограничивает устаревание, если
+    players поменяли в обход бота; размер ограничен LRU.
+    """
+
+    def __init__(self, capacity: int, ttl: float):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # user_id: Session
+        # Растёт при каждом изменении: чтение из БД, начатое до изменения, в кэш не попадёт
+        self._generation = 0
+        # Другие процессы бота держат свои копии сессий: в режиме шардов об изменениях
+        # комнаты и сбросах им сообщает кластер — (user_id, room_id) и (*user_ids)
+        self.on_room_changed = None
+        self.on_invalidated = None
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get(self, user_id: int) -> Session:
+        session = self._sessions.get(user_id)
+        if session is not None:
+            if session.expires > time.monotonic():
+                self._sessions.move_to_end(user_id)
+                self.hits += 1
+                return session
+            del self._sessions[user_id]
+            self.expired += 1
+
+        self.misses += 1
+        generation = self._generation
+        async with acquire() as connection:
+            cursor = connection.cursor()
+            await cursor.execute(
+                "SELECT current_room_id, score, correct_answers, wrong_answers, wins, name FROM players WHERE id = %s",
+                (user_id,)
+            )
+            row = cursor.fetchone()
+        session = Session(row, time.monotonic() + self.ttl)
+        if generation == self._generation:
+            self._store(user_id, session)
+        return session
+
+    def _store(self, user_id: int, session: Session):
+        self._sessions[user_id] = session
+        self._sessions.move_to_end(user_id)
+        while len(self._sessions) > self.capacity:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    async def room_of(self, user_id: int) -> Optional[int]:
+        return (await self.get(user_id)).room_id
+
+    async def is_known(self, user_id: int) -> bool:
+        return (await self.get(user_id)).known
+
+    def set_room(self, user_id: int, room_id: Optional[int]):
+        """Комната игрока изменилась и записана в БД"""
+        self._generation += 1
+        session = self._sessions.get(user_id)
+        if session is not None:
+            session.room_id = room_id
+        if self.on_room_changed is not None:
+            self.on_room_changed(user_id, room_id)
+
+    def mark_known(self, user_id: int, name: Optional[str] = None):
+        """Игрок только что добавлен в players (или записано его новое имя)"""
+        self._generation += 1
+        session = self._sessions.get(user_id)
+        if session is not None:
+            session.known = True
+            session.name = name
+
+    def invalidate(self, *user_ids: int, notify: bool = True):
+        """notify=False — сброс пришёл от другого процесса, пересылать его обратно не нужно"""
+        self._generation += 1
+        for user_id in user_ids:
+            if self._sessions.pop(user_id, None) is not None:
+                self.invalidations += 1
+        if notify and user_ids and self.on_invalidated is not None:
+            self.on_invalidated(*user_ids)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._sessions),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+sessions = SessionCache(capacity=config.SESSION_CACHE_SIZE, ttl=config.SESSION_TTL)
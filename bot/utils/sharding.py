@@ -0,0 +1,588 @@
+import asyncio
+import bisect
+import hashlib
+import inspect
+import json
+import logging
+import os
+import struct
+import time
+from collections import Counter
+from typing import Optional
+from bot.utils import config
+from bot.utils.logging_config import setup_logging
+from bot.utils.question_bank import question_bank
+from bot.utils.sessions import sessions
+from bot.utils.supervisor import supervisor
+
+setup_logging()
+
+_HEADER = struct.Struct(">I")
+# Общие для всех процессов задачи (хвосты игр, секции архива, таблица чемпионов)
+# ведёт один процесс — владелец этого ключа на кольце
+MAINTENANCE_KEY = "maintenance"
+# Очередь подбора одна на все процессы — у владельца этого ключа
+MATCHMAKING_KEY = "matchmaking"
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+def room_key(room_id: int) -> str:
+    return f"room:{room_id}"
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+class HashRing:
+    """Согласованное хеширование: у каждого процесса vnodes точек на кольце.
+
+    Ключ принадлежит первой точке по часовой стрелке от его хеша. При смене числа
+    процессов переезжает лишь ~1/N ключей, а виртуальные точки выравнивают нагрузку.
+    """
+
+    def __init__(self, nodes: int, vnodes: int):
+        self.nodes = nodes
+        points = sorted((_hash(f"shard-{node}#{vnode}"), node) for node in range(nodes) for vnode in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_of(self, key: str) -> int:
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[dict]:
+    """Кадр: 4 байта длины и JSON; None — соединение закрыто"""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+        body = await reader.readexactly(_HEADER.unpack(header)[0])
+    except asyncio.IncompleteReadError:
+        return None
+    return json.loads(body)
+
+
+def write_frame(writer: asyncio.StreamWriter, message: dict):
+    body = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode()
+    writer.write(_HEADER.pack(len(body)) + body)
+
+
+class Cluster:
+    """Режим нескольких процессов: фронт получает апдейты и раздаёт их рабочим процессам.
+
+    Апдейт уходит процессу, которому на кольце принадлежит комната игрока
+    (room:<id>), а вне комнаты — сам игрок (user:<id>). Поэтому каждая комната
+    со своим лобби, актором и GameEngine живёт ровно в одном процессе, и всё, что
+    уже сделано для одного процесса, работает без изменений. Если обработчику нужна
+    комната другого процесса (только что созданная комната, старт игры после подбора),
+    call() передаёт вызов её владельцу через фронт; call_key() — владельцу любого ключа.
+
+    Без SHARD_WORKERS всё работает в одном процессе: owns() и is_maintainer всегда истина,
+    call() вызывает обработчик на месте.
+    """
+
+    CALL_TIMEOUT = 30.0
+
+    def __init__(self, workers: int, index: Optional[int], socket_dir: str, vnodes: int):
+        self.workers = workers
+        self.index = index  # номер этого рабочего процесса; None — фронт или одиночный процесс
+        self.socket_dir = socket_dir
+        self.ring = HashRing(workers, vnodes) if workers else None
+        self.handlers = {}  # имя: обработчик, который можно вызвать из другого процесса
+        # Фронт: async (update, состояние FSM) -> ключ на кольце
+        self.route = None
+
+        self._front = None     # рабочий процесс: соединение с фронтом
+        self._pending = {}     # id вызова: Future
+        self._next_call = 0
+        self._inflight = set()
+        self._links = {}       # фронт: номер процесса -> соединение
+        self._processes = {}   # фронт: номер процесса -> Process
+        self._flushes = {}     # фронт: номер процесса -> Future
+
+        self.frames_in = 0
+        self.frames_out = 0
+        self.updates = 0
+        self.routed = Counter()
+        self.calls_local = 0
+        self.calls_remote = 0
+        self.calls_served = 0
+        self.call_errors = 0
+        self.call_time_total = 0.0
+        self.call_time_max = 0.0
+        self.invalidations = 0
+        self.question_changes = 0
+
+    @property
+    def is_worker(self) -> bool:
+        return self.workers > 0 and self.index is not None
+
+    @property
+    def role(self) -> str:
+        if not self.workers:
+            return "single"
+        return f"worker {self.index}" if self.index is not None else "front"
+
+    def socket_path(self, index: int) -> str:
+        return os.path.join(self.socket_dir, f"worker-{index}.sock")
+
+    def shard_of(self, key: str) -> int:
+        return self.ring.node_of(key) if self.ring is not None else 0
+
+    def owns(self, room_id: int) -> bool:
+        """Живёт ли комната в этом процессе"""
+        return self.owns_key(room_key(room_id))
+
+    def owns_key(self, key: str) -> bool:
+        return not self.is_worker or self.shard_of(key) == self.index
+
+    @property
+    def is_maintainer(self) -> bool:
+        """Ведёт ли этот процесс общие для всех процессов задачи (MAINTENANCE_KEY)"""
+        return self.owns_key(MAINTENANCE_KEY)
+
+    def register(self, name: str, handler):
+        """Обработчик для call(); аргументы и результат должны сериализоваться в JSON"""
+        self.handlers[name] = handler
+
+    async def call(self, room_id: int, name: str, *args):
+        """Выполняет обработчик name в процессе-владельце комнаты и возвращает его результат"""
+        return await self.call_key(room_key(room_id), name, *args)
+
+    async def call_key(self, key: str, name: str, *args):
+        """Выполняет обработчик name в процессе-владельце ключа key"""
+        if self.owns_key(key):
+            self.calls_local += 1
+            return await self._invoke(name, args)
+        if self._front is None:
+            # Фронт ещё не подключился или уже отключился — передать вызов владельцу некому
+            self.call_errors += 1
+            raise RuntimeError(f"Шард {self.index}: нет связи с фронтом, вызов {name} ({key}) невозможен")
+
+        started = time.perf_counter()
+        self._next_call += 1
+        call_id = self._next_call
+        future = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = future
+        self._send(self._front, {"t": "call", "id": call_id, "key": key, "name": name, "args": list(args)})
+        try:
+            reply = await asyncio.wait_for(future, self.CALL_TIMEOUT)
+        finally:
+            self._pending.pop(call_id, None)
+        elapsed = time.perf_counter() - started
+        self.calls_remote += 1
+        self.call_time_total += elapsed
+        self.call_time_max = max(self.call_time_max, elapsed)
+        if not reply["ok"]:
+            self.call_errors += 1
+            raise RuntimeError(f"Вызов {name} ({key}) не выполнен: {reply['error']}")
+        return reply["value"]
+
+    async def _invoke(self, name: str, args):
+        result = self.handlers[name](*args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def _send(self, writer: asyncio.StreamWriter, message: dict):
+        write_frame(writer, message)
+        self.frames_out += 1
+
+    # --- Рабочий процесс ---
+
+    async def serve(self, on_update):
+        """Принимает кадры фронта, пока он не отключится. on_update — async (dict апдейта)"""
+        os.makedirs(self.socket_dir, exist_ok=True)
+        path = self.socket_path(self.index)
+        if os.path.exists(path):
+            os.unlink(path)
+        disconnected = asyncio.Event()
+
+        async def on_connect(reader, writer):
+            self._front = writer
+            sessions.on_room_changed = self._room_changed
+            sessions.on_invalidated = self._invalidated
+            question_bank.on_changed = self._question_changed
+            logging.info(f"Шард {self.index}: фронт подключился")
+            try:
+                await self._worker_loop(reader, writer, on_update)
+            finally:
+                sessions.on_room_changed = None
+                sessions.on_invalidated = None
+                question_bank.on_changed = None
+                self._front = None
+                writer.close()
+                disconnected.set()
+
+        server = await asyncio.start_unix_server(on_connect, path=path)
+        try:
+            await disconnected.wait()
+            logging.info(f"Шард {self.index}: фронт отключился, завершаем работу")
+        finally:
+            server.close()
+            await server.wait_closed()
+            if self._inflight:
+                await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    async def _worker_loop(self, reader, writer, on_update):
+        while True:
+            message = await read_frame(reader)
+            if message is None:
+                return
+            self.frames_in += 1
+            kind = message["t"]
+            if kind == "update":
+                self.updates += 1
+                task = supervisor.spawn(on_update(message["update"]), "update")
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+            elif kind == "call":
+                supervisor.spawn(self._serve_call(writer, message), "remote_call")
+            elif kind == "result":
+                future = self._pending.get(message["id"])
+                if future is not None and not future.done():
+                    future.set_result(message)
+            elif kind == "invalidate":
+                self.invalidations += 1
+                sessions.invalidate(*message["users"], notify=False)
+            elif kind == "question":
+                # Вопрос изменили в админ-панели другого процесса
+                self.question_changes += 1
+                if message["removed"]:
+                    question_bank.remove(message["id"], notify=False)
+                else:
+                    supervisor.spawn(question_bank.refresh(message["id"], notify=False), "question_refresh")
+            elif kind == "flush":
+                supervisor.spawn(self._flush(writer), "flush")
+            await writer.drain()
+
+    async def _serve_call(self, writer, message: dict):
+        reply = {"t": "result", "id": message["id"], "to": message["from"]}
+        try:
+            reply.update(ok=True, value=await self._invoke(message["name"], message["args"]))
+        except Exception as e:
+            logging.error(f"Шард {self.index}: ошибка вызова {message['name']}: {e}", exc_info=True)
+            reply.update(ok=False, error=repr(e))
+        self.calls_served += 1
+        self._send(writer, reply)
+
+    async def _flush(self, writer):
+        """Отвечает, когда обработаны все апдейты, пришедшие до запроса"""
+        if self._inflight:
+            await asyncio.gather(*list(self._inflight), return_exceptions=True)
+        self._send(writer, {"t": "flushed"})
+
+    def _room_changed(self, user_id: int, room_id: Optional[int]):
+        if self._front is not None:
+            self._send(self._front, {"t": "room", "user": user_id, "room": room_id})
+
+    def _invalidated(self, *user_ids: int):
+        if self._front is not None:
+            self._send(self._front, {"t": "invalidate", "users": list(user_ids)})
+
+    def _question_changed(self, question_id: int, removed: bool):
+        if self._front is not None:
+            self._send(self._front, {"t": "question", "id": question_id, "removed": removed})
+
+    # --- Фронт ---
+
+    async def start_workers(self, argv_of, env: Optional[dict] = None, connect_timeout: float = 60.0):
+        """Запускает рабочие процессы (argv_of(номер) — их командная строка) и подключается к ним"""
+        os.makedirs(self.socket_dir, exist_ok=True)
+        for index in range(self.workers):
+            path = self.socket_path(index)
+            if os.path.exists(path):
+                os.unlink(path)
+            worker_env = dict(os.environ, **(env or {}), SHARD_WORKERS=str(self.workers), SHARD_INDEX=str(index))
+            self._processes[index] = await asyncio.create_subprocess_exec(*argv_of(index), env=worker_env)
+
+        deadline = time.monotonic() + connect_timeout
+        for index in range(self.workers):
+            while True:
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.socket_path(index))
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if self._processes[index].returncode is not None or time.monotonic() > deadline:
+                        raise RuntimeError(f"Шард {index} не запустился")
+                    await asyncio.sleep(0.1)
+            self._links[index] = writer
+            supervisor.spawn(self._front_loop(index, reader), "shard_link")
+        logging.info(f"Фронт: запущено рабочих процессов: {self.workers}")
+
+    async def dispatch(self, key: str, update: dict):
+        shard = self.shard_of(key)
+        writer = self._links[shard]
+        self._send(writer, {"t": "update", "update": update})
+        self.routed[shard] += 1
+        self.updates += 1
+        await writer.drain()
+
+    async def flush(self):
+        """Ждёт, пока все процессы обработают уже разосланные апдейты"""
+        loop = asyncio.get_running_loop()
+        for index, writer in self._links.items():
+            self._flushes[index] = loop.create_future()
+            self._send(writer, {"t": "flush"})
+        await asyncio.gather(*self._flushes.values())
+
+    async def _front_loop(self, index: int, reader: asyncio.StreamReader):
+        while True:
+            message = await read_frame(reader)
+            if message is None:
+                if index not in self._links:
+                    return  # фронт сам останавливает процессы
+                # Игры процесса потеряны вместе с ним; без него часть комнат недоступна — останавливаемся целиком
+                logging.critical(f"Фронт: шард {index} отключился")
+                raise RuntimeError(f"Шард {index} отключился")
+            self.frames_in += 1
+            kind = message["t"]
+            if kind == "room":
+                sessions.set_room(message["user"], message["room"])
+                self._broadcast_invalidate(index, [message["user"]])
+            elif kind == "invalidate":
+                sessions.invalidate(*message["users"])
+                self._broadcast_invalidate(index, message["users"])
+            elif kind == "question":
+                self._broadcast_question(index, message)
+            elif kind == "call":
+                message["from"] = index
+                self._send(self._links[self.shard_of(message["key"])], message)
+            elif kind == "result":
+                self._send(self._links[message["to"]], message)
+            elif kind == "flushed":
+                self._flushes[index].set_result(True)
+
+    def _broadcast_invalidate(self, origin: int, user_ids: list):
+        self.invalidations += 1
+        for index, writer in self._links.items():
+            if index != origin:
+                self._send(writer, {"t": "invalidate", "users": user_ids})
+
+    def _broadcast_question(self, origin: int, message: dict):
+        self.question_changes += 1
+        for index, writer in self._links.items():
+            if index != origin:
+                self._send(writer, message)
+
+    async def run_front(self, bot, storage, argv_of, env: Optional[dict] = None):
+        """Фронт: long polling Telegram и раздача апдейтов по кольцу"""
+        from aiogram.fsm.storage.base import StorageKey
+
+        await self.start_workers(argv_of, env)
+        offset = None
+        backoff = 1.0
+        try:
+            while True:
+                if any(process.returncode is not None for process in self._processes.values()):
+                    raise RuntimeError("Рабочий процесс завершился")
+                try:
+                    updates = await bot.get_updates(offset=offset, timeout=30)
+                    backoff = 1.0
+                except Exception as e:
+                    logging.error(f"Фронт: ошибка получения апдейтов: {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+                # По порядку: апдейты одного игрока уходят в процесс в том же порядке, что пришли
+                for update in updates:
+                    offset = update.update_id + 1
+                    state = None
+                    if update.message is not None and update.message.from_user is not None:
+                        state = await storage.get_state(StorageKey(
+                            bot_id=bot.id, chat_id=update.message.chat.id, user_id=update.message.from_user.id
+                        ))
+                    try:
+                        key = await self.route(update, state)
+                    except Exception as e:
+                        logging.error(f"Фронт: не удалось выбрать шард для апдейта {update.update_id}: {e}")
+                        continue
+                    await self.dispatch(key, update.model_dump(mode="json", exclude_none=True))
+        finally:
+            await self.stop_workers()
+
+    async def stop_workers(self):
+        for writer in self._links.values():
+            writer.close()
+        self._links.clear()
+        for index, process in self._processes.items():
+            try:
+                await asyncio.wait_for(process.wait(), 30)
+            except asyncio.TimeoutError:
+                logging.warning(f"Фронт: шард {index} не завершился сам — останавливаем")
+                process.kill()
+        self._processes.clear()
+
+    def stats(self) -> dict:
+        return {
+            "role": self.role,
+            "workers": self.workers,
+            "updates": self.updates,
+            "routed": dict(sorted(self.routed.items())),
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "calls_local": self.calls_local,
+            "calls_remote": self.calls_remote,
+            "calls_served": self.calls_served,
+            "call_errors": self.call_errors,
+            "call_avg_ms": round(self.call_time_total / self.calls_remote * 1000, 3) if self.calls_remote else 0.0,
+            "call_max_ms": round(self.call_time_max * 1000, 3),
+            "invalidations": self.invalidations,
+            "question_changes": self.question_changes,
+        }
+
+
+cluster = Cluster(
+    workers=config.SHARD_WORKERS,
+    index=config.SHARD_INDEX,
+    socket_dir=config.SHARD_SOCKET_DIR,
+    vnodes=config.SHARD_VNODES
+)
+
+
+if __name__ == "__main__":
+    # Сколько игр в секунду проходит через фронт и 1, 2, 4 рабочих процесса.
+    # Каждая игра идёт по-настоящему: GameEngine, актор комнаты, колесо сроков, отрисовка
+    # и очередь исходящих — без Telegram и MySQL (бот отвечает сразу, БД живёт в памяти).
+    # PLAYERS игроков отвечают верно ROUNDS - 1 раундов, в последнем все уходят в банк.
+    # Ускорение возможно, только если ядер не меньше, чем рабочих процессов.
+    # Запуск: python -m bot.utils.sharding
+    import sys
+    from contextlib import asynccontextmanager
+    from types import SimpleNamespace
+
+    GAMES = 500
+    ROUNDS = 5
+    PLAYERS = 4
+    QUESTIONS = 200
+
+    class MemoryCursor:
+        """БД в памяти: отдаёт вопросы и участников игры, записи принимает и забывает"""
+
+        def __init__(self):
+            self.rows = []
+            self.rowcount = 0
+            self.lastrowid = None
+
+        def execute(self, query, args=None):
+            query = " ".join(query.split())
+            if query.startswith("SELECT id FROM questions"):
+                self.rows = [(question_id,) for question_id in range(1, QUESTIONS + 1)]
+            elif query.startswith("SELECT id, question"):
+                if "IN (" in query:
+                    ids = args
+                elif "LIMIT" in query:
+                    ids = range(1, min(args[0], QUESTIONS) + 1)
+                else:
+                    ids = args[:1]
+                self.rows = [(question_id, f"Вопрос {question_id}?", "Верно", "Нет", "Мимо", "Не то")
+                             + (None,) * 6 for question_id in ids]
+            elif query.startswith("SELECT id, user_id, score"):
+                room_id = args[0]
+                self.rows = [(room_id * PLAYERS + player, room_id * PLAYERS + player, 0, 1, 0, None)
+                             for player in range(PLAYERS)]
+            else:
+                self.rows = []
+
+        def executemany(self, query, args):
+            self.rows = []
+
+        def fetchone(self):
+            return self.rows[0] if self.rows else None
+
+        def fetchall(self):
+            return self.rows
+
+        def close(self):
+            pass
+
+    class MemoryConnection:
+        def cursor(self):
+            return MemoryCursor()
+
+        def commit(self):
+            pass
+
+        def rollback(self):
+            pass
+
+    class InstantBot:
+        """Bot API, который доставляет сообщение сразу"""
+
+        def __init__(self):
+            self.messages = 0
+
+        async def send_message(self, chat_id, text, **kwargs):
+            self.messages += 1
+            return SimpleNamespace(message_id=self.messages, chat=SimpleNamespace(id=chat_id))
+
+        async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+            return SimpleNamespace(message_id=message_id, chat=SimpleNamespace(id=chat_id))
+
+    async def bench_worker():
+        from bot.utils import db, history, leaderboard
+        from bot.utils import game_engine, question_bank as question_bank_module
+        from bot.keyboards.game_kb import BANK_OPTION
+        from bot.utils.outbound import outbound
+        from bot.utils.room_actor import room_actors
+
+        @asynccontextmanager
+        async def memory_acquire():
+            yield db.AsyncConnection(MemoryConnection())
+
+        for module in (game_engine, question_bank_module, history, leaderboard):
+            module.acquire = memory_acquire
+        game_engine.games.capacity = 0
+        limits = outbound.limiter
+        limits.global_bucket.rate = limits.global_bucket.capacity = limits.global_bucket.tokens = 1e9
+        limits.chat_rate = limits.chat_burst = 1e9
+        bot = InstantBot()
+        outbound.start(bot)
+
+        async def answer(engine, user_id: int, bank: bool):
+            option = BANK_OPTION if bank else engine.correct_option
+            return await engine.handle_answer(user_id, engine.round_number, option)
+
+        async def on_update(update: dict):
+            room_id = update["room"]
+            engine = game_engine.games.create(room_id, bot)
+            await room_actors.call(room_id, "start", engine.start_game)
+            user_ids = list(engine.state)
+            for round_number in range(1, ROUNDS + 1):
+                # Ящик комнаты идёт по порядку: ответы следующего раунда встанут после конца текущего
+                for user_id in user_ids:
+                    await room_actors.call(room_id, "answer", answer, engine, user_id, round_number == ROUNDS)
+            await room_actors.call(room_id, "done", asyncio.sleep, 0)
+            if room_id in game_engine.games:
+                raise RuntimeError(f"Игра в комнате {room_id} не закончилась")
+
+        await cluster.serve(on_update)
+
+    async def bench_front(workers: int) -> float:
+        front = Cluster(workers=workers, index=None, socket_dir=config.SHARD_SOCKET_DIR, vnodes=config.SHARD_VNODES)
+        await front.start_workers(lambda index: [sys.executable, "-m", "bot.utils.sharding", "worker"])
+        started = time.perf_counter()
+        for room_id in range(1, GAMES + 1):
+            await front.dispatch(room_key(room_id), {"room": room_id})
+        await front.flush()
+        elapsed = time.perf_counter() - started
+        await front.stop_workers()
+        return elapsed
+
+    if sys.argv[1:] == ["worker"]:
+        asyncio.run(bench_worker())
+    else:
+        cores = os.cpu_count() or 1
+        print(f"Ядер процессора: {cores}")
+        if cores < 4:
+            print("Процессов будет больше, чем ядер: ускорения не будет, замер покажет только накладные расходы")
+        base = None
+        for workers in (1, 2, 4):
+            elapsed = asyncio.run(bench_front(workers))
+            rate = GAMES / elapsed
+            base = base or rate
+            print(f"Процессов: {workers}: {rate:.0f} игр/с ({GAMES * ROUNDS * PLAYERS / elapsed:.0f} ответов/с), "
+                  f"ускорение x{rate / base:.2f}")
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Hashable, Optional
+from bot.utils.logging_config import setup_logging
+
+setup_logging()
+
+
+class TaskSupervisor:
+    """Все фоновые задачи комнат и игр процесса.
+
+    spawn() держит сильную ссылку на задачу (её не соберёт сборщик мусора посреди
+    работы), записывает её вид и группу — ("room", room_id) или ("game", room_id).
+    Упавшая задача попадает в лог и счётчик ошибок своего вида, а не теряется.
+    cancel_group() при закрытии комнаты или конце игры отменяет всю группу разом.
+    """
+
+    def __init__(self):
+        self._kinds = {}   # Task: вид
+        self._groups = {}  # группа: set(Task)
+
+        self.spawned = Counter()
+        self.failed = Counter()
+        self.cancelled = Counter()
+
+    def spawn(self, coro, kind: str, group: Optional[Hashable] = None) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._kinds[task] = kind
+        self.spawned[kind] += 1
+        if group is not None:
+            self._groups.setdefault(group, set()).add(task)
+        task.add_done_callback(lambda done: self._finished(done, group))
+        return task
+
+    def _finished(self, task: asyncio.Task, group: Optional[Hashable]):
+        kind = self._kinds.pop(task, "?")
+        if group is not None:
+            tasks = self._groups.get(group)
+            if tasks is not None:
+                tasks.discard(task)
+                if not tasks:
+                    del self._groups[group]
+        if task.cancelled():
+            self.cancelled[kind] += 1
+            return
+        error = task.exception()
+        if error is not None:
+            self.failed[kind] += 1
+            logging.error(f"Фоновая задача {kind} ({group}) упала: {error!r}", exc_info=error)
+
+    def cancel_group(self, group: Hashable) -> int:
+        """Отменяет задачи группы; текущая задача (если закрытие идёт из неё самой) не трогается"""
+        current = asyncio.current_task()
+        tasks = [task for task in self._groups.get(group, ()) if task is not current and not task.done()]
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    async def shutdown(self):
+        """Отменяет всё и дожидается завершения — при остановке бота"""
+        tasks = list(self._kinds)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def live_by_kind(self) -> dict:
+        return dict(Counter(self._kinds.values()))
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._kinds),
+            "groups": len(self._groups),
+            "by_kind": self.live_by_kind(),
+            "spawned": sum(self.spawned.values()),
+            "failed": dict(self.failed),
+            "cancelled": sum(self.cancelled.values()),
+        }
+
+
+supervisor = TaskSupervisor()
+
+
+if __name__ == "__main__":
+    # 10 тыс. игр с настоящими акторами комнат и колесом сроков: у каждой комнаты актор
+    # и координатор, у игры — фоновые подгрузки (часть падает); после закрытия групп
+    # живых задач остаться не должно. Запуск: python -m bot.utils.supervisor
+    import random
+    import time
+    from bot.utils.deadlines import deadlines
+    from bot.utils.room_actor import room_actors
+
+    GAMES = 10_000
+    ROUNDS = 5
+
+    async def prefetch(fail: bool):
+        await asyncio.sleep(random.uniform(0, 0.01))
+        if fail:
+            raise RuntimeError("вопрос не загрузился")
+
+    async def coordinator(finished: asyncio.Event):
+        await finished.wait()
+
+    async def answer(state: dict):
+        state["answers"] += 1
+
+    async def game(room_id: int):
+        state = {"answers": 0}
+        finished = asyncio.Event()
+        supervisor.spawn(coordinator(finished), "lobby", ("room", room_id))
+        for round_number in range(ROUNDS):
+            supervisor.spawn(prefetch(random.random() < 0.01), "prefetch", ("game", room_id))
+            for _ in range(4):
+                room_actors.tell(room_id, "answer", answer, state)
+            done = asyncio.Event()
+            deadlines.schedule(0.01, done.set)
+            await done.wait()
+        # Конец игры проходит через ящик комнаты — после всех ответов
+        await room_actors.call(room_id, "finish", answer, state)
+        # Недоделанная подгрузка остаётся висеть — её должна снять отмена группы
+        supervisor.spawn(asyncio.sleep(3600), "prefetch", ("game", room_id))
+        supervisor.cancel_group(("game", room_id))
+        finished.set()
+        supervisor.cancel_group(("room", room_id))
+        return state["answers"]
+
+    async def main():
+        room_actors.idle = 0.05
+        started = time.perf_counter()
+        answers = 0
+        for batch in range(0, GAMES, 1000):
+            answers += sum(await asyncio.gather(*(game(room_id) for room_id in range(batch, batch + 1000))))
+        await asyncio.sleep(room_actors.idle * 3)
+        await deadlines.stop()
+        elapsed = time.perf_counter() - started
+        print(f"Игр: {GAMES}, событий комнат обработано: {answers}, за {elapsed:.1f} с")
+        print(f"Задачи: {supervisor.stats()}")
+        print(f"Акторы: {room_actors.stats()}")
+        assert supervisor.live_by_kind() == {}, "остались живые задачи"
+
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from bot.utils import config
+from bot.utils.db import acquire
+from bot.utils.game_engine import games
+from bot.utils.history import maintain_partitions
+from bot.utils.lobby import lobbies
+from bot.utils.logging_config import setup_logging
+from bot.utils.room_actor import room_actors
+from bot.utils.sessions import sessions
+from bot.utils.sharding import cluster
+
+setup_logging()
+
+
+def _placeholders(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+class Sweeper:
+    """Периодически убирает брошенные комнаты и хвосты игр.
+
+    Комната брошена, если она старше grace и в процессе нет ни её лобби, ни игры
+    (например, бот перезапустился посреди ожидания). Всё удаляется пачками по
+    batch строк — каждая пачка в своей короткой транзакции, чтобы не держать
+    блокировки. Участники комнат удаляются каскадом.
+    """
+
+    def __init__(self, interval: float, room_grace: float, session_ttl: float,
+                 batch: int, max_batches: int):
+        self.interval = interval
+        self.room_grace = room_grace
+        self.session_ttl = session_ttl
+        self.batch = batch
+        self.max_batches = max_batches
+        self._runner = None
+
+        self.sweeps = 0
+        self.errors = 0
+        self.reclaimed = {"rooms": 0, "game_players": 0, "game_sessions": 0, "current_room_id": 0}
+        self.last_reclaimed = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Ошибка сборщика брошенных комнат: {e}", exc_info=True)
+
+    async def sweep(self) -> dict:
+        started = time.perf_counter()
+        # Брошенные комнаты каждый процесс ищет среди своих: только он знает их лобби и игры
+        reclaimed = {"rooms": await self._sweep_rooms()}
+        if cluster.is_maintainer:
+            # Хвосты игр и секции архива общие — их убирает один процесс, а не все сразу
+            reclaimed.update({
+                "game_players": await self._sweep_by_ids("""
+                    SELECT gp.id FROM game_players gp
+                    LEFT JOIN rooms r ON r.id = gp.room_id
+                    WHERE r.id IS NULL
+                    LIMIT %s
+                """, "DELETE FROM game_players WHERE id IN ({})"),
+                "game_sessions": await self._sweep_sessions(),
+                "current_room_id": await self._sweep_by_ids("""
+                    SELECT p.id FROM players p
+                    LEFT JOIN rooms r ON r.id = p.current_room_id
+                    WHERE p.current_room_id IS NOT NULL AND r.id IS NULL
+                    LIMIT %s
+                """, "UPDATE players SET current_room_id = NULL WHERE id IN ({})", on_changed=sessions.invalidate),
+            })
+            # Заодно заводим секции архива на будущие месяцы и сносим устаревшие
+            await maintain_partitions()
+
+        elapsed = time.perf_counter() - started
+        self.sweeps += 1
+        self.last_duration = elapsed
+        self.max_duration = max(self.max_duration, elapsed)
+        self.last_reclaimed = sum(reclaimed.values())
+        for kind, rows in reclaimed.items():
+            self.reclaimed[kind] += rows
+        if self.last_reclaimed:
+            logging.info(f"Сборщик: убрано {reclaimed} за {elapsed * 1000:.0f} мс")
+        return reclaimed
+
+    def _in_use(self, room_id: int) -> bool:
+        if not cluster.owns(room_id):
+            return True  # чужая комната: о её лобби и игре знает только процесс-владелец
+        return room_id in games or room_id in lobbies.lobbies or room_id in room_actors.actors
+
+    async def _sweep_rooms(self) -> int:
+        """Брошенные комнаты: обход по первичному ключу до последней достаточно старой"""
+        async with acquire() as connection:
+            cursor = connection.cursor()
+            await cursor.execute(
+                "SELECT MAX(id) FROM rooms WHERE created_at < NOW() - INTERVAL %s SECOND",
+                (int(self.room_grace),)
+            )
+            row = cursor.fetchone()
+        max_id = row[0] if row else None
+        if max_id is None:
+            return 0
+
+        deleted = 0
+        last_id = 0
+        for _ in range(self.max_batches):
+            async with acquire() as connection:
+                cursor = connection.cursor()
+                await cursor.execute(
+                    "SELECT id FROM rooms WHERE id > %s AND id <= %s ORDER BY id LIMIT %s",
+                    (last_id, max_id, self.batch)
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    break
+                last_id = ids[-1]
+                stale = [room_id for room_id in ids if not self._in_use(room_id)]
+                if stale:
+                    await cursor.execute(f"DELETE FROM rooms WHERE id IN ({_placeholders(stale)})", stale)
+                    await connection.commit()
+                    deleted += cursor.rowcount
+            if len(ids) < self.batch:
+                break
+            await asyncio.sleep(0)  # даём поработать остальным задачам между пачками
+        return deleted
+
+    async def _sweep_sessions(self) -> int:
+        deleted = 0
+        for _ in range(self.max_batches):
+            async with acquire() as connection:
+                cursor = connection.cursor()
+                await cursor.execute(
+                    "DELETE FROM game_sessions WHERE created_at < NOW() - INTERVAL %s SECOND LIMIT %s",
+                    (int(self.session_ttl), self.batch)
+                )
+                await connection.commit()
+                rows = cursor.rowcount
+            deleted += rows
+            if rows < self.batch:
+                break
+            await asyncio.sleep(0)
+        return deleted
+
+    async def _sweep_by_ids(self, select_query: str, change_query: str, on_changed=None) -> int:
+        """Выбирает до batch id и меняет их по первичному ключу — пачка за пачкой"""
+        changed = 0
+        for _ in range(self.max_batches):
+            async with acquire() as connection:
+                cursor = connection.cursor()
+                await cursor.execute(select_query, (self.batch,))
+                ids = [row[0] for row in cursor.fetchall()]
+                if ids:
+                    await cursor.execute(change_query.format(_placeholders(ids)), ids)
+                    await connection.commit()
+                    changed += cursor.rowcount
+                    if on_changed is not None:
+                        on_changed(*ids)
+            if len(ids) < self.batch:
+                break
+            await asyncio.sleep(0)
+        return changed
+
+    def stats(self) -> dict:
+        return {
+            "sweeps": self.sweeps,
+            "errors": self.errors,
+            "reclaimed": dict(self.reclaimed),
+            "last_reclaimed": self.last_reclaimed,
+            "last_ms": round(self.last_duration * 1000, 1),
+            "max_ms": round(self.max_duration * 1000, 1),
+        }
+
+
+sweeper = Sweeper(
+    interval=config.SWEEP_INTERVAL,
+    room_grace=config.SWEEP_ROOM_GRACE,
+    session_ttl=config.SWEEP_SESSION_TTL,
+    batch=config.SWEEP_BATCH,
+    max_batches=config.SWEEP_MAX_BATCHES
+)
@@ -0,0 +1,224 @@
+import importlib.util
+import logging
+import os
+import re
+import time
+from pymysql import Error
+from pymysql.err import ProgrammingError
+from bot.utils.logging_config import setup_logging
+
+setup_logging()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.py$")
+LOCK_NAME = "trivia_schema_migrations"
+LOCK_TIMEOUT = 60  # сек — сколько ждать, пока миграции применяет другой процесс
+
+
+def discover() -> list[tuple[int, str, str]]:
+    """Файлы миграций по порядку: [(версия, имя, путь)] — без импорта"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(migrations)
+
+
+def _load(version: int, path: str):
+    spec = importlib.util.spec_from_file_location(f"database.migrations.m{version:04d}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def has_column(cursor, table: str, column: str) -> bool:
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+
+def has_index(cursor, table: str, index: str) -> bool:
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, index))
+    return cursor.fetchone() is not None
+
+
+def add_index_online(cursor, table: str, index: str, columns: str, unique: bool = False):
+    """Добавляет индекс без блокировки записи в таблицу (online DDL InnoDB)"""
+    if has_index(cursor, table, index):
+        return
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    started = time.perf_counter()
+    cursor.execute(f"ALTER TABLE {table} ADD {kind} {index} ({columns}), ALGORITHM=INPLACE, LOCK=NONE")
+    logging.info(f"Индекс {table}.{index} построен за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+
+def add_column_online(cursor, table: str, column: str, definition: str):
+    """Добавляет колонку: мгновенно (MySQL 8), иначе перестройкой без блокировки записи"""
+    if has_column(cursor, table, column):
+        return
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}, ALGORITHM=INSTANT")
+    except Error:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}, ALGORITHM=INPLACE, LOCK=NONE")
+
+
+def current_version(cursor) -> int:
+    """Одна строка из schema_version; 0 — если таблицы ещё нет"""
+    try:
+        cursor.execute("SELECT version FROM schema_version ORDER BY version DESC LIMIT 1")
+    except ProgrammingError as e:
+        if e.args[0] == 1146:  # ER_NO_SUCH_TABLE
+            return 0
+        raise
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def run_migrations(connection) -> int:
+    """Доводит схему до последней версии и возвращает её.
+
+    Быстрый путь — одно чтение schema_version: если версия актуальна, ничего не делается.
+    Иначе под GET_LOCK (чтобы несколько процессов не мигрировали одновременно)
+    применяются недостающие миграции по порядку; каждая записывается в schema_version.
+    DDL в MySQL не транзакционен, поэтому сами миграции пишутся так, чтобы повторный
+    запуск после сбоя ничего не ломал.
+    """
+    started = time.perf_counter()
+    migrations = discover()
+    latest = migrations[-1][0] if migrations else 0
+    cursor = connection.cursor()
+    try:
+        version = current_version(cursor)
+        if version >= latest:
+            logging.info(f"Схема БД актуальна (версия {version}), проверка заняла {(time.perf_counter() - started) * 1000:.1f} мс")
+            return version
+
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise Error("Не дождались блокировки миграций")
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    duration_ms INT NOT NULL
+                );
+            """)
+            version = current_version(cursor)  # пока ждали блокировку, мог отработать другой процесс
+
+            for number, name, path in migrations:
+                if number <= version:
+                    continue
+                migration_started = time.perf_counter()
+                _load(number, path).upgrade(cursor)
+                duration_ms = int((time.perf_counter() - migration_started) * 1000)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, name, duration_ms) VALUES (%s, %s, %s)",
+                    (number, name, duration_ms)
+                )
+                connection.commit()
+                version = number
+                logging.info(f"Миграция {number:04d}_{name} применена за {duration_ms} мс")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+
+        logging.info(f"Схема БД обновлена до версии {version} за {(time.perf_counter() - started) * 1000:.1f} мс")
+        return version
+    except Error as e:
+        logging.error(f"Ошибка миграции схемы БД: {e}")
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+class StatementCounter:
+    """Обёртка соединения для замера холодного старта: считает запросы, ушедшие на сервер"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = 0
+
+    def cursor(self):
+        cursor = self.connection.cursor()
+        execute = cursor.execute
+
+        def counted(query, args=None):
+            self.statements += 1
+            return execute(query, args)
+
+        cursor.execute = counted
+        return cursor
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+
+def measure(connection, runs: int = 1) -> tuple[float, float]:
+    """Среднее время run_migrations (мс) и число запросов за запуск"""
+    counter = StatementCounter(connection)
+    started = time.perf_counter()
+    for _ in range(runs):
+        run_migrations(counter)
+    return (time.perf_counter() - started) / runs * 1000, counter.statements / runs
+
+
+if __name__ == "__main__":
+    # Холодный старт схемы на двух БД: новой (применяются все миграции) и уже
+    # обновлённой (быстрый путь), плюс прежний create_table (все CREATE TABLE IF NOT EXISTS
+    # и COUNT(*) на каждом запуске). Новая БД — временная {DB_database}_coldstart,
+    # нужны права CREATE/DROP DATABASE. Запуск: python -m database.migrate
+    import pymysql
+    from bot.utils import config
+
+    def connect(database=None):
+        return pymysql.connect(host=config.DB_HOST, user=config.DB_USER,
+                               password=config.DB_PASSWORD, database=database)
+
+    scratch = f"{config.DB_DATABASE}_coldstart"
+    try:
+        server = connect()
+    except Error as e:
+        raise SystemExit(f"Нет подключения к серверу MySQL: {e}")
+    try:
+        with server.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{scratch}`")
+            cursor.execute(f"CREATE DATABASE `{scratch}`")
+        connection = connect(scratch)
+        try:
+            fresh_ms, fresh_statements = measure(connection)
+            print(f"Новая БД: {fresh_ms:.1f} мс, запросов: {fresh_statements:.0f} "
+                  f"(миграций: {len(discover())})")
+
+            runs = 20
+            fast_ms, fast_statements = measure(connection, runs)
+            print(f"Обновлённая БД: {fast_ms:.2f} мс, запросов: {fast_statements:.0f} (среднее за {runs} запусков)")
+
+            initial = _load(1, discover()[0][2])
+            counter = StatementCounter(connection)
+            started = time.perf_counter()
+            for _ in range(runs):
+                cursor = counter.cursor()
+                initial.upgrade(cursor)
+                counter.commit()
+                cursor.close()
+            legacy_ms = (time.perf_counter() - started) / runs * 1000
+            print(f"Прежний create_table: {legacy_ms:.2f} мс, запросов: {counter.statements / runs:.0f}")
+        finally:
+            connection.close()
+    finally:
+        with server.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{scratch}`")
+        server.close()
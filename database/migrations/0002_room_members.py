@@ -0,0 +1,35 @@
+"""Участники комнат в room_members, счётчик free_slots и индексы для поиска по комнате"""
+from database.migrate import add_column_online, add_index_online, has_column
+
+
+def upgrade(cursor):
+    # Участники комнат: слот занят, пока есть строка; один пользователь — одна комната
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS room_members (
+            room_id INT NOT NULL,
+            user_id BIGINT NOT NULL,
+            slot TINYINT NOT NULL,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (room_id, slot),
+            UNIQUE KEY uq_room_members_user (user_id),
+            FOREIGN KEY (room_id) REFERENCES rooms(id) ON DELETE CASCADE
+        );
+    """)
+
+    add_index_online(cursor, "players", "idx_players_room", "current_room_id")
+    add_index_online(cursor, "game_players", "idx_game_players_room_user", "room_id, user_id")
+
+    if not has_column(cursor, "rooms", "free_slots"):
+        add_column_online(cursor, "rooms", "free_slots", "TINYINT NOT NULL DEFAULT 4")
+        if has_column(cursor, "rooms", "player1_id"):
+            # Переносим участников из старых колонок player1_id..player4_id (сами колонки не трогаем)
+            for slot in range(1, 5):
+                cursor.execute(f"""
+                    INSERT IGNORE INTO room_members (room_id, user_id, slot)
+                    SELECT id, player{slot}_id, {slot} FROM rooms WHERE player{slot}_id IS NOT NULL
+                """)
+            cursor.execute("""
+                UPDATE rooms r
+                SET free_slots = 4 - (SELECT COUNT(*) FROM room_members m WHERE m.room_id = r.id)
+            """)
+    add_index_online(cursor, "rooms", "idx_rooms_open", "is_private, free_slots")
@@ -0,0 +1,7 @@
+"""Индексы по времени создания — по ним сборщик мусора ищет старые комнаты и сессии"""
+from database.migrate import add_index_online
+
+
+def upgrade(cursor):
+    add_index_online(cursor, "rooms", "idx_rooms_created", "created_at")
+    add_index_online(cursor, "game_sessions", "idx_game_sessions_created", "created_at")
@@ -0,0 +1,38 @@
+"""Архив сыгранных игр: строка на игрока за игру, секции по месяцам"""
+from datetime import date
+from database.migrate import add_index_online
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def upgrade(cursor):
+    # Секции на текущий и следующий месяц; дальше их заводит обслуживание архива (bot/utils/history.py)
+    this_month = date.today().replace(day=1)
+    next_month = _next_month(this_month)
+    partitions = ",\n".join(
+        f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_next_month(month):%Y-%m-%d}')"
+        for month in (this_month, next_month)
+    )
+    # У секционированной таблицы ключ обязан включать finished_at, а внешние ключи недоступны
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS game_history (
+            finished_at DATETIME NOT NULL,
+            room_id INT NOT NULL,
+            user_id BIGINT NOT NULL,
+            score INT NOT NULL,
+            rounds_survived SMALLINT NOT NULL,
+            is_banked BOOLEAN NOT NULL,
+            result ENUM('win', 'banked', 'eliminated') NOT NULL,
+            PRIMARY KEY (finished_at, room_id, user_id),
+            KEY idx_game_history_user (user_id, finished_at)
+        )
+        PARTITION BY RANGE COLUMNS (finished_at) (
+            {partitions},
+            PARTITION pmax VALUES LESS THAN (MAXVALUE)
+        );
+    """)
+
+    # Архивирование удаляет хвосты игры по room_id — в game_sessions он не был проиндексирован
+    add_index_online(cursor, "game_sessions", "idx_game_sessions_room", "room_id")
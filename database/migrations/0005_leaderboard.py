@@ -0,0 +1,7 @@
+"""Имя игрока для таблицы чемпионов и индекс по очкам для её пересборки"""
+from database.migrate import add_column_online, add_index_online
+
+
+def upgrade(cursor):
+    add_column_online(cursor, "players", "name", "VARCHAR(64) DEFAULT NULL")
+    add_index_online(cursor, "players", "idx_players_score", "score")
@@ -0,0 +1,92 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+import bot.utils.db as db
+
+
+class FakeCursor:
+    """Курсор pymysql без сервера: результат запроса даёт connection.respond(query, args)"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def execute(self, query, args=None):
+        query = " ".join(query.split())
+        self.connection.queries.append((query, args))
+        result = self.connection.respond(query, args)
+        if isinstance(result, int):
+            # Число — затронутые строки у запроса без результата
+            self.rows, self.rowcount = [], result
+        else:
+            self.rows = list(result or ())
+            self.rowcount = len(self.rows)
+        self.lastrowid = self.connection.lastrowid
+        return self.rowcount
+
+    def executemany(self, query, args):
+        args = list(args)
+        self.connection.batches.append((" ".join(query.split()), args))
+        self.rows, self.rowcount = [], len(args)
+        return self.rowcount
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, respond=None):
+        self.respond = respond or (lambda query, args: None)
+        self.queries = []   # [(запрос без лишних пробелов, аргументы)]
+        self.batches = []   # executemany: [(запрос, [аргументы])]
+        self.lastrowid = None
+        self.acquired = 0
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def executed(self, prefix: str) -> list:
+        """Аргументы выполненных запросов, начинающихся с prefix"""
+        return [args for query, args in self.queries if query.startswith(prefix)]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Подменяет acquire() в модулях: fake_db(*модули, respond=..., gate=...) -> FakeConnection.
+
+    respond(query, args) возвращает строки результата (или число затронутых строк);
+    gate — asyncio.Event, до которого получение соединения «висит».
+    """
+
+    def install(*modules, respond=None, gate=None):
+        connection = FakeConnection(respond)
+
+        @asynccontextmanager
+        async def acquire():
+            connection.acquired += 1
+            if gate is not None:
+                await gate.wait()
+            yield db.AsyncConnection(connection)
+
+        for module in modules:
+            monkeypatch.setattr(module, "acquire", acquire)
+        return connection
+
+    return install
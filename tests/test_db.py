@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import bot.utils.db as db
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+        self.lastrowid = None
+        self.rows = []
+
+    def execute(self, query, args=None):
+        time.sleep(self.connection.delay)  # как долгий запрос или ожидание блокировки
+        self.connection.queries.append(query)
+        self.rows = [(1,)]
+        self.rowcount = 1
+        return 1
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.open = True
+        self.queries = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.open = False
+
+
+def make_pool(monkeypatch, delay=0.0, max_size=2):
+    connections = []
+
+    def connect(**kwargs):
+        connection = FakeConnection(delay)
+        connections.append(connection)
+        return connection
+
+    monkeypatch.setattr(db.pymysql, "connect", connect)
+    pool = db.ConnectionPool(min_size=0, max_size=max_size, recycle=3600, timeout=1, pre_ping=False)
+    return pool, connections
+
+
+def test_slow_query_does_not_block_event_loop(monkeypatch):
+    async def scenario():
+        pool, _ = make_pool(monkeypatch, delay=0.3)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        async with pool.acquire() as connection:
+            cursor = connection.cursor()
+            await cursor.execute("SELECT 1")
+            assert cursor.fetchone() == (1,)
+        task.cancel()
+        return ticks
+
+    # За 0.3 с запроса таймер должен был сработать много раз
+    assert asyncio.run(scenario()) >= 10
+
+
+def test_connection_is_rolled_back_and_reused(monkeypatch):
+    async def scenario():
+        pool, connections = make_pool(monkeypatch)
+        for _ in range(3):
+            async with pool.acquire() as connection:
+                await connection.cursor().execute("SELECT 1")
+        return pool, connections
+
+    pool, connections = asyncio.run(scenario())
+    assert len(connections) == 1
+    assert connections[0].rollbacks == 3
+    assert pool.stats()["idle"] == 1
+
+
+def test_cancelled_query_discards_connection(monkeypatch):
+    async def scenario():
+        pool, connections = make_pool(monkeypatch, delay=0.2)
+
+        async def query():
+            async with pool.acquire() as connection:
+                await connection.cursor().execute("SELECT SLEEP(1)")
+
+        task = asyncio.create_task(query())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0.3)  # запрос в потоке дорабатывает сам
+        return pool, connections
+
+    pool, connections = asyncio.run(scenario())
+    # Соединение в неизвестном состоянии в пул не возвращается, а слот освобождается
+    assert pool.stats()["idle"] == 0
+    assert pool.stats()["in_use"] == 0
+    assert not connections[0].open
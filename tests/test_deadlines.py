@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+from bot.utils.deadlines import TimingWheel
+
+TICK = 0.01
+
+
+def run(scenario):
+    async def wrapper():
+        wheel = TimingWheel(tick=TICK, slots=8)
+        try:
+            return await scenario(wheel)
+        finally:
+            await wheel.stop()
+
+    return asyncio.run(wrapper())
+
+
+def test_fires_after_deadline_within_a_tick():
+    async def scenario(wheel):
+        fired = {}
+        deadline = time.monotonic() + 0.05
+        wheel.schedule_at(deadline, lambda: fired.setdefault("at", time.monotonic()))
+        await asyncio.sleep(0.15)
+        return deadline, fired
+
+    deadline, fired = run(scenario)
+    assert fired["at"] >= deadline
+    assert fired["at"] - deadline < TICK * 5  # тик плюс запас на планировщик
+
+
+def test_timers_fire_in_deadline_order():
+    async def scenario(wheel):
+        order = []
+        for delay in (0.05, 0.01, 0.03):
+            wheel.schedule(delay, order.append, delay)
+        await asyncio.sleep(0.1)
+        return order
+
+    assert run(scenario) == [0.01, 0.03, 0.05]
+
+
+def test_later_revolution_waits_in_its_slot():
+    async def scenario(wheel):
+        fired = []
+        # 8 ячеек по 10 мс: срок через 150 мс — второй оборот колеса
+        wheel.schedule(0.15, fired.append, "late")
+        await asyncio.sleep(0.1)
+        early = list(fired)
+        await asyncio.sleep(0.1)
+        return early, fired
+
+    early, fired = run(scenario)
+    assert early == []
+    assert fired == ["late"]
+
+
+def test_cancelled_timer_does_not_fire():
+    async def scenario(wheel):
+        fired = []
+        timer = wheel.schedule(0.02, fired.append, 1)
+        wheel.cancel(timer)
+        wheel.cancel(timer)  # повторная отмена не считается
+        await asyncio.sleep(0.06)
+        return wheel, fired
+
+    wheel, fired = run(scenario)
+    assert fired == []
+    assert wheel.stats()["cancelled"] == 1
+    assert wheel.stats()["pending"] == 0
+
+
+def test_callback_error_does_not_stop_the_wheel():
+    async def scenario(wheel):
+        fired = []
+        wheel.schedule(0.01, lambda: 1 / 0)
+        wheel.schedule(0.01, fired.append, "ok")
+        await asyncio.sleep(0.05)
+        return wheel, fired
+
+    wheel, fired = run(scenario)
+    assert fired == ["ok"]
+    assert wheel.stats()["errors"] == 1
+
+
+def test_idle_wheel_does_not_wake_up():
+    async def scenario(wheel):
+        wheel.schedule(0.01, lambda: None)
+        await asyncio.sleep(0.05)
+        wakeups = wheel.wakeups
+        await asyncio.sleep(0.1)
+        idle_wakeups = wheel.wakeups - wakeups
+        # После простоя новый срок считается от текущего времени, а не догоняет пропущенные тики
+        fired = []
+        wheel.schedule(0.03, fired.append, 1)
+        await asyncio.sleep(0.01)
+        early = list(fired)
+        await asyncio.sleep(0.06)
+        return idle_wakeups, early, fired
+
+    idle_wakeups, early, fired = run(scenario)
+    assert idle_wakeups == 0
+    assert early == [] and fired == [1]
+
+
+def test_overdue_timer_after_idle_fires_on_next_tick():
+    async def scenario(wheel):
+        wheel.schedule(0.01, lambda: None)
+        await asyncio.sleep(0.12)  # колесо простаивает дольше оборота (8 ячеек по 10 мс)
+        fired = {}
+        scheduled_at = time.monotonic()
+        wheel.schedule_at(scheduled_at - 0.05, lambda: fired.setdefault("at", time.monotonic()))
+        await asyncio.sleep(0.15)
+        return scheduled_at, fired
+
+    scheduled_at, fired = run(scenario)
+    # Просроченный срок срабатывает на ближайшем тике, а не через оборот колеса
+    assert fired["at"] - scheduled_at < TICK * 4
@@ -0,0 +1,75 @@
+import asyncio
+
+from bot.utils.deadlines import deadlines
+from bot.utils.game_engine import EngineRegistry
+from bot.utils.supervisor import supervisor
+
+
+def test_create_is_idempotent_per_room():
+    registry = EngineRegistry(capacity=2)
+    first = registry.create(1, None)
+    assert registry.create(1, None) is first
+    assert len(registry) == 1 and 1 in registry
+    assert registry.stats()["created"] == 1
+
+
+def test_capacity_rejects_new_games():
+    registry = EngineRegistry(capacity=2)
+    registry.create(1, None)
+    registry.create(2, None)
+    assert not registry.admits()
+    assert registry.create(3, None) is None
+    assert 3 not in registry
+    # Уже идущая игра по-прежнему доступна
+    assert registry.create(2, None) is registry.get(2)
+    stats = registry.stats()
+    assert stats["rejected"] == 1 and stats["live"] == 2 and stats["peak"] == 2
+
+
+def test_remove_frees_a_slot():
+    async def scenario():
+        # remove() отменяет задачи игры, поэтому вызывается внутри цикла, как в боте
+        registry = EngineRegistry(capacity=1)
+        registry.create(1, None)
+        registry.remove(1)
+        registry.remove(1)  # повторное удаление ничего не делает
+        return registry
+
+    registry = asyncio.run(scenario())
+    assert registry.create(2, None) is not None
+    assert registry.stats()["finished"] == 1
+
+
+def test_zero_capacity_is_unlimited():
+    registry = EngineRegistry(capacity=0)
+    for room_id in range(50):
+        assert registry.create(room_id, None) is not None
+    assert registry.admits()
+
+
+def test_remove_cancels_round_timer_and_game_tasks():
+    async def scenario():
+        registry = EngineRegistry(capacity=1)
+        engine = registry.create(7, None)
+        fired = []
+        engine.round_deadline = deadlines.schedule(0.05, fired.append, 1)
+        task = supervisor.spawn(asyncio.sleep(10), "prefetch", ("game", 7))
+        engine.prefetched[1] = {"id": 1}
+        await asyncio.sleep(0)
+
+        registry.remove(7)
+        await asyncio.sleep(0.1)
+        await deadlines.stop()
+        return engine, fired, task
+
+    engine, fired, task = asyncio.run(scenario())
+    assert fired == []
+    assert task.cancelled()
+    assert engine.round_deadline is None and engine.prefetched == {}
+
+
+def test_memory_per_game_is_measured():
+    registry = EngineRegistry(capacity=0)
+    assert registry.memory_per_game() == 0
+    registry.create(1, None)
+    assert registry.memory_per_game() > 0
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from bot.utils.fsm_storage import SQLiteStorage, runtime
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def test_sqlite_state_and_data_survive_restart(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+
+    async def scenario():
+        storage = SQLiteStorage(path)
+        await storage.set_state(KEY, "Game:answer")
+        await storage.set_data(KEY, {"room": 5, "name": "Аня"})
+        await storage.close()
+
+        reopened = SQLiteStorage(path)  # новый процесс читает тот же файл
+        result = await reopened.get_state(KEY), await reopened.get_data(KEY)
+        await reopened.close()
+        return result, storage.stats()
+
+    (state, data), stats = asyncio.run(scenario())
+    assert state == "Game:answer"
+    assert data == {"room": 5, "name": "Аня"}
+    assert stats["writes"] == 2
+
+
+def test_sqlite_rejects_non_json_data(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+        try:
+            with pytest.raises(TypeError):
+                await storage.set_data(KEY, {"event": asyncio.Event()})
+            return await storage.get_data(KEY)
+        finally:
+            await storage.close()
+
+    assert asyncio.run(scenario()) == {}
+
+
+def test_clearing_data_drops_runtime_objects(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+        runtime.put(KEY, "message", object())
+        await storage.set_data(KEY, {})  # так state.clear() стирает данные
+        await storage.close()
+
+    asyncio.run(scenario())
+    assert runtime.get(KEY, "message") is None
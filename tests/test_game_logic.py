@@ -0,0 +1,335 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import bot.utils.fanout as fanout
+import bot.utils.game_engine as game_engine
+from bot.utils.deadlines import deadlines
+from bot.keyboards.game_kb import AnswerCallback, BANK_OPTION
+from bot.utils.game_engine import EngineRegistry, GameEngine, PlayerState
+from bot.utils.outbound import OutboundScheduler
+
+
+def make_engine(fake_db, monkeypatch, *user_ids):
+    connection = fake_db(game_engine)
+
+    async def noop(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(game_engine, "fan_out", noop)
+    monkeypatch.setattr(game_engine, "fan_out_edit", noop)
+    monkeypatch.setattr(GameEngine, "start_round", noop)
+
+    engine = GameEngine(room_id=1, bot=None)
+    engine.state = {
+        user_id: PlayerState(row_id, user_id, 0, True, False, None)
+        for row_id, user_id in enumerate(user_ids, start=1)
+    }
+    engine.load_active_players()
+    return engine, connection
+
+
+def answer(engine, user_id, correct):
+    player = engine.state[user_id]
+    player.last_answer_correct = correct
+    if correct:
+        player.score += 100
+    player.dirty = True
+    engine.answers[user_id] = "correct" if correct else "wrong"
+
+
+def test_round_eliminates_lowest_wrong_answer(fake_db, monkeypatch):
+    engine, connection = make_engine(fake_db, monkeypatch, 10, 20, 30)
+    answer(engine, 10, True)
+    answer(engine, 20, False)
+    answer(engine, 30, False)
+
+    asyncio.run(engine.finish_round())
+
+    assert engine.players == [10]
+    assert not engine.state[20].is_active and not engine.state[30].is_active
+    assert engine.state[10].rounds_survived == 1
+    # Все изменения раунда — одним пакетом, после записи строки чистые
+    assert len(connection.batches) == 1 and len(connection.batches[0][1]) == 3
+    assert connection.queries == []
+    assert not any(player.dirty for player in engine.state.values())
+
+
+def test_wrong_answer_above_minimum_survives(fake_db, monkeypatch):
+    engine, _ = make_engine(fake_db, monkeypatch, 10, 20)
+    engine.state[10].score = 200
+    answer(engine, 10, False)
+    answer(engine, 20, False)
+
+    asyncio.run(engine.finish_round())
+
+    assert engine.players == [10]
+
+
+def test_last_answer_ends_round_without_waiting(fake_db, monkeypatch):
+    engine, _ = make_engine(fake_db, monkeypatch, 10, 20)
+    finished = []
+
+    async def finish_round(self):
+        finished.append(self.round_number)
+
+    monkeypatch.setattr(GameEngine, "finish_round", finish_round)
+    engine.options, engine.correct_option = ["да", "нет"], 0
+
+    async def scenario():
+        engine.answers = {10: None, 20: None}
+        engine.deadlines = dict.fromkeys(engine.answers, time.monotonic() + 5)
+        engine.round_deadline = deadlines.schedule(5, engine.round_timeout, engine.round_number)
+        await engine.handle_answer(10, 1, 0)
+        await asyncio.sleep(0.01)
+        waiting = not finished
+        await engine.handle_answer(20, 1, BANK_OPTION)
+        await asyncio.sleep(0.01)
+        # Срок раунда, пришедший после последнего ответа, раунд второй раз не закрывает
+        engine.round_timeout(engine.round_number)
+        await asyncio.sleep(0.01)
+        cancelled = engine.round_deadline.cancelled
+        await deadlines.stop()
+        return waiting, cancelled
+
+    waiting, cancelled = asyncio.run(scenario())
+    assert waiting and cancelled
+    assert finished == [1]
+    assert engine.state[20].is_banked
+
+
+def test_round_deadline_closes_round(fake_db, monkeypatch):
+    engine, _ = make_engine(fake_db, monkeypatch, 10, 20)
+    finished = []
+
+    async def finish_round(self):
+        finished.append(self.round_number)
+
+    monkeypatch.setattr(GameEngine, "finish_round", finish_round)
+
+    async def scenario():
+        engine.answers = {10: None, 20: None}
+        engine.deadlines = dict.fromkeys(engine.answers, time.monotonic() + 0.05)
+        engine.round_deadline = deadlines.schedule_at(max(engine.deadlines.values()), engine.round_timeout, 1)
+        await asyncio.sleep(0.2)
+        await deadlines.stop()
+
+    asyncio.run(scenario())
+    assert finished == [1]
+
+
+def test_fan_out_sends_to_everyone_at_once(monkeypatch):
+    class SlowBot:
+        async def send_message(self, chat_id, text, **kwargs):
+            await asyncio.sleep(0.05)
+            if chat_id == 3:
+                raise RuntimeError("бот заблокирован")
+            return SimpleNamespace(message_id=chat_id * 10)
+
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=100, chat_rate=1, chat_burst=3)
+        monkeypatch.setattr(fanout, "outbound", scheduler)
+        scheduler.start(SlowBot())
+        started = time.monotonic()
+        deliveries = await fanout.fan_out({chat_id: "вопрос" for chat_id in range(1, 6)})
+        finished = time.monotonic()
+        await scheduler.stop()
+        return started, finished, deliveries
+
+    started, finished, deliveries = asyncio.run(scenario())
+    assert finished - started < 0.2  # пять отправок по 50 мс — параллельно, а не подряд
+    assert deliveries[3] is None
+    assert deliveries[1].message.message_id == 10
+    assert all(started < deliveries[chat_id].delivered_at <= finished for chat_id in (1, 2, 4, 5))
+
+
+def test_answer_after_own_deadline_is_ignored(fake_db, monkeypatch):
+    engine, _ = make_engine(fake_db, monkeypatch, 10, 20)
+    engine.options, engine.correct_option = ["да", "нет"], 0
+    engine.answers = {10: None, 20: None}
+    now = time.monotonic()
+    engine.deadlines = {10: now - 1, 20: now + 5}  # 10 получил вопрос раньше и не успел
+
+    asyncio.run(engine.handle_answer(10, 1, 0))
+    asyncio.run(engine.handle_answer(20, 1, 0))
+
+    assert engine.answers == {10: None, 20: "correct"}
+    assert engine.state[10].score == 0 and engine.state[20].score == 100
+
+
+def test_fan_out_edit_reuses_message_and_falls_back_to_send(monkeypatch):
+    class EditingBot:
+        def __init__(self):
+            self.calls = []
+
+        async def send_message(self, chat_id, text, **kwargs):
+            self.calls.append(("send", chat_id))
+            return SimpleNamespace(message_id=chat_id * 100)
+
+        async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+            self.calls.append(("edit", chat_id))
+            if chat_id == 2:
+                raise RuntimeError("message to edit not found")
+            return SimpleNamespace(message_id=message_id)
+
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=100, chat_rate=100, chat_burst=100)
+        monkeypatch.setattr(fanout, "outbound", scheduler)
+        bot = EditingBot()
+        scheduler.start(bot)
+        deliveries = await fanout.fan_out_edit({1: "a", 2: "b", 3: "c"}, {1: 11, 2: 22})
+        await scheduler.stop()
+        return bot, deliveries
+
+    bot, deliveries = asyncio.run(scenario())
+    assert sorted(bot.calls) == [("edit", 1), ("edit", 2), ("send", 2), ("send", 3)]
+    assert {chat_id: d.message.message_id for chat_id, d in deliveries.items()} == {1: 11, 2: 200, 3: 300}
+
+
+def test_round_result_waits_for_next_question_in_edit_mode(fake_db, monkeypatch):
+    engine, _ = make_engine(fake_db, monkeypatch, 10, 20, 30)
+    monkeypatch.setattr(game_engine.config, "GAME_MESSAGE_MODE", "edit")
+    edits = []
+
+    async def record_edit(texts, message_ids, reply_markup=None, priority=None):
+        edits.append(dict(texts))
+
+    monkeypatch.setattr(game_engine, "fan_out_edit", record_edit)
+    answer(engine, 10, True)
+    answer(engine, 20, True)
+    answer(engine, 30, False)
+
+    asyncio.run(engine.finish_round())
+
+    # Выбывшему итог — правкой сразу, остальным — вместе со следующим вопросом
+    assert [list(texts) for texts in edits] == [[30]]
+    assert "выбыли" in edits[0][30]
+    assert sorted(engine.pending_results) == [10, 20]
+
+
+def test_answer_is_resolved_by_round_and_option(fake_db, monkeypatch):
+    engine, _ = make_engine(fake_db, monkeypatch, 10, 20, 30)
+    engine.round_number = 3
+    engine.options, engine.correct_option = ["да", "нет", "может быть"], 2
+    engine.answers = {10: None, 20: None, 30: None}
+    engine.deadlines = dict.fromkeys(engine.answers, time.monotonic() + 5)
+
+    async def scenario():
+        return [
+            await engine.handle_answer(10, 2, 2),   # клик по вопросу прошлого раунда
+            await engine.handle_answer(10, 3, 7),   # такого варианта нет
+            await engine.handle_answer(10, 3, 2),
+            await engine.handle_answer(10, 3, 0),   # повторный ответ
+            await engine.handle_answer(20, 3, 1),
+        ]
+
+    assert asyncio.run(scenario()) == [False, False, True, False, True]
+    assert engine.answers == {10: "correct", 20: "wrong", 30: None}
+
+
+def test_answer_callback_fits_telegram_limit():
+    data = AnswerCallback(game=2 ** 63, round=10 ** 6, option=BANK_OPTION).pack()
+    assert len(data.encode()) <= 64
+    assert AnswerCallback.unpack(data).option == BANK_OPTION
+
+
+def test_game_over_archives_results(fake_db, monkeypatch):
+    engine, _ = make_engine(fake_db, monkeypatch, 10, 20)
+    archived = []
+
+    async def archive_game(room_id, results, player_stats):
+        archived.append((room_id, results))
+        return True
+
+    registry = EngineRegistry(capacity=0)
+    registry._engines[engine.room_id] = engine
+    monkeypatch.setattr(game_engine, "archive_game", archive_game)
+    monkeypatch.setattr(game_engine, "games", registry)
+    engine.state[10].rounds_survived = 2
+    engine.state[20].rounds_survived = 1
+    for user_id in (10, 20):
+        engine.state[user_id].score = 100
+        answer(engine, user_id, False)
+
+    asyncio.run(engine.finish_round())
+
+    # Оба выбыли в одном раунде — побеждает продержавшийся дольше
+    assert archived == [(1, [(10, 100, 2, False, "win"), (20, 100, 1, False, "eliminated")])]
+    assert engine.room_id not in registry
+
+
+def test_player_stats_keep_score_for_winner_and_banked(fake_db, monkeypatch):
+    engine, _ = make_engine(fake_db, monkeypatch, 10, 20, 30)
+    engine.state[10].score = 300
+    engine.state[10].rounds_survived = 3
+    engine.state[10].correct_answers = 3
+    engine.state[20].score = 200
+    engine.state[20].is_banked = True
+    engine.state[30].score = 100
+    engine.state[30].wrong_answers = 1
+    engine.names[10] = "Аня"
+
+    stats = {row[0]: row for row in engine.player_stats(engine.final_results())}
+
+    assert stats[10] == (10, 300, 3, 0, 1, "Аня")
+    assert stats[20] == (20, 200, 0, 0, 0, None)  # имя не менялось
+    assert stats[30] == (30, 0, 0, 1, 0, None)  # выбывший теряет очки, но ответы засчитываются
+
+
+def results_by_user(engine):
+    return {user_id: result for user_id, _, _, _, result in engine.final_results()}
+
+
+def make_finished_engine(fake_db, monkeypatch, *user_ids):
+    """Движок без архивации в конце игры — проверяются только итоги"""
+    async def noop(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(GameEngine, "finish_game", noop)
+    return make_engine(fake_db, monkeypatch, *user_ids)[0]
+
+
+def test_single_winner_banked_beats_eliminated(fake_db, monkeypatch):
+    engine = make_finished_engine(fake_db, monkeypatch, 10, 20)
+    answer(engine, 10, False)
+    asyncio.run(engine.mark_player_banked(20))
+    engine.answers[20] = "bank"
+
+    asyncio.run(engine.finish_round())
+
+    assert results_by_user(engine) == {10: "eliminated", 20: "win"}
+
+
+def test_earliest_banker_wins_tie(fake_db, monkeypatch):
+    engine = make_finished_engine(fake_db, monkeypatch, 10, 20)
+    asyncio.run(engine.mark_player_banked(20))
+    asyncio.run(engine.mark_player_banked(10))
+
+    assert results_by_user(engine) == {10: "banked", 20: "win"}
+
+
+def test_last_eliminated_wins_tie(fake_db, monkeypatch):
+    engine = make_finished_engine(fake_db, monkeypatch, 10, 20)
+    engine.state[20].score = 100
+    answer(engine, 10, False)
+    answer(engine, 20, True)
+    asyncio.run(engine.finish_round())  # выбывает 10, у 20 на раунд больше
+
+    engine.state[10].rounds_survived = engine.state[20].rounds_survived = 0
+    engine.state[10].score = engine.state[20].score = 0
+    answer(engine, 20, False)
+    asyncio.run(engine.finish_round())  # 20 выбывает позже
+
+    assert results_by_user(engine) == {10: "eliminated", 20: "win"}
+
+
+def test_simultaneous_tie_has_one_winner(fake_db, monkeypatch):
+    engine = make_finished_engine(fake_db, monkeypatch, 10, 20, 30)
+    for user_id in (10, 20, 30):
+        answer(engine, user_id, False)
+
+    asyncio.run(engine.finish_round())
+
+    results = results_by_user(engine)
+    assert list(results.values()).count("win") == 1
+    assert results[10] == "win"  # при полном равенстве — вошедший в комнату первым
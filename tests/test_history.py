@@ -0,0 +1,91 @@
+import asyncio
+from datetime import date
+
+import bot.utils.history as history
+from bot.utils.leaderboard import Leaderboard
+
+
+class FixedDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2026, 3, 15)
+
+
+def partitions(*names):
+    def respond(query, args):
+        if query.startswith("SELECT partition_name"):
+            return [(name,) for name in names]
+
+    return respond
+
+
+def test_archive_moves_game_in_one_transaction(fake_db):
+    connection = fake_db(history)
+    results = [(10, 300, 3, False, "win"), (20, 100, 1, True, "banked")]
+    stats = [(10, 300, 2, 1, 1, "Аня"), (20, 100, 1, 0, 0, None)]
+
+    assert asyncio.run(history.archive_game(7, results, stats))
+
+    (archive_query, rows), (stats_query, stats_rows) = connection.batches
+    assert archive_query.startswith("INSERT INTO game_history")
+    assert [row[1:] for row in rows] == [(7, *row) for row in results]
+    assert stats_query.startswith("INSERT INTO players") and "wins = wins + VALUES(wins)" in stats_query
+    assert "name = COALESCE(VALUES(name), name)" in stats_query  # None не стирает имя
+    assert stats_rows == stats
+    assert connection.executed("DELETE FROM game_players WHERE room_id") == [(7,)]
+    assert connection.executed("DELETE FROM game_sessions WHERE room_id") == [(7,)]
+    assert connection.executed("UPDATE players SET current_room_id = NULL") == [(7,)]
+    assert connection.executed("DELETE FROM rooms WHERE id") == [(7,)]
+    assert connection.acquired == 1 and connection.commits == 1
+
+
+def test_archive_updates_leaderboard_through_cluster(fake_db, monkeypatch):
+    board = Leaderboard(size=10, bucket=100, rebuild_interval=60)
+    board.loaded = True
+    monkeypatch.setitem(history.cluster.handlers, "leaderboard_apply", board.apply)
+
+    def respond(query, args):
+        if query.startswith("SELECT id, name, score FROM players"):
+            return [(10, "Аня", 500)]
+
+    fake_db(history, respond=respond)
+    assert asyncio.run(history.archive_game(7, [(10, 300, 3, False, "win")], [(10, 300, 2, 1, 1, "Аня")]))
+
+    assert board.page(0, 10) == [(1, 10, "Аня", 500)]
+    assert history.cluster.stats()["calls_local"] >= 1  # один процесс: вызов на месте
+
+
+def test_archive_survives_leaderboard_failure(fake_db, monkeypatch):
+    def broken_apply(changes):
+        raise RuntimeError("процесс общих задач недоступен")
+
+    monkeypatch.setitem(history.cluster.handlers, "leaderboard_apply", broken_apply)
+    connection = fake_db(history, respond=lambda query, args: [(10, "Аня", 500)] if "name, score" in query else None)
+
+    assert asyncio.run(history.archive_game(7, [(10, 300, 3, False, "win")], [(10, 300, 2, 1, 1, "Аня")]))
+    assert connection.commits == 1
+
+
+def test_partitions_are_added_ahead_and_old_ones_dropped(fake_db, monkeypatch):
+    monkeypatch.setattr(history, "date", FixedDate)
+    connection = fake_db(history, respond=partitions("p202508", "p202509", "p202602", "p202603", "pmax"))
+
+    asyncio.run(history.maintain_partitions(months_ahead=2, keep_months=6))
+
+    reorganize, drop = [query for query, _ in connection.queries[1:]]
+    assert reorganize == (
+        "ALTER TABLE game_history REORGANIZE PARTITION pmax INTO ("
+        "PARTITION p202604 VALUES LESS THAN ('2026-05-01'), "
+        "PARTITION p202605 VALUES LESS THAN ('2026-06-01'), "
+        "PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+    )
+    assert drop == "ALTER TABLE game_history DROP PARTITION p202508"
+
+
+def test_partitions_up_to_date_change_nothing(fake_db, monkeypatch):
+    monkeypatch.setattr(history, "date", FixedDate)
+    connection = fake_db(history, respond=partitions("p202603", "p202604", "pmax"))
+
+    asyncio.run(history.maintain_partitions(months_ahead=1, keep_months=6))
+
+    assert len(connection.queries) == 1
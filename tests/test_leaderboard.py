@@ -0,0 +1,143 @@
+import asyncio
+import random
+
+import bot.utils.leaderboard as lb
+from bot.utils.leaderboard import FenwickTree, Leaderboard
+
+
+def test_fenwick_prefix_matches_naive_sums():
+    rng = random.Random(1)
+    tree = FenwickTree(size=8)
+    counts = [0] * 100
+    for _ in range(500):
+        index, delta = rng.randrange(100), rng.choice((-1, 1, 2))
+        tree.add(index, delta)  # индексы за пределами 8 заставляют дерево расти
+        counts[index] += delta
+    for index in range(100):
+        assert tree.prefix(index) == sum(counts[:index + 1])
+
+
+def test_fenwick_prefix_past_end_is_total():
+    tree = FenwickTree(size=4)
+    tree.add(1, 3)
+    tree.add(3, 2)
+    assert tree.prefix(1000) == 5
+
+
+def scores_table(scores, bucket):
+    """respond для fake_db: players с очками {user_id: (имя, очки)}"""
+
+    def respond(query, args):
+        if query.startswith("START TRANSACTION"):
+            return None
+        if "WHERE id IN" in query:
+            return [(user_id, scores[user_id][1]) for user_id in args if user_id in scores]
+        if "GROUP BY" in query:
+            histogram = {}
+            for _, score in scores.values():
+                histogram[score // bucket] = histogram.get(score // bucket, 0) + 1
+            return list(histogram.items())
+        ordered = sorted(scores.items(), key=lambda item: (-item[1][1], item[0]))
+        return [(user_id, name, score) for user_id, (name, score) in ordered[:args[0]]]
+
+    return respond
+
+
+def make_board(fake_db, scores, size=3, bucket=100):
+    fake_db(lb, respond=scores_table(scores, bucket))
+    board = Leaderboard(size=size, bucket=bucket, rebuild_interval=3600)
+    asyncio.run(board.rebuild())
+    return board
+
+
+SCORES = {1: ("Аня", 500), 2: ("Боря", 300), 3: ("Вера", 300), 4: ("Гена", 100), 5: ("Даша", 0)}
+
+
+def test_rebuild_loads_top_and_ranks(fake_db):
+    board = make_board(fake_db, dict(SCORES))
+    assert board.players == 5
+    assert board.page(0, 10) == [(1, 1, "Аня", 500), (2, 2, "Боря", 300), (2, 3, "Вера", 300)]
+    assert board.rank_of(100) == 4
+    assert board.rank_of(0) == 5
+    assert board.rank_of(1000) == 1
+
+
+def test_apply_moves_player_into_top(fake_db):
+    board = make_board(fake_db, dict(SCORES))
+    board.apply([(4, "Гена", 100, 600)])
+    assert board.page(0, 10)[0] == (1, 4, "Гена", 600)
+    assert [row[1] for row in board.page(0, 10)] == [4, 1, 2]  # топ обрезан до size
+    assert board.rank_of(300) == 3
+    assert board.players == 5
+
+
+def test_apply_counts_new_player(fake_db):
+    board = make_board(fake_db, dict(SCORES))
+    board.apply([(6, "Егор", None, 200)])
+    assert board.players == 6
+    assert board.rank_of(200) == 4
+    assert board.rank_of(100) == 5
+
+
+def test_apply_matches_rebuild(fake_db):
+    scores = dict(SCORES)
+    board = make_board(fake_db, scores)
+    rng = random.Random(2)
+    for _ in range(50):
+        user_id = rng.randrange(1, 8)
+        name, old = scores.get(user_id, (f"Игрок {user_id}", None))
+        new = (old or 0) + rng.choice((0, 100, 200))
+        scores[user_id] = (name, new)
+        board.apply([(user_id, name, old, new)])
+    fresh = make_board(fake_db, scores)
+    assert board.page(0, 10) == fresh.page(0, 10)
+    assert [board.rank_of(score) for score in range(0, 2000, 100)] == \
+           [fresh.rank_of(score) for score in range(0, 2000, 100)]
+
+
+def test_apply_before_load_is_ignored():
+    board = Leaderboard(size=3, bucket=100, rebuild_interval=3600)
+    board.apply([(1, "Аня", None, 100)])
+    assert board.players == 0 and board.page(0, 10) == []
+
+
+def test_results_during_rebuild_are_replayed(fake_db):
+    scores = dict(SCORES)
+    board = make_board(fake_db, scores)
+    table = scores_table(scores, 100)
+
+    def respond(query, args):
+        if "GROUP BY" in query:
+            # Игра закончилась уже после чтения снимка: в нём Егора нет
+            board.apply([(6, "Егор", None, 700)])
+        return table(query, args)
+
+    gate = asyncio.Event()
+    connection = fake_db(lb, respond=respond, gate=gate)
+
+    async def scenario():
+        rebuild = asyncio.create_task(board.rebuild())
+        await asyncio.sleep(0)
+        # Эта игра записана в БД до снимка: снимок её уже видит
+        scores[4] = ("Гена", 600)
+        board.apply([(4, "Гена", 100, 600)])
+        gate.set()
+        await rebuild
+
+    asyncio.run(scenario())
+    assert sorted(connection.executed("SELECT id, score FROM players WHERE id IN")[0]) == [4, 6]
+    assert board.stats()["replayed"] == 1  # итог Гены не удваивается
+
+    scores[6] = ("Егор", 700)
+    fresh = make_board(fake_db, scores)
+    assert board.page(0, 10) == fresh.page(0, 10)
+    assert board.players == fresh.players == 6
+    assert [board.rank_of(score) for score in range(0, 1000, 100)] == \
+           [fresh.rank_of(score) for score in range(0, 1000, 100)]
+
+
+def test_rank_is_exact_only_for_multiples_of_bucket(fake_db):
+    board = make_board(fake_db, {1: ("Аня", 150), 2: ("Боря", 120), 3: ("Вера", 300)})
+    assert board.rank_of(300) == 1
+    # 150 и 120 в одной корзине [100, 200): Боря получает то же место, что и Аня
+    assert board.rank_of(150) == board.rank_of(120) == 2
@@ -0,0 +1,93 @@
+import asyncio
+
+import bot.utils.lobby as lobby_module
+from bot.utils.lobby import LobbyHub
+
+
+class RecordingOutbound:
+    def __init__(self):
+        self.edits = []
+
+    async def edit(self, chat_id, message_id, text, priority=None, **kwargs):
+        self.edits.append((chat_id, text))
+
+
+def make_hub(fake_db, monkeypatch, min_players=2, countdown=1):
+    fake_db(lobby_module)
+    sender = RecordingOutbound()
+    monkeypatch.setattr(lobby_module, "outbound", sender)
+    monkeypatch.setattr(lobby_module.config, "LOBBY_MIN_PLAYERS", min_players)
+    monkeypatch.setattr(lobby_module.config, "LOBBY_COUNTDOWN_SECONDS", countdown)
+    return LobbyHub(), sender
+
+
+def test_status_is_edited_only_when_it_changes(fake_db, monkeypatch):
+    hub, sender = make_hub(fake_db, monkeypatch, min_players=3)
+
+    async def scenario():
+        hub.joined(1, 10, 1, False)
+        hub.attach(1, 10, 100, 5)
+        await asyncio.sleep(0.01)
+        hub.joined(1, 20, 2, False)
+        hub.attach(1, 20, 200, 6)
+        await asyncio.sleep(0.01)
+        hub.attach(1, 20, 200, 6)  # повторная привязка перерисует только это сообщение, 10 видит прежний текст
+        await asyncio.sleep(0.01)
+        hub.left(1, 10, 1)
+        hub.left(1, 20, 0)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert sender.edits == [
+        (100, "🕐 Ожидаем игроков... (1/4)"),
+        (100, "🕐 Ожидаем игроков... (2/4)"),
+        (200, "🕐 Ожидаем игроков... (2/4)"),
+        (200, "🕐 Ожидаем игроков... (2/4)"),
+    ]
+    assert hub.stats()["unchanged"] >= 1
+    assert hub.lobbies == {} and hub.room_of(10) is None
+
+
+def test_countdown_starts_game_and_closes_room(fake_db, monkeypatch):
+    hub, sender = make_hub(fake_db, monkeypatch)
+    connection = fake_db(lobby_module)
+    started = []
+
+    async def on_countdown_end(room_id, members):
+        started.append((room_id, members, hub.accepts(room_id)))
+
+    hub.on_countdown_end = on_countdown_end
+
+    async def scenario():
+        hub.joined(1, 10, 1, False)
+        hub.attach(1, 10, 100, 5)
+        hub.joined(1, 20, 2, False)
+        await asyncio.wait_for(hub.lobbies[1].task, 3)
+
+    asyncio.run(scenario())
+    assert started == [(1, {10: (100, 5), 20: None}, False)]
+    assert [text for _, text in sender.edits] == [
+        "⏳ Игроков: 2/4\n⌛ Игра начнётся через: 1 сек",
+        "⌛ Время ожидания истекло. Игра начинается!",
+    ]
+    assert hub.stats()["games_started"] == 1
+    # Время старта — в БД, чтобы отсчёт пережил перезапуск; при старте оно сбрасывается
+    assert connection.executed("UPDATE rooms SET start_timer_time = NOW()") == [(1, 1)]
+    assert connection.executed("UPDATE rooms SET start_timer_time = NULL") == [(1,)]
+
+
+def test_restore_rebuilds_countdown_lobbies(fake_db, monkeypatch):
+    hub, _ = make_hub(fake_db, monkeypatch)
+    fake_db(lobby_module, respond=lambda query, args: [(1, 0, 5, 10), (1, 0, 5, 20), (2, 0, 3, 30)])
+
+    async def scenario():
+        restored = await hub.restore()
+        counts = {room_id: lobby.players_count for room_id, lobby in hub.lobbies.items()}
+        for lobby in hub.lobbies.values():
+            lobby.task.cancel()
+        return restored, counts
+
+    restored, counts = asyncio.run(scenario())
+    assert restored == 2
+    assert counts == {1: 2, 2: 1}
+    assert hub.room_of(20) == 1 and hub.room_of(30) == 2
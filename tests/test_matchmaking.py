@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+import bot.handlers.game as game
+from bot.utils.matchmaking import MatchmakingQueue
+from bot.utils.sharding import MATCHMAKING_KEY, Cluster
+
+MAX_WAIT = 10.0
+
+
+def make_queue(min_players=2, max_players=4, bucket_width=100):
+    return MatchmakingQueue(min_players=min_players, max_players=max_players,
+                            max_wait=MAX_WAIT, bucket_width=bucket_width)
+
+
+def in_loop(scenario):
+    # enqueue() запускает фоновую задачу очереди, поэтому нужен работающий цикл;
+    # _collect() вызывается напрямую с явным now, до первого переключения задач
+    async def wrapper():
+        return scenario()
+
+    return asyncio.run(wrapper())
+
+
+def user_ids(group):
+    return [entry.user_id for entry in group]
+
+
+def test_full_bucket_matches_immediately_in_fifo_order():
+    def scenario():
+        queue = make_queue()
+        for user_id in range(1, 6):
+            queue.enqueue(user_id, 50, user_id, 0)
+        return queue, queue._collect(time.monotonic())
+
+    queue, groups = in_loop(scenario)
+    assert [user_ids(group) for group in groups] == [[1, 2, 3, 4]]
+    assert queue.is_queued(5) and not queue.is_queued(1)
+
+
+def test_cancelled_player_is_skipped():
+    def scenario():
+        queue = make_queue()
+        for user_id in range(1, 5):
+            queue.enqueue(user_id, 50, user_id, 0)
+        cancelled = queue.cancel(2)
+        queue.enqueue(5, 50, 5, 0)
+        return queue, cancelled, queue._collect(time.monotonic())
+
+    queue, cancelled, groups = in_loop(scenario)
+    assert cancelled and not queue.cancel(2)
+    assert [user_ids(group) for group in groups] == [[1, 3, 4, 5]]
+    assert queue.stats()["cancelled"] == 1
+    assert queue.stats()["queued"] == 0
+
+
+def test_waiting_player_gets_smaller_room_after_max_wait():
+    def scenario():
+        queue = make_queue()
+        queue.enqueue(1, 50, 1, 0)
+        queue.enqueue(2, 60, 2, 0)
+        started = queue.entries[1].enqueued_at
+        early = queue._collect(started + MAX_WAIT / 2)
+        late = queue._collect(started + MAX_WAIT)
+        return early, late
+
+    early, late = in_loop(scenario)
+    assert early == []
+    assert [user_ids(group) for group in late] == [[1, 2]]
+
+
+def test_search_radius_widens_with_wait():
+    def scenario():
+        queue = make_queue()
+        queue.enqueue(1, 50, 1, 0)    # корзина 0
+        queue.enqueue(2, 250, 2, 0)   # корзина 2
+        started = queue.entries[1].enqueued_at
+        first = queue._collect(started + MAX_WAIT)           # радиус 1 — соседей нет
+        second = queue._collect(started + MAX_WAIT * 2.01)   # радиус 2 — корзина 2 уже рядом
+        return first, second
+
+    first, second = in_loop(scenario)
+    assert first == []
+    assert [sorted(user_ids(group)) for group in second] == [[1, 2]]
+
+
+def test_gather_needs_min_players():
+    def scenario():
+        queue = make_queue(min_players=3)
+        queue.enqueue(1, 50, 1, 0)
+        queue.enqueue(2, 50, 2, 0)
+        entry = queue.entries[1]
+        return queue, queue._gather(entry, entry.enqueued_at + MAX_WAIT * 5)
+
+    queue, group = in_loop(scenario)
+    assert group is None
+    assert queue.is_queued(1) and queue.is_queued(2)
+
+
+def test_gather_takes_nearest_buckets_first():
+    def scenario():
+        queue = make_queue(max_players=3)
+        queue.enqueue(1, 550, 1, 0)   # корзина 5
+        queue.enqueue(2, 950, 2, 0)   # корзина 9
+        queue.enqueue(3, 650, 3, 0)   # корзина 6
+        queue.enqueue(4, 350, 4, 0)   # корзина 3
+        entry = queue.entries[1]
+        return queue._gather(entry, entry.enqueued_at + MAX_WAIT * 4)
+
+    assert user_ids(in_loop(scenario)) == [1, 3, 4]
+
+
+def test_requeue_keeps_wait_time():
+    def scenario():
+        queue = make_queue()
+        queue.enqueue(1, 50, 1, 0)
+        queue.enqueue(2, 50, 2, 0)
+        group = queue._collect(queue.entries[1].enqueued_at + MAX_WAIT)[0]
+        queue.enqueue(2, 50, 2, 0)  # второй игрок уже успел встать в очередь заново
+        return queue, group, queue.requeue(group)
+
+    queue, group, requeued = in_loop(scenario)
+    assert requeued == 1
+    assert queue.entries[1].enqueued_at == group[0].enqueued_at
+
+
+def test_runner_calls_on_match():
+    async def scenario():
+        queue = MatchmakingQueue(min_players=2, max_players=4, max_wait=0.02, bucket_width=100)
+        matched = []
+
+        async def on_match(group):
+            matched.append(user_ids(group))
+
+        queue.on_match = on_match
+        queue.enqueue(1, 50, 1, 0)
+        queue.enqueue(2, 80, 2, 0)
+        await asyncio.sleep(0.1)
+        return queue, matched
+
+    queue, matched = asyncio.run(scenario())
+    assert matched == [[1, 2]]
+    assert queue.stats()["matches"] == 1
+
+
+def test_queue_check_goes_to_matchmaking_shard(monkeypatch):
+    workers = [Cluster(workers=3, index=index, socket_dir="/tmp", vnodes=8) for index in range(3)]
+    elsewhere = next(worker for worker in workers if not worker.owns_key(MATCHMAKING_KEY))
+    monkeypatch.setattr(game, "cluster", elsewhere)
+    calls = []
+
+    async def call_key(key, name, *args):
+        calls.append((key, name, args))
+        return True
+
+    monkeypatch.setattr(elsewhere, "call_key", call_key)
+    # Локальная очередь этого процесса пуста, но игрок ищет соперников у владельца очереди
+    assert asyncio.run(game.is_searching(10))
+    assert calls == [(MATCHMAKING_KEY, "is_queued", (10,))]
+
+
+def test_queue_check_is_local_in_single_process(monkeypatch):
+    async def scenario():
+        queue = make_queue()
+        queue.enqueue(10, 50, 1, 0)
+        monkeypatch.setitem(game.cluster.handlers, "is_queued", queue.is_queued)
+        return await game.is_searching(10), await game.is_searching(20)
+
+    assert asyncio.run(scenario()) == (True, False)
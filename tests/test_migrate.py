@@ -0,0 +1,60 @@
+from pymysql.err import ProgrammingError
+
+from database.migrate import LOCK_NAME, discover, measure, run_migrations
+
+LATEST = discover()[-1][0]
+
+
+def test_current_schema_costs_one_query(fake_db):
+    connection = fake_db(respond=lambda query, args: [(LATEST,)])
+    assert run_migrations(connection) == LATEST
+    assert [query for query, _ in connection.queries] == [
+        "SELECT version FROM schema_version ORDER BY version DESC LIMIT 1"
+    ]
+
+
+def fresh_database(connection, applied):
+    """respond для fake_db: пустая БД, в которую записываются применённые миграции"""
+
+    def respond(query, args):
+        if query.startswith("SELECT version FROM schema_version"):
+            if not any(q.startswith("CREATE TABLE IF NOT EXISTS schema_version") for q, _ in connection.queries):
+                raise ProgrammingError(1146, "Table 'schema_version' doesn't exist")
+            return [(applied[-1],)] if applied else []
+        if query.startswith("INSERT INTO schema_version"):
+            applied.append(args[0])
+        if query.startswith("SELECT GET_LOCK") or query.startswith("SELECT RELEASE_LOCK"):
+            return [(1,)]
+        if query.startswith("SELECT COUNT(*) FROM questions"):
+            return [(0,)]
+        return []
+
+    return respond
+
+
+def test_fresh_database_is_migrated_under_lock(fake_db):
+    applied = []
+    connection = fake_db()
+    connection.respond = fresh_database(connection, applied)
+    assert run_migrations(connection) == LATEST
+
+    assert applied == [number for number, _, _ in discover()]
+    assert connection.commits == len(applied)
+    assert connection.executed("SELECT GET_LOCK") == [(LOCK_NAME, 60)]
+    assert connection.executed("SELECT RELEASE_LOCK") == [(LOCK_NAME,)]
+    # Индексы строятся online DDL
+    assert any("ALGORITHM=INPLACE, LOCK=NONE" in query for query, _ in connection.queries)
+
+
+def test_cold_start_statement_counts(fake_db):
+    applied = []
+    connection = fake_db()
+    connection.respond = fresh_database(connection, applied)
+
+    _, fresh = measure(connection)
+    _, migrated = measure(connection, runs=5)
+
+    # Новая БД: все миграции за один запуск; обновлённая — одно чтение schema_version
+    assert applied == [number for number, _, _ in discover()]
+    assert fresh == 38  # растёт с каждой новой миграцией
+    assert migrated == 1
@@ -0,0 +1,115 @@
+import asyncio
+import heapq
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from bot.utils.outbound import OutboundScheduler, Priority
+
+
+def make_scheduler():
+    return OutboundScheduler(global_rate=100, chat_rate=100, chat_burst=100)
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+        return text
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.sent.append(text)
+        return text
+
+
+def test_coalesced_edit_keeps_one_job():
+    async def scenario():
+        scheduler = make_scheduler()
+        first = scheduler.submit(1, "edit_message_text", Priority.LOBBY_STATUS, {"text": "a"}, coalesce_key=(1, 5))
+        second = scheduler.submit(1, "edit_message_text", Priority.LOBBY_STATUS, {"text": "b"}, coalesce_key=(1, 5))
+        return scheduler, first, second
+
+    scheduler, first, second = asyncio.run(scenario())
+    assert first is second
+    assert len(scheduler._queue) == 1
+    assert scheduler._queue[0].kwargs == {"text": "b"}
+    assert scheduler.coalesced == 1
+
+
+def test_coalesced_edit_takes_higher_priority():
+    async def scenario():
+        scheduler = make_scheduler()
+        scheduler.submit(1, "edit_message_text", Priority.BROADCAST, {"text": "a"}, coalesce_key=(1, 5))
+        scheduler.submit(2, "send_message", Priority.LOBBY_STATUS, {"text": "x"})
+        scheduler.submit(1, "edit_message_text", Priority.ROUND_QUESTION, {"text": "b"}, coalesce_key=(1, 5))
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    job = heapq.heappop(scheduler._queue)
+    assert job.chat_id == 1 and job.priority == Priority.ROUND_QUESTION
+    assert scheduler.depth[Priority.ROUND_QUESTION] == 1
+    assert scheduler.depth[Priority.BROADCAST] == 0
+
+
+def test_coalesced_edit_never_lowers_priority():
+    async def scenario():
+        scheduler = make_scheduler()
+        scheduler.submit(1, "edit_message_text", Priority.ROUND_RESULT, {"text": "a"}, coalesce_key=(1, 5))
+        scheduler.submit(1, "edit_message_text", Priority.BROADCAST, {"text": "b"}, coalesce_key=(1, 5))
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler._queue[0].priority == Priority.ROUND_RESULT
+    assert scheduler.depth[Priority.ROUND_RESULT] == 1
+
+
+def test_queued_jobs_go_out_by_priority():
+    async def scenario():
+        scheduler = make_scheduler()
+        bot = RecordingBot()
+        futures = [
+            scheduler.submit(1, "send_message", Priority.BROADCAST, {"chat_id": 1, "text": "рассылка"}),
+            scheduler.submit(2, "edit_message_text", Priority.LOBBY_STATUS,
+                             {"chat_id": 2, "message_id": 5, "text": "лобби"}, coalesce_key=(2, 5)),
+            scheduler.submit(3, "send_message", Priority.ROUND_QUESTION, {"chat_id": 3, "text": "вопрос"}),
+        ]
+        scheduler.start(bot)
+        await asyncio.gather(*futures)
+        await scheduler.stop()
+        return scheduler, bot
+
+    scheduler, bot = asyncio.run(scenario())
+    assert bot.sent == ["вопрос", "лобби", "рассылка"]
+    assert scheduler.stats()["depth"] == 0
+
+
+class FloodBot:
+    """Бот, которому Telegram отвечает 429 на каждое сообщение"""
+
+    async def send_message(self, chat_id, text, **kwargs):
+        raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Too Many Requests", 30)
+
+
+def test_retry_after_pauses_chat_then_global_bucket():
+    async def scenario():
+        scheduler = make_scheduler()
+        scheduler.start(FloodBot())
+        scheduler.submit(1, "send_message", Priority.ROUND_QUESTION, {"chat_id": 1, "text": "a"})
+        await asyncio.sleep(0.05)
+        single = (scheduler.limiter.chat_bucket(1).wait_time(), scheduler.limiter.chat_bucket(2).wait_time(),
+                  scheduler.limiter.global_bucket.wait_time())
+
+        scheduler.submit(2, "send_message", Priority.ROUND_QUESTION, {"chat_id": 2, "text": "b"})
+        await asyncio.sleep(0.05)
+        both = scheduler.limiter.global_bucket.wait_time()
+        await scheduler.stop()
+        return scheduler, single, both
+
+    scheduler, (chat_wait, other_chat_wait, global_wait), global_after = asyncio.run(scenario())
+    # 429 в одном чате останавливает только этот чат
+    assert chat_wait > 29 and other_chat_wait == 0 and global_wait == 0
+    # 429 во втором чате, пока действует первый, — лимит общий
+    assert global_after > 29
+    assert scheduler.stats()["global_pauses"] == 1 and scheduler.stats()["retried"] == 2
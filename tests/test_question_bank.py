@@ -0,0 +1,153 @@
+import asyncio
+
+import bot.utils.question_bank as qb
+from bot.utils.question_bank import QuestionBank, SeenQuestions
+
+
+def question_row(question_id):
+    return (question_id, f"Вопрос {question_id}", "да", "нет") + (None,) * 8
+
+
+def questions(ids):
+    """respond для fake_db: таблица questions с заданными ID"""
+    ids = list(ids)
+
+    def respond(query, args):
+        if query.startswith("SELECT id FROM"):
+            return [(question_id,) for question_id in ids]
+        if "LIMIT" in query:
+            return [question_row(question_id) for question_id in ids[:args[0]]]
+        if "IN (" in query:
+            return [question_row(question_id) for question_id in args if question_id in ids]
+        if query.startswith("SELECT id, question"):
+            return [question_row(args[0])] if args[0] in ids else []
+        return None
+
+    return respond
+
+
+def make_bank(fake_db, count, capacity=None):
+    ids = list(range(1, count + 1))
+    connection = fake_db(qb, respond=questions(ids))
+    bank = QuestionBank(capacity=capacity or count)
+    asyncio.run(bank.reload())
+    return bank, ids, connection
+
+
+def test_each_question_drawn_once_per_round(fake_db):
+    bank, ids, _ = make_bank(fake_db, 20)
+    first = [bank.draw() for _ in ids]
+    second = [bank.draw() for _ in ids]
+    assert sorted(first) == ids
+    assert sorted(second) == ids
+
+
+def test_removed_question_is_not_drawn(fake_db):
+    bank, _, _ = make_bank(fake_db, 5)
+    bank.remove(3)
+    assert sorted(bank.draw() for _ in range(4)) == [1, 2, 4, 5]
+    assert len(bank) == 4
+
+
+def test_get_hits_cache_and_reads_misses(fake_db):
+    bank, _, connection = make_bank(fake_db, 5, capacity=2)
+    reads = len(connection.queries)
+
+    question = asyncio.run(bank.get(1))  # в кэш при загрузке попали 1 и 2
+    assert question == {"id": 1, "question": "Вопрос 1", "correct": "да", "wrong": ["нет"]}
+    assert len(connection.queries) == reads
+
+    asyncio.run(bank.get(5))
+    assert len(connection.queries) == reads + 1
+    assert bank.stats()["hits"] == 1 and bank.stats()["misses"] == 1
+    assert bank.stats()["cached"] == 2  # LRU не растёт выше capacity
+
+
+def test_missing_question_is_dropped_from_bank(fake_db):
+    bank, _, _ = make_bank(fake_db, 3, capacity=1)
+    fake_db(qb, respond=questions([1, 2]))  # вопрос 3 удалили в обход бота
+    assert asyncio.run(bank.get(3)) is None
+    assert len(bank) == 2
+
+
+def test_refresh_adds_new_question_to_current_round(fake_db):
+    bank, _, _ = make_bank(fake_db, 3)
+    bank.draw()
+    fake_db(qb, respond=questions([1, 2, 3, 4]))
+    asyncio.run(bank.refresh(4))
+    drawn = [bank.draw() for _ in range(3)]  # остаток круга: два старых и новый
+    assert 4 in drawn
+    assert len(bank) == 4
+
+
+def test_changes_are_reported_to_other_processes(fake_db):
+    bank, _, _ = make_bank(fake_db, 3)
+    changes = []
+    bank.on_changed = lambda question_id, removed: changes.append((question_id, removed))
+    fake_db(qb, respond=questions([1, 2, 4]))
+
+    bank.remove(1)
+    asyncio.run(bank.refresh(4))
+    asyncio.run(bank.refresh(3))  # вопрос 3 уже удалён из БД
+    bank.remove(2, notify=False)  # изменение от другого процесса обратно не пересылается
+
+    assert changes == [(1, True), (4, False), (3, True)]
+
+
+def test_deck_has_no_repeats(fake_db):
+    bank, _, _ = make_bank(fake_db, 50)
+    deck = bank.draw_deck(30)
+    assert len(deck) == 30
+    assert len(set(deck)) == 30
+
+
+def test_excluded_questions_only_pad_the_deck(fake_db):
+    bank, _, _ = make_bank(fake_db, 10)
+    deck = bank.draw_deck(5, exclude=set(range(1, 8)))
+    # Сначала берутся 3 новых вопроса, затем добор из exclude
+    assert set(deck[:3]) == {8, 9, 10}
+    assert len(set(deck)) == 5
+
+
+def test_forbidden_questions_never_drawn(fake_db):
+    bank, _, _ = make_bank(fake_db, 10)
+    bank.draw()  # мешок уже начат — добор должен пройти и его остаток, и новый круг
+    deck = bank.draw_deck(5, exclude={9}, forbid=set(range(1, 9)))
+    assert sorted(deck) == [9, 10]
+    assert bank.draw_deck(5, forbid=set(range(1, 11))) == []
+
+
+def test_get_many_reads_all_misses_in_one_query(fake_db):
+    bank, _, connection = make_bank(fake_db, 10, capacity=4)  # в кэше 1..4
+    reads = len(connection.queries)
+    found = asyncio.run(bank.get_many([4, 5, 6, 42]))
+    assert sorted(found) == [4, 5, 6]
+    assert len(connection.queries) == reads + 1
+    assert bank.stats()["hits"] == 1 and bank.stats()["misses"] == 3
+
+
+def test_get_many_keeps_hits_over_its_own_misses(fake_db):
+    bank, _, connection = make_bank(fake_db, 10, capacity=4)  # в кэше 1..4, 1 — самый старый
+    asyncio.run(bank.get_many([1, 5, 6, 7]))
+    reads = len(connection.queries)
+    asyncio.run(bank.get(1))  # попадание из пачки пережило её же промахи
+    assert len(connection.queries) == reads
+    assert bank.stats()["cached"] == 4
+
+
+def test_get_many_larger_than_cache_returns_everything(fake_db):
+    bank, _, _ = make_bank(fake_db, 10, capacity=2)
+    found = asyncio.run(bank.get_many([3, 4, 5, 6, 7]))
+    assert sorted(found) == [3, 4, 5, 6, 7]
+    assert found[5]["question"] == "Вопрос 5"
+
+
+def test_seen_questions_are_bounded():
+    seen = SeenQuestions(per_user=2, max_users=2)
+    seen.mark([1, 2], 10)
+    seen.mark([1], 11)
+    seen.mark([1], 12)
+    assert seen.union([1]) == {11, 12}
+    seen.mark([3], 13)  # самый давний пользователь (2) вытесняется
+    assert seen.union([2]) == set()
+    assert seen.union([1, 3]) == {11, 12, 13}
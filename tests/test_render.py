@@ -0,0 +1,32 @@
+from bot.keyboards import game_kb
+from bot.keyboards.game_kb import AnswerCallback, BANK_OPTION
+from bot.utils import render
+
+
+def test_question_body_is_escaped_once():
+    question = {"id": 9001, "question": "2 < 3 & 5 > 4?"}
+    before = render._question_body.cache_info()
+    first = render.question_text(question, 1)
+    second = render.question_text(question, 2)
+    after = render._question_body.cache_info()
+
+    assert "2 &lt; 3 &amp; 5 &gt; 4?" in first
+    assert first.startswith("<b>Вопрос №1</b>") and second.startswith("<b>Вопрос №2</b>")
+    assert after.misses - before.misses == 1 and after.hits - before.hits == 1
+
+
+def test_edited_question_is_rendered_again():
+    render.question_text({"id": 9002, "question": "старый текст"}, 1)
+    assert "новый текст" in render.question_text({"id": 9002, "question": "новый текст"}, 1)
+
+
+def test_lobby_keyboards_are_shared():
+    assert game_kb.get_room_status_keyboard(5, 2) is game_kb.get_room_status_keyboard(5, 2)
+    assert game_kb.get_room_status_keyboard(5, 3) is not game_kb.get_room_status_keyboard(5, 2)
+    assert game_kb.get_private_room_keyboard(5, 2) is game_kb.get_private_room_keyboard(5, 2)
+
+
+def test_answer_keyboard_carries_round_and_options():
+    keyboard = game_kb.get_answer_keyboard(7, 3, ("да", "нет"))
+    data = [AnswerCallback.unpack(row[0].callback_data) for row in keyboard.inline_keyboard]
+    assert [(d.game, d.round, d.option) for d in data] == [(7, 3, 0), (7, 3, 1), (7, 3, BANK_OPTION)]
@@ -0,0 +1,97 @@
+import asyncio
+
+from bot.utils.room_actor import RoomActors
+
+
+def test_events_of_a_room_run_one_at_a_time_in_order():
+    async def scenario():
+        actors = RoomActors(idle=1.0)
+        log = []
+
+        async def handler(name, delay):
+            log.append(f"{name}:start")
+            await asyncio.sleep(delay)
+            log.append(f"{name}:end")
+            return name
+
+        # Первое событие дольше второго — без актора второе закончилось бы раньше
+        first = actors.post(1, "join", handler, "join", 0.03)
+        second = actors.post(1, "answer", handler, "answer", 0.0)
+        other = actors.post(2, "join", handler, "other", 0.0)
+        results = await asyncio.gather(first, second, other)
+        return actors, log, results
+
+    actors, log, results = asyncio.run(scenario())
+    assert results == ["join", "answer", "other"]
+    room_log = [entry for entry in log if not entry.startswith("other")]
+    assert room_log == ["join:start", "join:end", "answer:start", "answer:end"]
+    # Другая комната не ждёт первую
+    assert log.index("other:end") < log.index("join:end")
+    assert actors.stats()["processed"] == 3
+
+
+def test_failed_event_does_not_stop_the_actor():
+    async def scenario():
+        actors = RoomActors(idle=1.0)
+
+        async def fail():
+            raise ValueError("сломалось")
+
+        async def ok():
+            return "ok"
+
+        failed = actors.post(1, "answer", fail)
+        done = actors.post(1, "answer", ok)
+        try:
+            await failed
+        except ValueError as e:
+            error = str(e)
+        return error, await done, actors.room_stats(1)
+
+    error, result, stats = asyncio.run(scenario())
+    assert error == "сломалось" and result == "ok"
+    assert stats["failed"] == 1 and stats["processed"] == 2
+
+
+def test_idle_actor_retires():
+    async def scenario():
+        actors = RoomActors(idle=0.02)
+
+        async def noop():
+            pass
+
+        await actors.call(1, "join", noop)
+        alive = 1 in actors.actors
+        await asyncio.sleep(0.08)
+        return actors, alive
+
+    actors, alive = asyncio.run(scenario())
+    assert alive and actors.actors == {}
+    assert actors.stats()["retired"] == 1 and actors.stats()["processed"] == 1
+
+
+def test_queued_events_are_drained_without_wait_for(monkeypatch):
+    waits = []
+    wait_for = asyncio.wait_for
+
+    def counting_wait_for(awaitable, timeout):
+        waits.append(timeout)
+        return wait_for(awaitable, timeout)
+
+    monkeypatch.setattr(asyncio, "wait_for", counting_wait_for)
+
+    async def scenario():
+        actors = RoomActors(idle=1.0)
+        done = []
+
+        async def handler(index):
+            done.append(index)
+
+        futures = [actors.post(1, "answer", handler, index) for index in range(5)]
+        await asyncio.gather(*futures)
+        await asyncio.sleep(0)
+        return done
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3, 4]
+    # Пять событий из непустого ящика — ни одного wait_for; он нужен только для ожидания простоя
+    assert len(waits) == 1
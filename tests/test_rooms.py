@@ -0,0 +1,155 @@
+import asyncio
+
+import bot.handlers.game as game
+import bot.utils.sessions as sessions_module
+from bot.utils.game_engine import EngineRegistry, GameEngine
+from bot.utils.sessions import SessionCache
+
+
+class RecordingLobbies:
+    def __init__(self):
+        self.events = []
+
+    def accepts(self, room_id):
+        return True
+
+    def joined(self, room_id, user_id, players_count, is_private):
+        self.events.append(("joined", room_id, user_id, players_count))
+
+    def left(self, room_id, user_id, players_count):
+        self.events.append(("left", room_id, user_id, players_count))
+
+
+class RecordingOutbound:
+    bot = None
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, chat_id, text, priority, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def use_fresh_sessions(monkeypatch):
+    cache = SessionCache(capacity=10, ttl=60)
+    monkeypatch.setattr(game, "sessions", cache)
+    return cache
+
+
+def test_join_takes_first_free_slot(fake_db, monkeypatch):
+    lobbies = RecordingLobbies()
+    monkeypatch.setattr(game, "lobbies", lobbies)
+    cache = use_fresh_sessions(monkeypatch)
+
+    def respond(query, args):
+        if query.startswith("SELECT current_room_id"):
+            return [(None, 0, 0, 0, 0, None)]  # игрок ни в какой комнате
+        if query.startswith("SELECT is_private, free_slots"):
+            return [(0, 2)]
+        if query.startswith("UPDATE players SET current_room_id"):
+            return 1
+        if query.startswith("SELECT slot FROM room_members"):
+            return [(1,), (3,)]
+
+    connection = fake_db(game, sessions_module, respond=respond)
+    assert asyncio.run(game.add_player_to_room(10, 5))
+
+    assert connection.executed("INSERT INTO room_members") == [(5, 10, 2)]
+    assert connection.executed("UPDATE rooms SET free_slots = free_slots - 1") == [(5,)]
+    assert connection.executed("UPDATE players SET current_room_id") == [(5, 10)]
+    assert connection.commits == 1
+    assert lobbies.events == [("joined", 5, 10, 3)]
+    assert asyncio.run(cache.room_of(10)) == 5  # комната записана в кэш, без нового чтения
+    assert cache.stats()["misses"] == 1
+
+
+def test_stale_session_cannot_join_twice(fake_db, monkeypatch):
+    monkeypatch.setattr(game, "lobbies", RecordingLobbies())
+    cache = use_fresh_sessions(monkeypatch)
+
+    def respond(query, args):
+        if query.startswith("SELECT current_room_id"):
+            return [(None, 0, 0, 0, 0, None)]  # кэш ещё не знает, что игрок уже в комнате
+        if query.startswith("SELECT is_private, free_slots"):
+            return [(0, 2)]
+        if query.startswith("UPDATE players SET current_room_id"):
+            return 0
+
+    connection = fake_db(game, sessions_module, respond=respond)
+    assert not asyncio.run(game.add_player_to_room(10, 5))
+
+    assert connection.executed("INSERT INTO room_members") == []
+    assert connection.rollbacks == 1
+    assert cache.stats()["sessions"] == 0  # устаревшая запись сброшена
+
+
+def test_join_full_room_is_rejected(fake_db, monkeypatch):
+    monkeypatch.setattr(game, "lobbies", RecordingLobbies())
+    use_fresh_sessions(monkeypatch)
+
+    def respond(query, args):
+        if query.startswith("SELECT is_private, free_slots"):
+            return [(0, 0)]
+        return []
+
+    connection = fake_db(game, sessions_module, respond=respond)
+    assert not asyncio.run(game.add_player_to_room(10, 5))
+    assert connection.executed("INSERT INTO room_members") == []
+    assert connection.rollbacks == 1
+
+
+def test_last_member_leaving_deletes_room(fake_db, monkeypatch):
+    lobbies = RecordingLobbies()
+    monkeypatch.setattr(game, "lobbies", lobbies)
+    use_fresh_sessions(monkeypatch)
+
+    def respond(query, args):
+        if query.startswith("SELECT current_room_id"):
+            return [(5, 0, 0, 0, 0, None)]
+        if query.startswith("DELETE FROM room_members"):
+            return 1
+        if query.startswith("SELECT free_slots"):
+            return [(game.ROOM_CAPACITY,)]
+
+    connection = fake_db(game, sessions_module, respond=respond)
+    assert asyncio.run(game.remove_player_from_room(10))
+
+    assert connection.executed("UPDATE rooms SET free_slots = free_slots + 1") == [(5,)]
+    assert connection.executed("DELETE FROM rooms") == [(5,)]
+    assert lobbies.events == [("left", 5, 10, 0)]
+
+
+def test_players_count_comes_from_free_slots(fake_db):
+    fake_db(game, respond=lambda query, args: [(1,)])
+    assert asyncio.run(game.get_room_players_count(5)) == game.ROOM_CAPACITY - 1
+
+
+def test_failed_start_releases_room_and_notifies_players(fake_db, monkeypatch):
+    outbound = RecordingOutbound()
+    registry = EngineRegistry(capacity=0)
+    monkeypatch.setattr(game, "outbound", outbound)
+    monkeypatch.setattr(game, "games", registry)
+    cache = use_fresh_sessions(monkeypatch)
+
+    async def broken_start(self):
+        raise RuntimeError("нет вопросов")
+
+    monkeypatch.setattr(GameEngine, "start_game", broken_start)
+
+    def respond(query, args):
+        if query.startswith("SELECT current_room_id"):
+            return [(5, 0, 0, 0, 0, None)]
+
+    connection = fake_db(game, sessions_module, respond=respond)
+
+    async def scenario():
+        assert await cache.room_of(10) == 5
+        await game.start_game_automatically(5, {10: (10, 100), 20: None})
+        return await cache.room_of(10)
+
+    assert asyncio.run(scenario()) is None  # кэш сессий тоже отвязан от комнаты
+    assert cache.stats()["misses"] == 1
+    assert 5 not in registry
+    assert connection.executed("UPDATE players SET current_room_id = NULL") == [(5,)]
+    assert connection.executed("DELETE FROM rooms WHERE id") == [(5,)]
+    assert outbound.sent == [(10, game.GAME_START_FAILED_TEXT), (20, game.GAME_START_FAILED_TEXT)]
@@ -0,0 +1,119 @@
+import asyncio
+
+import bot.utils.sessions as sessions_module
+from bot.utils.sessions import SessionCache
+
+
+def make_cache(fake_db, rows, capacity=10, ttl=60.0, gate=None):
+    def respond(query, args):
+        return [rows[args[0]]] if args[0] in rows else []
+
+    # gate: чтение «зависает», пока тест что-то меняет
+    connection = fake_db(sessions_module, respond=respond, gate=gate)
+    return SessionCache(capacity=capacity, ttl=ttl), connection
+
+
+ROW = (None, 300, 3, 1, 1, "Аня")
+
+
+def test_miss_then_hit(fake_db):
+    cache, connection = make_cache(fake_db, {1: ROW})
+
+    async def scenario():
+        first = await cache.get(1)
+        second = await cache.get(1)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert first.known and first.score == 300 and first.name == "Аня"
+    assert connection.acquired == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_unknown_player(fake_db):
+    cache, _ = make_cache(fake_db, {})
+    session = asyncio.run(cache.get(1))
+    assert not session.known and session.room_id is None
+
+
+def test_read_started_before_invalidate_is_not_cached(fake_db):
+    async def scenario():
+        gate = asyncio.Event()
+        cache, connection = make_cache(fake_db, {1: ROW}, gate=gate)
+        reader = asyncio.create_task(cache.get(1))
+        await asyncio.sleep(0)
+        cache.invalidate(1)  # например, итоги игры записаны, пока чтение шло
+        gate.set()
+        stale = await reader
+        fresh = await cache.get(1)
+        return stale, fresh, connection
+
+    stale, fresh, connection = asyncio.run(scenario())
+    assert stale is not fresh
+    assert connection.acquired == 2
+
+
+def test_read_started_before_set_room_is_not_cached(fake_db):
+    async def scenario():
+        gate = asyncio.Event()
+        cache, connection = make_cache(fake_db, {1: ROW}, gate=gate)
+        reader = asyncio.create_task(cache.get(1))
+        await asyncio.sleep(0)
+        cache.set_room(1, 42)
+        gate.set()
+        await reader
+        await cache.get(1)
+        return connection
+
+    assert asyncio.run(scenario()).acquired == 2
+
+
+def test_set_room_updates_cached_session(fake_db):
+    cache, connection = make_cache(fake_db, {1: ROW})
+
+    async def scenario():
+        await cache.get(1)
+        cache.set_room(1, 42)
+        return await cache.room_of(1)
+
+    assert asyncio.run(scenario()) == 42
+    assert connection.acquired == 1
+
+
+def test_expired_session_is_reread(fake_db):
+    cache, connection = make_cache(fake_db, {1: ROW}, ttl=0.0)
+
+    async def scenario():
+        await cache.get(1)
+        await cache.get(1)
+
+    asyncio.run(scenario())
+    assert connection.acquired == 2
+    assert cache.stats()["expired"] == 1
+
+
+def test_lru_eviction(fake_db):
+    cache, _ = make_cache(fake_db, {user_id: ROW for user_id in range(1, 4)}, capacity=2)
+
+    async def scenario():
+        await cache.get(1)
+        await cache.get(2)
+        await cache.get(1)  # 1 свежее, вытесняется 2
+        await cache.get(3)
+
+    asyncio.run(scenario())
+    assert list(cache._sessions) == [1, 3]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_notifies_other_processes_once(fake_db):
+    cache, _ = make_cache(fake_db, {1: ROW})
+    notified = []
+    cache.on_invalidated = lambda *user_ids: notified.append(user_ids)
+
+    asyncio.run(cache.get(1))
+    cache.invalidate(1, 2)
+    cache.invalidate(1, notify=False)  # сброс от другого процесса обратно не пересылается
+    assert notified == [(1, 2)]
+    assert cache.stats()["invalidations"] == 1
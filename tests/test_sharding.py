@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+import bot.utils.question_bank as qb
+from bot.handlers.game import shard_key
+from bot.keyboards.game_kb import LeaderboardCallback
+import bot.utils.sharding as sharding
+from bot.utils.question_bank import QuestionBank
+from bot.utils.sharding import MAINTENANCE_KEY, Cluster, HashRing, read_frame, room_key, write_frame
+
+
+def test_ring_is_stable_and_moves_few_keys():
+    keys = [room_key(room_id) for room_id in range(2000)]
+    three = HashRing(3, 64)
+    assert [three.node_of(key) for key in keys] == [HashRing(3, 64).node_of(key) for key in keys]
+
+    four = HashRing(4, 64)
+    moved = sum(three.node_of(key) != four.node_of(key) for key in keys)
+    # С четвёртым процессом переезжает около четверти ключей, а не почти все
+    assert moved < len(keys) * 0.4
+    assert {four.node_of(key) for key in keys} == {0, 1, 2, 3}
+
+
+def test_single_process_calls_handler_in_place():
+    single = Cluster(workers=0, index=None, socket_dir="/tmp", vnodes=8)
+    assert single.role == "single" and single.owns(123)
+
+    async def join(room_id, user_id):
+        return [room_id, user_id]
+
+    single.register("join", join)
+    assert asyncio.run(single.call(5, "join", 5, 7)) == [5, 7]
+    assert single.stats()["calls_local"] == 1
+
+
+def test_worker_owns_only_its_rooms():
+    workers = [Cluster(workers=3, index=index, socket_dir="/tmp", vnodes=8) for index in range(3)]
+    for room_id in range(100):
+        assert sum(worker.owns(room_id) for worker in workers) == 1
+
+
+def test_remote_call_without_front_link_fails_clearly():
+    worker = Cluster(workers=2, index=0, socket_dir="/tmp", vnodes=8)
+    room_id = next(room_id for room_id in range(100) if not worker.owns(room_id))
+
+    async def scenario():
+        with pytest.raises(RuntimeError, match="нет связи с фронтом"):
+            await worker.call(room_id, "join", room_id, 7)
+
+    asyncio.run(scenario())
+    assert worker.stats()["call_errors"] == 1
+
+
+def test_front_routes_calls_by_key():
+    async def scenario():
+        front = Cluster(workers=3, index=None, socket_dir="/tmp", vnodes=8)
+        front._links = {index: FrameWriter() for index in range(3)}
+        call = {"t": "call", "id": 1, "key": MAINTENANCE_KEY, "name": "leaderboard_apply", "args": [[]]}
+        with pytest.raises(RuntimeError):
+            await front._front_loop(0, frames_reader(call))
+        return front, [await front._links[index].frames() for index in range(3)]
+
+    front, sent = asyncio.run(scenario())
+    owner = front.shard_of(MAINTENANCE_KEY)
+    assert [len(frames) for frames in sent] == [int(index == owner) for index in range(3)]
+    assert sent[owner][0]["from"] == 0
+
+
+def test_leaderboard_requests_go_to_maintainer():
+    user = User(id=5, is_bot=False, first_name="Аня")
+    message = Message(message_id=1, date=0, chat=Chat(id=5, type="private"), from_user=user, text="Чемпионы")
+    callback = CallbackQuery(id="1", from_user=user, chat_instance="1",
+                             data=LeaderboardCallback(page=2).pack())
+
+    async def scenario():
+        return (await shard_key(Update(update_id=1, message=message), None),
+                await shard_key(Update(update_id=2, callback_query=callback), None))
+
+    assert asyncio.run(scenario()) == (MAINTENANCE_KEY, MAINTENANCE_KEY)
+
+
+class FrameWriter:
+    """Сторона соединения, куда пишет кластер: кадры читаются обратно через read_frame"""
+
+    def __init__(self):
+        self.reader = asyncio.StreamReader()
+
+    def write(self, data):
+        self.reader.feed_data(data)
+
+    async def drain(self):
+        pass
+
+    async def frames(self):
+        self.reader.feed_eof()
+        result = []
+        while (message := await read_frame(self.reader)) is not None:
+            result.append(message)
+        return result
+
+
+def frames_reader(*messages):
+    writer = FrameWriter()
+    for message in messages:
+        write_frame(writer, message)
+    writer.reader.feed_eof()
+    return writer.reader
+
+
+def test_front_relays_question_change_to_other_workers():
+    async def scenario():
+        front = Cluster(workers=3, index=None, socket_dir="/tmp", vnodes=8)
+        front._links = {index: FrameWriter() for index in range(3)}
+        reader = frames_reader({"t": "question", "id": 7, "removed": True})
+        with pytest.raises(RuntimeError):
+            await front._front_loop(1, reader)  # после кадра шард 1 «отключается»
+        return front, [await front._links[index].frames() for index in range(3)]
+
+    front, sent = asyncio.run(scenario())
+    question = {"t": "question", "id": 7, "removed": True}
+    assert sent == [[question], [], [question]]  # источнику изменение не возвращается
+    assert front.stats()["question_changes"] == 1
+
+
+def test_worker_applies_relayed_question_changes_without_echo(fake_db, monkeypatch):
+    bank = QuestionBank(capacity=10)
+    monkeypatch.setattr(sharding, "question_bank", bank)
+    row = (5, "Вопрос", "да", "нет") + (None,) * 8
+    fake_db(qb, respond=lambda query, args: [row] if query.startswith("SELECT id, question") else [])
+
+    async def scenario():
+        bank._live.add(3)
+        worker = Cluster(workers=2, index=0, socket_dir="/tmp", vnodes=8)
+        writer = FrameWriter()
+        bank.on_changed = worker._question_changed  # как при подключении фронта
+        worker._front = writer
+        reader = frames_reader({"t": "question", "id": 3, "removed": True},
+                               {"t": "question", "id": 5, "removed": False})
+        await worker._worker_loop(reader, writer, None)
+        await asyncio.sleep(0.01)  # перечитывание вопроса идёт фоновой задачей
+        return worker, await writer.frames()
+
+    worker, echoed = asyncio.run(scenario())
+    assert 3 not in bank._live and 5 in bank._live
+    assert echoed == []
+    assert worker.stats()["question_changes"] == 2
@@ -0,0 +1,57 @@
+import asyncio
+
+from bot.utils.supervisor import TaskSupervisor
+
+
+def test_cancel_group_cancels_only_that_group():
+    async def scenario():
+        supervisor = TaskSupervisor()
+        game = [supervisor.spawn(asyncio.sleep(10), "prefetch", ("game", 1)) for _ in range(3)]
+        other = supervisor.spawn(asyncio.sleep(10), "prefetch", ("game", 2))
+        room = supervisor.spawn(asyncio.sleep(10), "lobby", ("room", 1))
+        await asyncio.sleep(0)
+
+        cancelled = supervisor.cancel_group(("game", 1))
+        await asyncio.sleep(0)
+        alive = [not task.done() for task in (other, room)]
+        await supervisor.shutdown()
+        return supervisor, game, cancelled, alive
+
+    supervisor, game, cancelled, alive = asyncio.run(scenario())
+    assert cancelled == 3 and all(task.cancelled() for task in game)
+    assert alive == [True, True]
+    assert supervisor.stats()["live"] == 0 and supervisor.stats()["groups"] == 0
+    assert supervisor.stats()["cancelled"] == 5
+
+
+def test_group_cancel_from_inside_spares_the_caller():
+    async def scenario():
+        supervisor = TaskSupervisor()
+        sibling = supervisor.spawn(asyncio.sleep(10), "lobby", ("room", 7))
+
+        async def closer():
+            await asyncio.sleep(0)
+            return supervisor.cancel_group(("room", 7))
+
+        caller = supervisor.spawn(closer(), "room_actor", ("room", 7))
+        return sibling, await caller
+
+    sibling, cancelled = asyncio.run(scenario())
+    assert cancelled == 1 and sibling.cancelled()
+
+
+def test_failed_task_is_counted_by_kind():
+    async def scenario():
+        supervisor = TaskSupervisor()
+
+        async def fail():
+            raise RuntimeError("вопрос не загрузился")
+
+        task = supervisor.spawn(fail(), "prefetch", ("game", 1))
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+        return supervisor
+
+    supervisor = asyncio.run(scenario())
+    assert supervisor.stats()["failed"] == {"prefetch": 1}
+    assert supervisor.live_by_kind() == {}
@@ -0,0 +1,77 @@
+import asyncio
+
+import bot.utils.history as history
+import bot.utils.sweeper as sweeper_module
+from bot.utils.sharding import Cluster
+from bot.utils.sweeper import Sweeper
+
+
+def make_sweeper():
+    return Sweeper(interval=60, room_grace=600, session_ttl=3600, batch=10, max_batches=2)
+
+
+def test_sweep_is_bounded_by_batches(fake_db, monkeypatch):
+    rooms = set(range(1, 26))
+    monkeypatch.setitem(sweeper_module.games._engines, 3, object())  # в комнате 3 идёт игра
+
+    def respond(query, args):
+        if query.startswith("SELECT MAX(id) FROM rooms"):
+            return [(max(rooms),)]
+        if query.startswith("SELECT id FROM rooms"):
+            last_id, max_id, limit = args
+            return [(room_id,) for room_id in sorted(rooms) if last_id < room_id <= max_id][:limit]
+        if query.startswith("DELETE FROM rooms"):
+            rooms.difference_update(args)
+            return len(args)
+        if query.startswith("DELETE FROM game_sessions"):
+            return args[1]  # старых сессий больше, чем пройдёт за один проход
+        return []
+
+    connection = fake_db(sweeper_module, history, respond=respond)
+    reclaimed = asyncio.run(make_sweeper().sweep())
+
+    # Два чанка по 10 id: комната с игрой остаётся, хвост за пределами прохода — до следующего
+    assert rooms == {3} | set(range(21, 26))
+    assert reclaimed == {"rooms": 19, "game_players": 0, "game_sessions": 20, "current_room_id": 0}
+    assert all(len(args) <= 10 for args in connection.executed("DELETE FROM rooms"))
+    assert len(connection.executed("DELETE FROM game_sessions")) == 2
+
+
+def test_orphans_are_reclaimed_by_primary_key(fake_db):
+    def respond(query, args):
+        if query.startswith("SELECT gp.id FROM game_players"):
+            return [(7,), (8,)]
+        if query.startswith("SELECT p.id FROM players"):
+            return [(42,)]
+        if query.startswith(("DELETE FROM game_players", "UPDATE players")):
+            return len(args)
+        return []
+
+    connection = fake_db(sweeper_module, history, respond=respond)
+    sweeper = make_sweeper()
+    reclaimed = asyncio.run(sweeper.sweep())
+
+    assert connection.executed("DELETE FROM game_players WHERE id IN") == [[7, 8]]
+    assert connection.executed("UPDATE players SET current_room_id = NULL") == [[42]]
+    assert reclaimed["game_players"] == 2 and reclaimed["current_room_id"] == 1
+    assert sweeper.stats()["reclaimed"]["game_players"] == 2
+
+
+def test_only_maintainer_sweeps_shared_leftovers(fake_db, monkeypatch):
+    workers = [Cluster(workers=3, index=index, socket_dir="/tmp", vnodes=8) for index in range(3)]
+    assert sum(worker.is_maintainer for worker in workers) == 1
+    monkeypatch.setattr(sweeper_module, "cluster", next(worker for worker in workers if not worker.is_maintainer))
+
+    def respond(query, args):
+        if query.startswith("SELECT MAX(id) FROM rooms"):
+            return [(None,)]
+        return []
+
+    connection = fake_db(sweeper_module, history, respond=respond)
+    reclaimed = asyncio.run(make_sweeper().sweep())
+
+    # Свои брошенные комнаты ищет каждый процесс, хвосты игр и секции архива — только один
+    assert reclaimed == {"rooms": 0}
+    assert [query for query, _ in connection.queries] == [
+        "SELECT MAX(id) FROM rooms WHERE created_at < NOW() - INTERVAL %s SECOND"
+    ]